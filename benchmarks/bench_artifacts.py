@@ -0,0 +1,73 @@
+"""
+Size and cold-start latency of the slim model artifact against pickling the whole
+MLForecast object. Cold start is loading the artifact with an empty cache plus the
+first forecast.
+
+    python -m benchmarks.bench_artifacts --zones 265
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from src.model.artifacts import clear_model_cache, load_model, save_model
+from src.model.pipeline import build_model, LOCATION_FEATURE
+
+
+def make_zones(n_zones: int, freq: str, start: datetime, end: datetime) -> pl.DataFrame:
+    rng = np.random.default_rng(25)
+    ds = pl.datetime_range(start, end, freq, eager=True, closed="left")
+    return pl.DataFrame({
+        "unique_id": np.repeat(np.arange(n_zones), len(ds)),
+        "ds": pl.concat([ds] * n_zones),
+        "y": rng.poisson(100, n_zones * len(ds)),
+    }).with_columns(pl.col("unique_id").alias(LOCATION_FEATURE))
+
+
+def cold_start_ms(path: Path, h: int, repeat: int) -> float:
+    latencies = []
+    for _ in range(repeat):
+        clear_model_cache()
+        start = time.perf_counter()
+        load_model(path).model.predict(h)
+        latencies.append(time.perf_counter() - start)
+    return float(np.median(latencies)) * 1000
+
+
+def main(n_zones: int, repeat: int):
+    configs = [
+        ("daily, 3 years", "1d", 7, datetime(2021, 1, 1)),
+        ("hourly, 6 months", "1h", 24, datetime(2023, 1, 1)),
+    ]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, freq, h, start in configs:
+            df = make_zones(n_zones, freq, start, datetime(2023, 7, 1))
+            fit_kwargs = {"max_horizon": h} if freq == "1h" else {}
+            model = build_model(global_model=True, freq=freq).fit(df, static_features=[LOCATION_FEATURE], **fit_kwargs)
+
+            for slim in [False, True]:
+                path = Path(tmp_dir) / f"{freq}_{slim}.pkl"
+                save_model(model, path, freq=freq, global_model=True, slim=slim)
+                results.append({
+                    "model": name,
+                    "format": "slim" if slim else "mlforecast",
+                    "size_kb": path.stat().st_size / 1024,
+                    "cold_start_ms": cold_start_ms(path, h, repeat),
+                })
+
+    print(f"Global model artifacts for {n_zones} zones")
+    print(pl.DataFrame(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the model artifact formats")
+    parser.add_argument("--zones", type=int, default=265, help="Number of zones")
+    parser.add_argument("--repeat", type=int, default=20, help="Cold starts per artifact")
+    args = parser.parse_args()
+    main(args.zones, args.repeat)
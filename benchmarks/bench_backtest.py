@@ -0,0 +1,79 @@
+"""
+Batched rolling_window_forecast against the per-cutoff predict loop it replaced,
+over a one-year test window.
+
+    python -m benchmarks.bench_backtest
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+
+from src.model.pipeline import build_model
+from src.model.train import rolling_window_forecast
+
+
+def make_daily_series(n_series: int) -> pl.DataFrame:
+    rng = np.random.default_rng(25)
+    ds = pl.datetime_range(datetime(2021, 1, 1), datetime(2023, 12, 31), "1d", eager=True)
+    return pl.DataFrame({
+        "unique_id": np.repeat(np.arange(n_series), len(ds)),
+        "ds": pl.concat([ds] * n_series),
+        "y": rng.poisson(100, n_series * len(ds)),
+    })
+
+
+def per_cutoff_forecast(model, h: int, df: pl.DataFrame, cutoffs: list[datetime]) -> pl.DataFrame:
+    preds = [
+        model
+        .predict(h=h, new_df=df.filter(pl.col("ds").le(cutoff)))
+        .with_columns(cutoff=pl.lit(cutoff))
+        for cutoff in cutoffs
+    ]
+    return (
+        df
+        .join(pl.concat(preds), on=["unique_id", "ds"], how="inner")
+        .select(["unique_id", "ds", "cutoff", "y", "y_pred"])
+    )
+
+
+def main(h: int, step_size: int):
+    results = []
+    for n_series in [1, 10, 100]:
+        df = make_daily_series(n_series)
+        train = df.filter(pl.col("ds") < datetime(2023, 1, 1))
+        test = df.filter(pl.col("ds") >= datetime(2023, 1, 1))
+        model = build_model().fit(train)
+
+        start = time.perf_counter()
+        batched = rolling_window_forecast(model, h=h, df=test, step_size=step_size)
+        batched_s = time.perf_counter() - start
+
+        cutoffs = batched["cutoff"].unique().sort().to_list()
+        start = time.perf_counter()
+        per_cutoff_forecast(model, h, test, cutoffs)
+        per_cutoff_s = time.perf_counter() - start
+
+        results.append({
+            "n_series": n_series,
+            "cutoffs": len(cutoffs),
+            "per_cutoff_s": per_cutoff_s,
+            "batched_s": batched_s,
+        })
+
+    print(f"Backtest over one year, h={h}, step_size={step_size}")
+    print(
+        pl.DataFrame(results)
+        .with_columns(speedup=pl.col("per_cutoff_s") / pl.col("batched_s"))
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the batched backtest")
+    parser.add_argument("--h", type=int, default=7, help="Forecast horizon")
+    parser.add_argument("--step-size", type=int, default=1, help="Days between cutoffs")
+    args = parser.parse_args()
+    main(args.h, args.step_size)
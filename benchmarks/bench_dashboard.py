@@ -0,0 +1,75 @@
+"""
+Latency of a dashboard page load: the rows of one location built on the fly
+from the repository tables, read from the precomputed dashboard files, and
+served by the endpoint from its cache or as a 304. Also the time of a full build
+of the dashboard and of an incremental refresh after one more day.
+
+    python -m benchmarks.bench_dashboard --zones 265 --loads 200
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from benchmarks.bench_inference import seed_repo
+from src.interfaces.dashboard import DashboardService
+from src.model.dashboard import DashboardStore, dashboard_rows
+from src.model.replay import ReplaySimulator
+
+
+def timed_ms(function, loads: int) -> dict:
+    latencies = []
+    for _ in range(loads):
+        start = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start) * 1000)
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return {"p50_ms": p50, "p99_ms": p99}
+
+
+def main(n_zones: int, loads: int):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repo = seed_repo(Path(tmp_dir), n_zones)
+        simulator = ReplaySimulator(repo, datetime(2023, 3, 1), retrain_every=7, train_days=28)
+        simulator.run(datetime(2023, 6, 1))
+
+        store = DashboardStore(Path(tmp_dir) / "dashboard")
+        start = time.perf_counter()
+        store.refresh(repo, datetime(2023, 6, 1), from_date=datetime(2023, 3, 1))
+        build_seconds = time.perf_counter() - start
+
+        simulator.run(datetime(2023, 6, 2))
+        start = time.perf_counter()
+        store.refresh(repo, datetime(2023, 6, 2))
+        refresh_seconds = time.perf_counter() - start
+
+        location = store.fetch_locations()[0]
+        service = DashboardService(store)
+        target = f"/locations/{location}?from=2023-03-01"
+        etag = service.handle("GET", target, {}).etag
+        results = [
+            {"read": "on the fly", **timed_ms(
+                lambda: dashboard_rows(repo, datetime(2023, 3, 1), datetime(2023, 6, 2)).filter(pl.col("pickup_location_id") == location),
+                max(loads // 20, 3)
+            )},
+            {"read": "dashboard file", **timed_ms(lambda: store.fetch_location(location, datetime(2023, 3, 1)), loads)},
+            {"read": "endpoint json", **timed_ms(lambda: service.handle("GET", target, {}), loads)},
+            {"read": "endpoint arrow", **timed_ms(lambda: service.handle("GET", target, {"accept": "application/vnd.apache.arrow.stream"}), loads)},
+            {"read": "endpoint 304", **timed_ms(lambda: service.handle("GET", target, {"if-none-match": etag}), loads)},
+        ]
+
+    print(f"{n_zones} zones, dashboard built in {build_seconds:.2f} s, refreshed with one more day in {refresh_seconds:.2f} s")
+    print(pl.DataFrame(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard reads")
+    parser.add_argument("--zones", type=int, default=265, help="Number of zones")
+    parser.add_argument("--loads", type=int, default=200, help="Page loads timed per read")
+    args = parser.parse_args()
+    main(args.zones, args.loads)
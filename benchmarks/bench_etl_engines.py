@@ -0,0 +1,92 @@
+"""
+Benchmark of the ETL engines on a synthetic raw month.
+
+Both engines load the same file into a fresh DuckDB repository, the polars engine
+transforms in Polars and upserts the frame, the duckdb engine runs the whole
+chain as one SQL statement over read_parquet.
+
+    python -m benchmarks.bench_etl_engines --trips 3000000
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from src.adapters.duck_repo import DuckDBRepository
+from src.etl.transform import transform_raw_data
+
+
+def write_raw_month(path: Path, n_trips: int, year: int = 2023, month: int = 1) -> Path:
+    rng = np.random.default_rng(25)
+    month_start = datetime(year, month, 1)
+    seconds_in_month = 31 * 24 * 3600
+    raw_data = pl.DataFrame({
+        "VendorID": rng.integers(1, 3, n_trips),
+        "tpep_pickup_datetime": (
+            pl.Series(rng.integers(0, seconds_in_month, n_trips))
+            .cast(pl.Duration("us")) * 1_000_000 + month_start
+        ),
+        "passenger_count": rng.integers(0, 6, n_trips).astype(float),
+        "PULocationID": rng.integers(1, 266, n_trips).astype(np.int32),
+        "DOLocationID": rng.integers(1, 266, n_trips).astype(np.int32),
+    })
+    file_path = path / f"yellow_tripdata_{year}-{month:02d}.parquet"
+    raw_data.write_parquet(file_path)
+    return file_path
+
+
+def run_polars_engine(repo: DuckDBRepository, raw_file: Path, year: int, month: int) -> None:
+    clean_data = (
+        pl.read_parquet(raw_file)
+        .pipe(transform_raw_data, year, month)
+    )
+    repo.upsert_pickup_data(clean_data)
+
+
+def run_duckdb_engine(repo: DuckDBRepository, raw_file: Path, year: int, month: int) -> None:
+    repo.ingest_raw_file(str(raw_file), year, month)
+
+
+def main(n_trips: int, repeat: int):
+    engines = {
+        "polars": run_polars_engine,
+        "duckdb": run_duckdb_engine,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        raw_file = write_raw_month(Path(tmp_dir), n_trips)
+
+        results = []
+        for engine_name, engine in engines.items():
+            for run in range(repeat):
+                repo_dir = Path(tmp_dir) / f"{engine_name}_{run}"
+                repo_dir.mkdir()
+                repo = DuckDBRepository(str(repo_dir))
+                repo.create_tables()
+
+                start = time.perf_counter()
+                engine(repo, raw_file, 2023, 1)
+                results.append({"engine": engine_name, "run": run, "seconds": time.perf_counter() - start})
+
+    print(f"ETL of one month with {n_trips:,} trips")
+    print(
+        pl.DataFrame(results)
+        .group_by("engine", maintain_order=True)
+        .agg(
+            pl.col("seconds").min().alias("best_s"),
+            pl.col("seconds").median().alias("median_s"),
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the polars and duckdb ETL engines")
+    parser.add_argument("--trips", type=int, default=3_000_000, help="Number of trips in the synthetic month")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per engine")
+    args = parser.parse_args()
+    main(args.trips, args.repeat)
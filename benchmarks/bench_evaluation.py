@@ -0,0 +1,91 @@
+"""
+Time to evaluate the backtests of every fold: the previous per fold evaluation,
+two group_bys converted to dicts for each fold, against the error statistics of
+all the folds in one group_by and the metrics of every fold computed from them.
+
+    python -m benchmarks.bench_evaluation --zones 265 --folds 6 --cutoffs 60
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+
+from src.model.evaluation import error_statistics, summarize_statistics
+
+
+def make_backtest(n_zones: int, n_folds: int, n_cutoffs: int, h: int) -> pl.DataFrame:
+    rng = np.random.default_rng(25)
+    cutoffs = pl.datetime_range(datetime(2023, 1, 1), datetime(2023, 1, 1) + timedelta(days=n_cutoffs - 1), "1d", eager=True)
+    df = (
+        pl.DataFrame({"fold_id": np.arange(1, n_folds + 1)})
+        .join(pl.DataFrame({"unique_id": np.arange(1, n_zones + 1)}), how="cross")
+        .join(pl.DataFrame({"cutoff": cutoffs}), how="cross")
+        .join(pl.DataFrame({"step": np.arange(1, h + 1)}), how="cross")
+        .with_columns(ds=pl.col("cutoff") + pl.duration(days=pl.col("step")))
+        .drop("step")
+    )
+    y = rng.poisson(240, df.height)
+    return df.with_columns(y=y, y_pred=y + rng.normal(0, 20, df.height))
+
+
+def previous_evaluation(df: pl.DataFrame) -> list[dict]:
+    metrics = (
+        df
+        .with_columns(
+            error=pl.col('y_pred') - pl.col('y'),
+            horizon=pl.col('ds').sub(pl.col('cutoff'))
+        )
+        .group_by(['unique_id', 'horizon'])
+        .agg(
+            bias=pl.col('error').mean(),
+            mae=pl.col('error').abs().mean(),
+            mae_per=pl.col('error').abs().sum().truediv(pl.col('y').sum())
+        )
+        .with_columns(score=pl.col('mae').add(pl.col('bias').abs()))
+    )
+    return (
+        metrics
+        .group_by('horizon')
+        .agg(pl.col('bias').mean(), pl.col('mae').mean(), pl.col('score').mean())
+        .to_dicts()
+    )
+
+
+def single_pass_evaluation(df: pl.DataFrame) -> list[list[dict]]:
+    metrics = summarize_statistics(error_statistics(df), by=['fold_id', 'horizon'], metrics=['bias', 'mae', 'score'])
+    return [fold.drop('fold_id').to_dicts() for fold in metrics.partition_by('fold_id', maintain_order=True)]
+
+
+def main(n_zones: int, n_folds: int, n_cutoffs: int, h: int, repeat: int):
+    df = make_backtest(n_zones, n_folds, n_cutoffs, h)
+    folds = df.partition_by("fold_id", include_key=False, maintain_order=True)
+
+    results = []
+    for name, run in [
+        ("per fold, previous", lambda: [previous_evaluation(fold) for fold in folds]),
+        ("all folds, single pass", lambda: single_pass_evaluation(df)),
+        ("all folds, all metrics", lambda: summarize_statistics(error_statistics(df), by=['fold_id', 'horizon'])),
+    ]:
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            latencies.append(time.perf_counter() - start)
+        results.append({"path": name, "best_ms": min(latencies) * 1000, "median_ms": np.median(latencies) * 1000})
+
+    print(f"Evaluation of {df.height} forecasts, {n_folds} folds x {n_zones} zones x {n_cutoffs} cutoffs x {h} steps")
+    print(pl.DataFrame(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the backtest evaluation")
+    parser.add_argument("--zones", type=int, default=265, help="Number of zones")
+    parser.add_argument("--folds", type=int, default=6, help="Number of folds")
+    parser.add_argument("--cutoffs", type=int, default=60, help="Cutoffs per fold")
+    parser.add_argument("--h", type=int, default=7, help="Forecast horizon")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per path")
+    args = parser.parse_args()
+    main(args.zones, args.folds, args.cutoffs, args.h, args.repeat)
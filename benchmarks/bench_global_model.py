@@ -0,0 +1,75 @@
+"""
+Fit and backtest time of the global model as the number of zones grows, against
+fitting one model per zone.
+
+    python -m benchmarks.bench_global_model
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+
+from src.model.pipeline import build_model, LOCATION_FEATURE
+from src.model.train import rolling_window_forecast, evaluate_prediction
+
+
+def make_daily_zones(n_zones: int) -> pl.DataFrame:
+    rng = np.random.default_rng(25)
+    ds = pl.datetime_range(datetime(2021, 1, 1), datetime(2023, 12, 31), "1d", eager=True)
+    return pl.DataFrame({
+        "unique_id": np.repeat(np.arange(n_zones), len(ds)),
+        "ds": pl.concat([ds] * n_zones),
+        "y": rng.poisson(np.repeat(rng.integers(10, 5000, n_zones), len(ds))),
+    })
+
+
+def run_global(df: pl.DataFrame, h: int) -> pl.DataFrame:
+    df = df.with_columns(pl.col("unique_id").alias(LOCATION_FEATURE))
+    train = df.filter(pl.col("ds") < datetime(2023, 1, 1))
+    test = df.filter(pl.col("ds") >= datetime(2023, 1, 1))
+    model = build_model(global_model=True).fit(train, static_features=[LOCATION_FEATURE])
+    return rolling_window_forecast(model, h=h, df=test)
+
+
+def run_per_zone(df: pl.DataFrame, h: int) -> pl.DataFrame:
+    results = []
+    for _, zone in df.group_by("unique_id"):
+        train = zone.filter(pl.col("ds") < datetime(2023, 1, 1))
+        test = zone.filter(pl.col("ds") >= datetime(2023, 1, 1))
+        model = build_model().fit(train)
+        results.append(rolling_window_forecast(model, h=h, df=test))
+    return pl.concat(results)
+
+
+def main(h: int, zones: list[int]):
+    results = []
+    for n_zones in zones:
+        df = make_daily_zones(n_zones)
+
+        start = time.perf_counter()
+        global_backtest = run_global(df, h)
+        evaluate_prediction(global_backtest, by_location=True)
+        global_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        run_per_zone(df, h)
+        per_zone_s = time.perf_counter() - start
+
+        results.append({"zones": n_zones, "per_zone_s": per_zone_s, "global_s": global_s})
+
+    print(f"Fit and backtest over one year, h={h}")
+    print(
+        pl.DataFrame(results)
+        .with_columns(speedup=pl.col("per_zone_s") / pl.col("global_s"))
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the global model against one model per zone")
+    parser.add_argument("--h", type=int, default=7, help="Forecast horizon")
+    parser.add_argument("--zones", type=int, nargs="+", default=[10, 50, 265], help="Numbers of zones")
+    args = parser.parse_args()
+    main(args.h, args.zones)
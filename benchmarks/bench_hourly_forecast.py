@@ -0,0 +1,78 @@
+"""
+Latency of forecasting the next 24 hours of every zone with the hourly model.
+The direct model (one regressor per step, all steps at once) is compared with
+the recursive model, which builds the features and predicts step by step.
+
+Only the trailing max_lag hours of each zone are passed to predict, same as the
+backtest windows.
+
+    python -m benchmarks.bench_hourly_forecast --zones 265 --budget-ms 500
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+
+from src.model.pipeline import build_model, LOCATION_FEATURE
+
+
+def make_hourly_zones(n_zones: int, days: int) -> pl.DataFrame:
+    rng = np.random.default_rng(25)
+    start = datetime(2023, 1, 1)
+    ds = pl.datetime_range(start, start + timedelta(days=days), "1h", eager=True, closed="left")
+    hour_profile = 1 + np.sin(np.arange(len(ds)) * 2 * np.pi / 24) / 2
+    levels = rng.integers(1, 300, n_zones)
+    return pl.DataFrame({
+        "unique_id": np.repeat(np.arange(n_zones), len(ds)),
+        "ds": pl.concat([ds] * n_zones),
+        "y": rng.poisson(np.outer(levels, hour_profile).ravel()),
+    }).with_columns(pl.col("unique_id").alias(LOCATION_FEATURE))
+
+
+def time_predict(model, h: int, history: pl.DataFrame, repeat: int) -> np.ndarray:
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.predict(h=h, new_df=history)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def main(n_zones: int, days: int, h: int, repeat: int, budget_ms: float):
+    df = make_hourly_zones(n_zones, days)
+    
+    start = time.perf_counter()
+    direct_model = build_model(global_model=True, freq="1h").fit(df, static_features=[LOCATION_FEATURE], max_horizon=h)
+    direct_fit_s = time.perf_counter() - start
+    recursive_model = build_model(global_model=True, freq="1h").fit(df, static_features=[LOCATION_FEATURE])
+    
+    max_lag = max(direct_model.ts.lags)
+    history = df.group_by("unique_id", maintain_order=True).tail(max_lag)
+    
+    results = []
+    for name, model in [("direct", direct_model), ("recursive", recursive_model)]:
+        latencies = time_predict(model, h, history, repeat)
+        results.append({
+            "strategy": name,
+            "p50_ms": np.percentile(latencies, 50),
+            "p99_ms": np.percentile(latencies, 99),
+        })
+    results = pl.DataFrame(results).with_columns(within_budget=pl.col("p99_ms") <= budget_ms)
+    
+    print(f"Next {h} hours of {n_zones} zones, {days} days of training data, direct fit {direct_fit_s:.1f}s")
+    print(f"Latency budget {budget_ms:.0f} ms")
+    print(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the hourly forecast latency")
+    parser.add_argument("--zones", type=int, default=265, help="Number of zones")
+    parser.add_argument("--days", type=int, default=90, help="Days of hourly training data")
+    parser.add_argument("--h", type=int, default=24, help="Forecast horizon in hours")
+    parser.add_argument("--repeat", type=int, default=50, help="Predict calls per strategy")
+    parser.add_argument("--budget-ms", type=float, default=500, help="p99 latency budget")
+    args = parser.parse_args()
+    main(args.zones, args.days, args.h, args.repeat, args.budget_ms)
@@ -0,0 +1,95 @@
+"""
+Per-call latency of make_prediction with a cold and a warm model cache, against
+loading the artifact on every call. The model is the global daily model over
+all the synthetic zones.
+
+    python -m benchmarks.bench_inference --zones 265
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import numpy as np
+import polars as pl
+
+from src.adapters.local_repo import LocalRepository
+from src.etl.models import NYCPickupHourlySchema
+from src.etl.transform import add_surrogate_key
+from src.model.artifacts import clear_model_cache, load_model, save_model
+from src.model.inference import make_prediction
+from src.model.train import fetch_series, fit_model
+
+
+def seed_repo(path: Path, n_zones: int) -> LocalRepository:
+    rng = np.random.default_rng(25)
+    hours = pl.datetime_range(datetime(2023, 1, 1), datetime(2023, 7, 1), "1h", eager=True, closed="left")
+    data = pl.DataFrame({
+        "pickup_datetime_hour": pl.concat([hours] * n_zones),
+        "pickup_location_id": np.repeat(np.arange(1, n_zones + 1), len(hours)),
+        "num_pickup": rng.poisson(np.repeat(rng.integers(1, 50, n_zones), len(hours))),
+    })
+    repo = LocalRepository(path)
+    repo.create_tables()
+    repo.upsert_pickup_data(NYCPickupHourlySchema.enforce_schema(add_surrogate_key(data)))
+    return repo
+
+
+def time_calls(call, repeat: int, before_call=None) -> np.ndarray:
+    latencies = []
+    for _ in range(repeat):
+        if before_call:
+            before_call()
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def main(n_zones: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repo = seed_repo(Path(tmp_dir), n_zones)
+        model_path = Path(tmp_dir) / "model.pkl"
+
+        df = fetch_series(repo, datetime(2023, 1, 1), datetime(2023, 7, 1), None, global_model=True)
+        save_model(fit_model(df, max_horizon=7), model_path, global_model=True)
+        artifact_kb = model_path.stat().st_size / 1024
+
+        def predict():
+            make_prediction(repo, datetime(2023, 6, 30), pickup_locations=None, model_path=model_path)
+
+        def load_every_call():
+            # what the inference path used to do
+            model = joblib.load(model_path).model
+            history = fetch_series(repo, datetime(2023, 6, 2), datetime(2023, 7, 1), None, global_model=True)
+            model.predict(h=7, new_df=history)
+
+        results = []
+        for name, call, before_call in [
+            ("artifact load, joblib", lambda: joblib.load(model_path), None),
+            ("artifact load, cache", lambda: load_model(model_path), None),
+            ("load every call", load_every_call, None),
+            ("cold cache", predict, clear_model_cache),
+            ("warm cache", predict, None),
+        ]:
+            load_model(model_path)
+            latencies = time_calls(call, repeat, before_call)
+            results.append({
+                "path": name,
+                "p50_ms": np.percentile(latencies, 50),
+                "p99_ms": np.percentile(latencies, 99),
+            })
+
+    print(f"make_prediction of {n_zones} zones, h=7, artifact of {artifact_kb:.0f} KB")
+    print(pl.DataFrame(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the inference latency")
+    parser.add_argument("--zones", type=int, default=265, help="Number of zones")
+    parser.add_argument("--repeat", type=int, default=30, help="Calls per path")
+    args = parser.parse_args()
+    main(args.zones, args.repeat)
@@ -0,0 +1,73 @@
+"""
+Latency of MeanLagPredictor.forecast against the horizon and the number of series,
+compared with the recursive strategy that calls predict over the full history h times.
+
+    python -m benchmarks.bench_mean_lag_forecast
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+
+from src.model.pipeline import MeanLagPredictor
+
+
+def make_series(n_series: int, n_days: int) -> pl.DataFrame:
+    rng = np.random.default_rng(25)
+    ds = pl.datetime_range(datetime(2022, 1, 1), datetime(2022, 1, 1) + timedelta(days=n_days - 1), "1d", eager=True)
+    return pl.DataFrame({
+        "ds": pl.concat([ds] * n_series),
+        "unique_id": np.repeat(np.arange(n_series), n_days),
+        "y": rng.poisson(100, n_series * n_days),
+    })
+
+
+def recursive_forecast(model: MeanLagPredictor, X: pl.DataFrame, h: int) -> pl.DataFrame:
+    for _ in range(h):
+        X = (
+            X
+            .pipe(model.predict)
+            .with_columns(pl.coalesce(["y", "y_hat"]).alias("y"))
+            .select(["ds", "unique_id", "y"])
+        )
+    return X
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(n_days: int, repeat: int):
+    model = MeanLagPredictor(lags=[1, 7, 14, 28], freq="1d")
+    results = []
+    for n_series in [10, 100, 1000]:
+        df = make_series(n_series, n_days)
+        for h in [1, 7, 14]:
+            results.append({
+                "n_series": n_series,
+                "h": h,
+                "recursive_ms": best_of(lambda: recursive_forecast(model, df, h), repeat) * 1000,
+                "vectorized_ms": best_of(lambda: model.forecast(df, h), repeat) * 1000,
+            })
+
+    print(f"MeanLagPredictor forecast over {n_days} days of history")
+    print(
+        pl.DataFrame(results)
+        .with_columns(speedup=pl.col("recursive_ms") / pl.col("vectorized_ms"))
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark MeanLagPredictor.forecast")
+    parser.add_argument("--days", type=int, default=730, help="Days of history per series")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per configuration")
+    args = parser.parse_args()
+    main(args.days, args.repeat)
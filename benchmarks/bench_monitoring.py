@@ -0,0 +1,80 @@
+"""
+Time to score one newly closed day with growing amounts of stored forecasts and
+actuals. Each day holds h forecasts per zone.
+
+    python -m benchmarks.bench_monitoring --zones 265 --history-days 30 180 365
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from src.adapters.duck_repo import DuckDBRepository
+from src.adapters.local_repo import LocalRepository
+from src.etl.models import NYCPickupHourlySchema
+from src.etl.transform import add_surrogate_key
+
+
+def seed_repo(repo, n_zones: int, n_days: int, h: int) -> datetime:
+    rng = np.random.default_rng(25)
+    start = datetime(2023, 1, 1)
+    end = start + timedelta(days=n_days)
+    hours = pl.datetime_range(start, end, "1h", eager=True, closed="left")
+    repo.upsert_pickup_data(NYCPickupHourlySchema.enforce_schema(add_surrogate_key(pl.DataFrame({
+        "pickup_datetime_hour": pl.concat([hours] * n_zones),
+        "pickup_location_id": np.repeat(np.arange(1, n_zones + 1), len(hours)),
+        "num_pickup": rng.poisson(10, len(hours) * n_zones),
+    }))))
+
+    days = pl.datetime_range(start, end, "1d", eager=True, closed="left")
+    repo.upsert_prediction_data(
+        pl.DataFrame({"pickup_datetime": days})
+        .join(pl.DataFrame({"pickup_location_id": np.arange(1, n_zones + 1)}), how="cross")
+        .join(pl.DataFrame({"horizon": np.arange(1, h + 1)}), how="cross")
+        .with_columns(
+            issued_at=pl.col("pickup_datetime") - pl.duration(days=pl.col("horizon") - 1),
+            model_version=pl.lit("v1"),
+            y_pred=pl.lit(240.0)
+        )
+    )
+    return end
+
+
+def main(n_zones: int, history_days: list[int], h: int, repeat: int):
+    results = []
+    for repo_class in [DuckDBRepository, LocalRepository]:
+        for n_days in history_days:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                repo = repo_class(str(Path(tmp_dir)))
+                repo.create_tables()
+                end = seed_repo(repo, n_zones, n_days, h)
+
+                latencies = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    repo.update_metric_data(end - timedelta(days=1), end)
+                    latencies.append(time.perf_counter() - start)
+                results.append({
+                    "repo": repo_class.__name__,
+                    "history_days": n_days,
+                    "best_ms": min(latencies) * 1000,
+                    "median_ms": np.median(latencies) * 1000,
+                })
+
+    print(f"Scoring one day of {n_zones} zones x {h} horizons")
+    print(pl.DataFrame(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the incremental monitoring job")
+    parser.add_argument("--zones", type=int, default=265, help="Number of zones")
+    parser.add_argument("--history-days", type=int, nargs="+", default=[30, 180, 365], help="Days of stored history")
+    parser.add_argument("--h", type=int, default=7, help="Forecasts per zone and day")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per configuration")
+    args = parser.parse_args()
+    main(args.zones, args.history_days, args.h, args.repeat)
@@ -0,0 +1,53 @@
+"""
+Size of the figures of plot_ts on long hourly series with and without
+downsampling: points and bytes of the figure JSON sent to the browser, and the
+time to build it.
+
+    python -m benchmarks.bench_plots --zones 4 --years 5 --max-points 2000
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+
+from src.plots import build_ts_figure
+
+
+def main(n_zones: int, years: int, max_points: int):
+    rng = np.random.default_rng(25)
+    hours = pl.datetime_range(datetime(2023 - years, 1, 1), datetime(2023, 1, 1), "1h", eager=True, closed="left")
+    data = pl.DataFrame({
+        "pickup_datetime_hour": pl.concat([hours] * n_zones),
+        "pickup_location_id": np.repeat(np.arange(1, n_zones + 1), len(hours)),
+        "num_pickup": rng.poisson(np.repeat(rng.integers(1, 50, n_zones), len(hours))),
+    })
+
+    results = []
+    for downsampling in [None, "minmax", "lttb"]:
+        start = time.perf_counter()
+        fig = build_ts_figure(data, max_points=max_points, downsampling=downsampling, facet=True)
+        build_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        payload = fig.to_json()
+        results.append({
+            "downsampling": downsampling or "none",
+            "points": sum(len(trace.x) for trace in fig.data),
+            "build_ms": build_seconds * 1000,
+            "to_json_ms": (time.perf_counter() - start) * 1000,
+            "json_mb": len(payload) / 2**20,
+        })
+
+    print(f"{n_zones} zones, {years} years of hourly pickups, {data.height} points")
+    print(pl.DataFrame(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the downsampling of the plots")
+    parser.add_argument("--zones", type=int, default=4, help="Number of zones")
+    parser.add_argument("--years", type=int, default=5, help="Years of hourly data")
+    parser.add_argument("--max-points", type=int, default=2000, help="Point budget of a trace")
+    args = parser.parse_args()
+    main(args.zones, args.years, args.max_points)
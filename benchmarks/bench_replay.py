@@ -0,0 +1,60 @@
+"""
+Speed of the operational replay: time per simulated day of the replay of the
+synthetic zones, split by days with and without retraining, and where the time
+of the run goes.
+
+    python -m benchmarks.bench_replay --zones 265 --retrain-every 7
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+from benchmarks.bench_inference import seed_repo
+from src.adapters.local_repo import LocalRepository
+from src.model.profiling import Profiler, profiling
+from src.model.replay import ReplaySimulator
+
+
+def main(n_zones: int, retrain_every: int, train_days: int):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = seed_repo(Path(tmp_dir), n_zones)
+        target = LocalRepository(Path(tmp_dir) / "replay")
+        target.create_tables()
+
+        simulator = ReplaySimulator(
+            source,
+            datetime(2023, 3, 1),
+            target=target,
+            retrain_every=retrain_every,
+            train_days=train_days
+        )
+        start = time.perf_counter()
+        with profiling(Profiler(memory_interval=None)) as profiler:
+            days = simulator.run(datetime(2023, 7, 1))
+        seconds = time.perf_counter() - start
+
+    print(f"Replayed {days.height} days of {n_zones} zones in {seconds:.1f} s, {365 * seconds / days.height:.0f} s per simulated year")
+    print(
+        days
+        .group_by("retrained")
+        .agg(
+            pl.len().alias("days"),
+            (pl.col("seconds").mean() * 1000).alias("mean_ms"),
+            (pl.col("seconds").max() * 1000).alias("max_ms")
+        )
+    )
+    print(profiler.summary().select("name", "calls", "self_s", "mean_ms", "share"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the operational replay")
+    parser.add_argument("--zones", type=int, default=265, help="Number of zones")
+    parser.add_argument("--retrain-every", type=int, default=7, help="Days between two retrainings")
+    parser.add_argument("--train-days", type=int, default=56, help="Days of history the model is trained on")
+    args = parser.parse_args()
+    main(args.zones, args.retrain_every, args.train_days)
@@ -0,0 +1,84 @@
+"""
+Startup time of the CLI. Import time of the CLI module and of the modules each
+command imports when it runs, from python -X importtime, and wall time of
+running a command's --help in a fresh interpreter.
+
+    python -m benchmarks.bench_startup --repeat 5
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+
+PARENT_DIR = Path(__file__).parent.parent
+
+# modules imported on top of the CLI when a command runs
+COMMAND_MODULES = {
+    "cli": "src.interfaces.cli",
+    "etl create-tables": "src.adapters.duck_repo",
+    "etl download-taxi-data": "src.etl.pipeline",
+    "model monitor": "src.model.monitoring",
+    "model train-model": "src.model.train",
+    "model serve": "src.interfaces.server",
+}
+
+
+def import_times(module: str) -> pl.DataFrame:
+    """Self and cumulative import time, in ms, of every module imported by module."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PARENT_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        rows.append({"module": name.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return pl.DataFrame(rows)
+
+
+def wall_time(args: list[str], repeat: int) -> float:
+    """Median wall time, in ms, of running python with args."""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=PARENT_DIR, capture_output=True, check=True)
+        latencies.append(time.perf_counter() - start)
+    return float(np.median(latencies) * 1000)
+
+
+def main(repeat: int):
+    results = []
+    for command, module in COMMAND_MODULES.items():
+        times = import_times(module)
+        results.append({
+            "command": command,
+            "module": module,
+            "import_ms": times.filter(pl.col("module") == module)["cumulative_ms"].item(),
+        })
+    print("Import time of the modules of each command")
+    print(pl.DataFrame(results))
+
+    print("Slowest imports of the CLI module")
+    print(import_times(COMMAND_MODULES["cli"]).sort("cumulative_ms", descending=True).head(10))
+
+    # the interpreter startup is the floor of any command
+    print(f"python -c pass: {wall_time(['-c', 'pass'], repeat):.0f} ms")
+    print(f"python app.py etl create-tables --help: {wall_time(['app.py', 'etl', 'create-tables', '--help'], repeat):.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CLI startup")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each command")
+    args = parser.parse_args()
+    main(args.repeat)
@@ -0,0 +1,88 @@
+"""
+Accuracy and wall time of the statistical models against the linear MLForecast
+model on a backtest of synthetic zones with a weekly pattern. Fit is the time to
+fit the train split, backtest the time of the rolling forecast over the test split.
+
+    python -m benchmarks.bench_stats_models --zones 20 --models linear seasonal_naive auto_ets
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from src.adapters.local_repo import LocalRepository
+from src.etl.models import NYCPickupHourlySchema
+from src.etl.transform import add_surrogate_key
+from src.model.train import (
+    evaluate_prediction,
+    fetch_series,
+    fit_model,
+    rolling_window_forecast,
+    split_train_test
+)
+
+
+def seed_repo(path: Path, n_zones: int) -> LocalRepository:
+    rng = np.random.default_rng(25)
+    hours = pl.datetime_range(datetime(2023, 1, 1), datetime(2023, 7, 1), "1h", eager=True, closed="left")
+    weekday = hours.dt.weekday().to_numpy()
+    # busier weekends, with a level of its own for every zone
+    weekly = np.where(weekday >= 6, 1.6, 1.0)
+    data = pl.DataFrame({
+        "pickup_datetime_hour": pl.concat([hours] * n_zones),
+        "pickup_location_id": np.repeat(np.arange(1, n_zones + 1), len(hours)),
+        "num_pickup": rng.poisson(np.outer(rng.integers(1, 50, n_zones), weekly).ravel()),
+    })
+    repo = LocalRepository(path)
+    repo.create_tables()
+    repo.upsert_pickup_data(NYCPickupHourlySchema.enforce_schema(add_surrogate_key(data)))
+    return repo
+
+
+def main(n_zones: int, models: list[str], h: int):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repo = seed_repo(Path(tmp_dir), n_zones)
+        df = fetch_series(repo, datetime(2023, 1, 1), datetime(2023, 7, 1), None).sort('ds', maintain_order=True)
+        fold = split_train_test(df, datetime(2023, 5, 1), "2mo")[0]
+        train, test = fold.split(df)
+
+        for regressor in models:
+            start = time.perf_counter()
+            model = fit_model(train, h, regressor=regressor)
+            fit_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            predictions = rolling_window_forecast(model, h, test)
+            backtest_seconds = time.perf_counter() - start
+
+            metrics = pl.DataFrame(evaluate_prediction(predictions))
+            results.append({
+                "model": regressor,
+                "fit_s": fit_seconds,
+                "backtest_s": backtest_seconds,
+                "mae_h1": metrics.filter(pl.col("horizon").dt.total_days() == 1)["mae"].item(),
+                f"mae_h{h}": metrics.filter(pl.col("horizon").dt.total_days() == h)["mae"].item(),
+            })
+
+    print(f"Daily backtest of {n_zones} zones, h={h}")
+    print(pl.DataFrame(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the statistical models")
+    parser.add_argument("--zones", type=int, default=20, help="Number of zones")
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=["linear", "seasonal_naive", "auto_ets", "auto_arima", "mstl"],
+        help="Regressors of build_model to compare"
+    )
+    parser.add_argument("--h", type=int, default=7, help="Forecast horizon")
+    args = parser.parse_args()
+    main(args.zones, args.models, args.h)
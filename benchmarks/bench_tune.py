@@ -0,0 +1,68 @@
+"""
+Wall time of the lag set search on the synthetic zones, with and without
+pruning, against fitting every candidate with MLForecast on every fold, which
+rebuilds the lags of the candidate each time.
+
+    python -m benchmarks.bench_tune --zones 265 --jobs 1
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+from benchmarks.bench_inference import seed_repo
+from src.model.config import TUNE_LAG_SETS, TUNE_REGRESSORS
+from src.model.pipeline import build_model
+from src.model.train import fetch_series, rolling_window_forecast, split_train_test
+from src.model.tune import search_space, tune_model
+
+
+def tune_without_shared_features(repo, candidates, h: int) -> None:
+    df = fetch_series(repo, datetime(2023, 1, 1), datetime(2023, 7, 1), None).sort('ds', maintain_order=True)
+    for fold in split_train_test(df, datetime(2023, 3, 1), "2mo"):
+        train, test = fold.split(df)
+        for candidate in candidates:
+            model = build_model(lags=list(candidate.lags), regressor=candidate.regressor).fit(train)
+            rolling_window_forecast(model, h, test)
+
+
+def main(n_zones: int, n_jobs: int):
+    candidates = search_space(TUNE_LAG_SETS, ["linear", "ridge"])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repo = seed_repo(Path(tmp_dir), n_zones)
+        tune_args = dict(
+            repo=repo,
+            train_data_from=datetime(2023, 1, 1),
+            train_data_to=datetime(2023, 7, 1),
+            test_data_from=datetime(2023, 3, 1),
+            pickup_locations=None,
+            cross_validation_split_frequency="2mo",
+            regressors=["linear", "ridge"],
+            n_jobs=n_jobs,
+            output_path=None
+        )
+
+        results = []
+        for name, run in [
+            ("refit per candidate", lambda: tune_without_shared_features(repo, candidates, 7)),
+            ("shared lags, no pruning", lambda: tune_model(**tune_args, prune_after=99)),
+            ("shared lags, pruning", lambda: tune_model(**tune_args)),
+        ]:
+            start = time.perf_counter()
+            run()
+            results.append({"path": name, "seconds": time.perf_counter() - start})
+
+    print(f"Search of {len(candidates)} candidates over 2 folds, {n_zones} zones, {n_jobs} jobs")
+    print(pl.DataFrame(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the lag set search")
+    parser.add_argument("--zones", type=int, default=265, help="Number of zones")
+    parser.add_argument("--jobs", type=int, default=1, help="Processes of the search")
+    args = parser.parse_args()
+    main(args.zones, args.jobs)
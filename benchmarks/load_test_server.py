@@ -0,0 +1,120 @@
+"""
+Load test of the forecast service.
+
+Clients send forecast requests for random locations over keep-alive connections.
+Without --url the service is started in process on a synthetic repository with
+the global daily model over all the zones, and compared with calling
+make_prediction for every request.
+
+    python -m benchmarks.load_test_server --clients 32 --requests 2000
+    python -m benchmarks.load_test_server --url http://127.0.0.1:8000 --locations 1-265
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+import polars as pl
+
+from benchmarks.bench_inference import seed_repo
+from src.interfaces.server import ForecastService
+from src.model.artifacts import save_model
+from src.model.inference import make_prediction
+from src.model.train import fetch_series, fit_model
+
+
+async def run_client(host: str, port: int, targets: list[str], latencies: list[float]) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    for target in targets:
+        start = time.perf_counter()
+        writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+        await writer.drain()
+        content_length = 0
+        while (line := await reader.readline()) != b"\r\n":
+            if line.lower().startswith(b"content-length:"):
+                content_length = int(line.split(b":")[1])
+        await reader.readexactly(content_length)
+        latencies.append((time.perf_counter() - start) * 1000)
+    writer.close()
+
+
+async def load_test(host: str, port: int, locations: list[int], n_clients: int, n_requests: int, h: int) -> pl.DataFrame:
+    rng = np.random.default_rng(25)
+    targets = [f"/forecast?locations={location}&h={h}" for location in rng.choice(locations, n_requests)]
+    latencies = []
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_client(host, port, targets[client::n_clients], latencies)
+        for client in range(n_clients)
+    ])
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /stats HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    server_stats = json.loads((await reader.read()).partition(b"\r\n\r\n")[2])
+    writer.close()
+
+    return pl.DataFrame([{
+        "clients": n_clients,
+        "requests_per_s": n_requests / elapsed,
+        "client_p50_ms": np.percentile(latencies, 50),
+        "client_p99_ms": np.percentile(latencies, 99),
+        "server_p50_ms": server_stats["p50_ms"],
+        "server_p99_ms": server_stats["p99_ms"],
+        "mean_batch_size": server_stats["mean_batch_size"],
+    }])
+
+
+async def self_hosted(n_zones: int, n_clients: int, n_requests: int, h: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repo = seed_repo(Path(tmp_dir), n_zones)
+        model_path = Path(tmp_dir) / "model.pkl"
+        df = fetch_series(repo, datetime(2023, 1, 1), datetime(2023, 7, 1), None, global_model=True)
+        save_model(fit_model(df, max_horizon=h), model_path, global_model=True)
+
+        service = ForecastService(repo, model_path, as_of=datetime(2023, 7, 1))
+        started = asyncio.Event()
+        server = asyncio.create_task(service.serve(port=0, started=started))
+        await started.wait()
+
+        results = await load_test("127.0.0.1", service.port, list(range(1, n_zones + 1)), n_clients, n_requests, h)
+        server.cancel()
+
+        # the previous path, one repository fetch and predict per request
+        latencies = []
+        for location in np.random.default_rng(25).choice(n_zones, 50) + 1:
+            start = time.perf_counter()
+            make_prediction(repo, datetime(2023, 6, 30), pickup_locations=[int(location)], h=h, model_path=model_path)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    print(f"Forecast service, {n_zones} zones, {n_requests} requests of one location, h={h}")
+    print(results)
+    print(f"make_prediction per request: p50 {np.percentile(latencies, 50):.1f} ms, p99 {np.percentile(latencies, 99):.1f} ms")
+
+
+def parse_locations(value: str) -> list[int]:
+    first, _, last = value.partition("-")
+    return list(range(int(first), int(last or first) + 1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the forecast service")
+    parser.add_argument("--url", default=None, help="Running service to test, started in process if not given")
+    parser.add_argument("--locations", type=parse_locations, default="1-265", help="Range of locations to request, e.g. 1-265")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent connections")
+    parser.add_argument("--requests", type=int, default=2000, help="Total requests")
+    parser.add_argument("--h", type=int, default=7, help="Forecast horizon of the requests")
+    args = parser.parse_args()
+
+    if args.url is None:
+        asyncio.run(self_hosted(len(args.locations), args.clients, args.requests, args.h))
+    else:
+        url = urlsplit(args.url)
+        print(asyncio.run(load_test(url.hostname, url.port, args.locations, args.clients, args.requests, args.h)))
@@ -0,0 +1,72 @@
+"""
+Where the training time goes as the number of zones grows: self time of every
+profiled step of train_model on the synthetic zones, and the overhead of the
+profiler against the same training without it.
+
+    python -m benchmarks.profile_training --zones 10 50 265 --trace-dir /tmp/traces
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+from benchmarks.bench_inference import seed_repo
+from src.model.profiling import profiling
+from src.model.train import train_model
+
+
+def main(zones: list[int], trace_dir: Path | None):
+    summaries, overheads = [], []
+    for n_zones in zones:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            repo = seed_repo(Path(tmp_dir), n_zones)
+            train_args = dict(
+                repo=repo,
+                train_data_from=datetime(2023, 1, 1),
+                train_data_to=datetime(2023, 7, 1),
+                test_data_from=datetime(2023, 3, 1),
+                pickup_locations=None,
+                max_horizon=7,
+                cross_validation_split_frequency="2mo",
+                model_path=Path(tmp_dir) / "model.pkl"
+            )
+
+            start = time.perf_counter()
+            train_model(**train_args)
+            plain_seconds = time.perf_counter() - start
+
+            with profiling() as profiler:
+                train_model(**train_args)
+            overheads.append({
+                "zones": n_zones,
+                "plain_s": plain_seconds,
+                "profiled_s": profiler.wall_time,
+                "spans": len(profiler.events),
+            })
+            summaries.append(
+                profiler.summary()
+                .select("name", pl.col("self_s").alias(f"{n_zones} zones"))
+            )
+            if trace_dir is not None:
+                profiler.write_chrome_trace(trace_dir / f"train_{n_zones}_zones.json")
+
+    by_step = summaries[0]
+    for summary in summaries[1:]:
+        by_step = by_step.join(summary, on="name", how="full", coalesce=True)
+
+    print("Self time of each step, in seconds")
+    with pl.Config(tbl_rows=-1):
+        print(by_step)
+    print(pl.DataFrame(overheads))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile the training pipeline")
+    parser.add_argument("--zones", type=int, nargs="+", default=[10, 50, 265], help="Numbers of zones")
+    parser.add_argument("--trace-dir", type=Path, default=None, help="Directory the Chrome traces are written to")
+    args = parser.parse_args()
+    main(args.zones, args.trace_dir)
@@ -0,0 +1,225 @@
+"""
+Daily pipeline as a Metaflow flow: ETL -> rollups -> backtest -> train -> batch predict.
+
+    python daily_flow.py run --etl-from 2024-01-01 --etl-to 2024-03-01 --max-workers 8
+
+The months to load fan out over the ETL step, the cross-validation folds over
+the backtest step and chunks of the locations over the predict step. Branches
+run as separate processes on the local runtime, up to --max-workers of them at
+once. Steps exchange data frames, folds and the fitted model as artifacts, the
+training series is fetched from the warehouse once and every later step reads
+it from the datastore. Branches never touch the repository, the joins are its
+only writers, so DuckDB only ever sees one writer.
+
+Every branch process starts its own Polars and BLAS thread pools. With as many
+workers as cores, cap them with the variables of train.THREAD_ENV_VARS, e.g.
+POLARS_MAX_THREADS=1.
+"""
+
+import os
+from datetime import date, datetime, timedelta
+
+import polars as pl
+from metaflow import FlowSpec, JSONType, Parameter, current, step
+
+from src.adapters.base import initialize_repository
+from src.common import get_logger
+from src.etl.helpers import generate_list_of_months
+from src.etl.pipeline import fetch_raw_data
+from src.etl.transform import transform_raw_data
+from src.model.artifacts import save_model
+from src.model.config import (
+    CROSS_VALIDATION_FREQUENCY,
+    DEFAULT_DASHBOARD_PATH,
+    DEFAULT_METRIC_STORE_PATH,
+    DEFAULT_MODEL_PATH,
+    MAX_HORIZON,
+    TEST_DATA_FROM,
+    TRAIN_DATA_FROM,
+    TRAIN_DATA_TO
+)
+from src.model.dashboard import refresh_dashboard
+from src.model.evaluation import MetricStore, summarize_statistics
+from src.model.features import update_feature_store
+from src.model.inference import forecast_reference_dates
+from src.model.train import fetch_series, fit_model, run_fold, split_train_test
+
+
+logger = get_logger("flow")
+
+
+def _parse_date(value: str) -> datetime:
+    return datetime.combine(date.fromisoformat(value), datetime.min.time())
+
+
+class DailyPipelineFlow(FlowSpec):
+
+    etl_from = Parameter("etl-from", help="First month to load", default=TRAIN_DATA_TO.date().isoformat())
+    etl_to = Parameter("etl-to", help="Last month to load", default=TRAIN_DATA_TO.date().isoformat())
+    repo_type = Parameter("repo-type", help="Repository type", default="duckdb")
+    repo_path = Parameter("repo-path", help="Root of the repository, its default location if not given", default="")
+    train_data_from = Parameter("train-data-from", default=TRAIN_DATA_FROM.date().isoformat())
+    train_data_to = Parameter("train-data-to", default=TRAIN_DATA_TO.date().isoformat())
+    test_data_from = Parameter("test-data-from", default=TEST_DATA_FROM.date().isoformat())
+    pickup_locations = Parameter("pickup-locations", help="JSON list of locations, all of them if null", type=JSONType, default="null")
+    max_horizon = Parameter("max-horizon", type=int, default=MAX_HORIZON)
+    cross_validation_split_frequency = Parameter("cv-frequency", default=CROSS_VALIDATION_FREQUENCY)
+    regressor = Parameter("regressor", default="linear")
+    model_path = Parameter("model-path", default=str(DEFAULT_MODEL_PATH))
+    metric_store_path = Parameter("metric-store-path", help="Metric store the backtest is logged to, not logged if empty", default=str(DEFAULT_METRIC_STORE_PATH))
+    reference_date = Parameter("reference-date", help="Last day of observed data of the forecast, the day before train-data-to by default", default="")
+    dashboard_path = Parameter("dashboard-path", help="Dashboard refreshed after the predictions once it's built, not refreshed if empty", default=str(DEFAULT_DASHBOARD_PATH))
+    predict_chunks = Parameter("predict-chunks", help="Branches the locations are predicted in", type=int, default=os.cpu_count() or 1)
+
+    def repository(self):
+        """The repository of the run, opened by each step that reads or writes it."""
+        if self.repo_path:
+            path_argument = "custom_root_dir" if self.repo_type == "local" else "db_url"
+            repo = initialize_repository(self.repo_type, **{path_argument: self.repo_path})
+        else:
+            repo = initialize_repository(self.repo_type)
+        repo.create_tables()
+        return repo
+
+    @step
+    def start(self):
+        """Validates the parameters and lists the months to load."""
+        self.train_from = _parse_date(self.train_data_from)
+        self.train_to = _parse_date(self.train_data_to)
+        self.test_from = _parse_date(self.test_data_from)
+        self.forecast_date = _parse_date(self.reference_date) if self.reference_date else self.train_to - timedelta(days=1)
+        if self.forecast_date >= self.train_to:
+            raise ValueError(f"The reference date {self.forecast_date} must be before train-data-to {self.train_to}")
+        if self.predict_chunks < 1:
+            raise ValueError("predict-chunks must be at least 1")
+
+        self.months = generate_list_of_months(date.fromisoformat(self.etl_from), date.fromisoformat(self.etl_to))
+        if not self.months:
+            raise ValueError(f"No month between {self.etl_from} and {self.etl_to}")
+        logger.info("Loading %s months", len(self.months))
+        self.next(self.etl, foreach="months")
+
+    @step
+    def etl(self):
+        """Downloads and transforms one month into the pickup timeseries. A month
+        that fails is logged and skipped, the same as batch_etl.
+        """
+        self.month = self.input
+        self.pickups = None
+        # a failed download is logged and returns None
+        raw_data = fetch_raw_data(self.month.year, self.month.month)
+        if raw_data is not None:
+            try:
+                self.pickups = transform_raw_data(raw_data, self.month.year, self.month.month)
+            except Exception:
+                logger.exception("Error transforming the data of %s", self.month)
+        self.next(self.join_etl)
+
+    @step
+    def join_etl(self, inputs):
+        """Writes the pickups of every loaded month."""
+        self.merge_artifacts(inputs, exclude=["month", "pickups"])
+        loaded = [branch for branch in inputs if branch.pickups is not None]
+        self.loaded_months = [branch.month for branch in loaded]
+        if loaded:
+            self.repository().upsert_pickup_data(pl.concat([branch.pickups for branch in loaded]))
+        logger.info("Loaded %s of %s months", len(loaded), len(self.months))
+        self.next(self.rollups)
+
+    @step
+    def rollups(self):
+        """Extends the daily feature store over the loaded months, fetches the
+        training series and splits it into the cross-validation folds.
+        """
+        repo = self.repository()
+        if self.loaded_months:
+            last_month = max(self.loaded_months)
+            update_feature_store(
+                repo,
+                to_date=datetime(last_month.year + last_month.month // 12, last_month.month % 12 + 1, 1),
+                from_date=datetime.combine(min(self.loaded_months), datetime.min.time())
+            )
+
+        self.series = (
+            fetch_series(repo, self.train_from, self.train_to, self.pickup_locations)
+            .sort("ds", maintain_order=True)
+        )
+        self.folds = split_train_test(self.series, test_from=self.test_from, every=self.cross_validation_split_frequency)
+        logger.info("Backtesting %s folds of %s series", len(self.folds), self.series["unique_id"].n_unique())
+        self.next(self.backtest, foreach="folds")
+
+    @step
+    def backtest(self):
+        """Fits and backtests one fold."""
+        self.statistics = run_fold(self.input, self.max_horizon, self.series, regressor=self.regressor)
+        self.next(self.join_backtest)
+
+    @step
+    def join_backtest(self, inputs):
+        """Reports the backtest metrics of every fold and logs the backtest."""
+        self.merge_artifacts(inputs, exclude=["statistics"])
+        statistics = pl.concat([branch.statistics for branch in inputs])
+        self.fold_metrics = summarize_statistics(statistics, ["fold_id", "horizon"])
+        logger.info("Backtest metrics:\n%s", self.fold_metrics)
+
+        self.model_version = datetime.now().strftime("%Y%m%d%H%M%S")
+        if self.metric_store_path:
+            MetricStore(self.metric_store_path).log_run(
+                self.model_version,
+                statistics,
+                params=dict(
+                    train_data_from=self.train_from,
+                    train_data_to=self.train_to,
+                    test_data_from=self.test_from,
+                    pickup_locations=self.pickup_locations,
+                    max_horizon=self.max_horizon,
+                    cross_validation_split_frequency=self.cross_validation_split_frequency,
+                    regressor=self.regressor,
+                    flow_run_id=current.run_id
+                )
+            )
+        self.next(self.train)
+
+    @step
+    def train(self):
+        """Fits the model on the whole series and splits the locations into the
+        chunks predicted in parallel.
+        """
+        model = fit_model(self.series, self.max_horizon, regressor=self.regressor)
+        self.artifact = save_model(model, self.model_path, version=self.model_version)
+
+        locations = self.series["unique_id"].unique().sort().to_list()
+        n_chunks = min(self.predict_chunks, len(locations))
+        self.location_chunks = [locations[i::n_chunks] for i in range(n_chunks)]
+        self.next(self.predict, foreach="location_chunks")
+
+    @step
+    def predict(self):
+        """Forecasts the reference date for one chunk of locations."""
+        history = self.series.filter(pl.col("unique_id").is_in(self.input))
+        self.predictions = forecast_reference_dates(self.artifact, history, [self.forecast_date], self.max_horizon)
+        self.next(self.join_predict)
+
+    @step
+    def join_predict(self, inputs):
+        """Writes the forecasts of every chunk and refreshes the dashboard."""
+        # the model is pickled again by every branch, its version is all that's needed past here
+        self.merge_artifacts(inputs, exclude=["predictions", "artifact"])
+        predictions = pl.concat([branch.predictions for branch in inputs])
+        repo = self.repository()
+        repo.upsert_prediction_data(predictions)
+        self.n_predictions = predictions.height
+        if self.dashboard_path:
+            refresh_dashboard(repo, self.dashboard_path)
+        self.next(self.end)
+
+    @step
+    def end(self):
+        logger.info(
+            "Model version %s forecast %s rows issued after %s",
+            self.model_version, self.n_predictions, self.forecast_date.date()
+        )
+
+
+if __name__ == "__main__":
+    DailyPipelineFlow()
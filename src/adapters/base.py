@@ -1,7 +1,8 @@
 
 
+import re
 from abc import ABC, abstractmethod
-from datetime import datetime
+from datetime import date, datetime
 import polars as pl
 
 
@@ -9,6 +10,48 @@ import polars as pl
 
 DATABASE_NAME = 'nyc_trips'
 SCHEMA = 'main'
+TRIP_TABLE = 'pickup_trips'
+FEATURE_TABLE = 'pickup_daily_features'
+PREDICTION_TABLE = 'predictions'
+METRIC_TABLE = 'prediction_metrics'
+
+
+def pickup_table_name(granularity: str = "1h") -> str:
+    """Returns the name of the pickup timeseries table for a granularity. The hourly
+    table keeps its historical name, any other sub-daily granularity rebuilt from
+    the trip store gets its own table, e.g. pickup_15m.
+
+    Raises:
+        ValueError: If the granularity is not a sub-daily Polars duration string
+    """
+    if not re.fullmatch(r"[1-9]\d*[mh]", granularity):
+        raise ValueError(f"Unsupported granularity: {granularity}. Must be minutes or hours, e.g. 15m, 1h")
+    if granularity == "1h":
+        return "pickup_hourly"
+    return f"pickup_{granularity}"
+
+
+#### AGGREGATION PUSHDOWN
+
+# maps the polars duration string to the DuckDB date_trunc part
+GRANULARITIES = {
+    "1h": "hour",
+    "1d": "day",
+    "1w": "week"
+}
+AGGREGATES = ["sum", "mean", "max"]
+
+
+def validate_aggregation(granularity: str, aggregate: str) -> None:
+    """Validates the aggregation arguments shared by all repositories.
+
+    Raises:
+        ValueError: If the granularity or the aggregate is not supported
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}. Must be one of: {list(GRANULARITIES)}")
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"Unsupported aggregate: {aggregate}. Must be one of: {AGGREGATES}")
 
 
 
@@ -24,13 +67,140 @@ class NYCTaxiRepository(ABC):
         pass
         
     @abstractmethod
-    def upsert_pickup_data(self, data: pl.DataFrame):
+    def upsert_pickup_data(self, data: pl.DataFrame, granularity: str = "1h"):
+        pass
+    
+    @abstractmethod
+    def fetch_pickup_data(self, from_date: datetime, to_date: datetime, pickup_locations: list[int] | None = None, granularity: str = "1h") -> pl.DataFrame:
+        pass
+    
+    @abstractmethod
+    def fetch_aggregated_pickup_data(
+        self,
+        from_date: datetime,
+        to_date: datetime,
+        granularity: str = "1d",
+        aggregate: str = "sum",
+        pickup_locations: list[int] | None = None,
+        group_by_location: bool = True
+    ) -> pl.DataFrame:
+        """Fetches the pickup data aggregated to the given granularity. The aggregation
+        runs inside the repository so only the aggregated rows are returned.
+        
+        When group_by_location is False, the hourly pickups are first summed across
+        locations and the aggregate is applied over the resulting hourly series.
+
+        Args:
+            from_date (datetime): The start date and time for the query range.
+            to_date (datetime): The end date and time for the query range.
+            granularity (str): Target granularity, one of GRANULARITIES.
+            aggregate (str): Aggregate applied to num_pickup, one of AGGREGATES.
+            pickup_locations (list[int] | None): Optional list of pickup location IDs to filter on.
+            group_by_location (bool): If True, returns one series per pickup location.
+
+        Returns:
+            pl.DataFrame: pickup_datetime, [pickup_location_id,] num_pickup
+        """
+        pass
+    
+    @abstractmethod
+    def fetch_last_pickup_date(self) -> datetime | None:
+        """Returns the last hour in pickup_hourly, None if it's empty."""
+        pass
+    
+    @abstractmethod
+    def upsert_trip_data(self, data: pl.DataFrame, year: int, month: int):
+        """Replaces the trip level data of the given month. Trips are
+        partitioned by month so re-loading a file never duplicates trips.
+        """
+        pass
+    
+    @abstractmethod
+    def fetch_trip_data(self, year: int, month: int) -> pl.DataFrame:
+        """Returns the trip level data stored for the given month."""
         pass
     
     @abstractmethod
-    def fetch_pickup_data(self, from_date: datetime, to_date: datetime, pickup_locations: list[int] | None = None) -> pl.DataFrame:
+    def list_trip_months(self) -> list[date]:
+        """Returns the first day of every month available in the trip store."""
         pass
     
+    @abstractmethod
+    def upsert_feature_data(self, data: pl.DataFrame):
+        """Upserts rows of the daily feature store, keyed by pickup location
+        and day. Rows of existing days are replaced.
+        """
+        pass
+    
+    @abstractmethod
+    def fetch_feature_data(self, from_date: datetime, to_date: datetime, pickup_locations: list[int] | None = None) -> pl.DataFrame:
+        """Returns the feature store rows of the days in [from_date, to_date),
+        sorted by pickup location and day.
+        """
+        pass
+    
+    @abstractmethod
+    def fetch_last_feature_date(self) -> datetime | None:
+        """Returns the last day in the feature store, None if it's empty."""
+        pass
+    
+    @abstractmethod
+    def upsert_prediction_data(self, data: pl.DataFrame):
+        """Upserts forecasts keyed by (pickup_location_id, pickup_datetime, issued_at,
+        model_version), re-running a batch replaces its forecasts.
+        """
+        pass
+    
+    @abstractmethod
+    def fetch_prediction_data(
+        self,
+        from_date: datetime,
+        to_date: datetime,
+        pickup_locations: list[int] | None = None,
+        model_version: str | None = None
+    ) -> pl.DataFrame:
+        """Returns the forecasts of the dates in [from_date, to_date), optionally of
+        a single model version.
+        """
+        pass
+    
+    @abstractmethod
+    def update_metric_data(self, from_date: datetime, to_date: datetime, freq: str = "1d") -> int:
+        """Scores the stored forecasts of the days in [from_date, to_date) against
+        pickup_hourly summed to the forecast frequency. Only the forecasts with an
+        actual are scored, n counts every forecast and n_observed the scored ones,
+        the error sums are over the scored ones. The daily error statistics
+        replace the stored ones of these days. The join and the aggregation run
+        inside the repository engine.
+        
+        Returns:
+            int: The number of metric rows upserted
+        """
+        pass
+    
+    @abstractmethod
+    def fetch_metric_data(
+        self,
+        from_date: datetime,
+        to_date: datetime,
+        pickup_locations: list[int] | None = None,
+        model_version: str | None = None
+    ) -> pl.DataFrame:
+        """Returns the daily error statistics of the days in [from_date, to_date)."""
+        pass
+    
+    @abstractmethod
+    def fetch_last_metric_date(self) -> datetime | None:
+        """Returns the last scored day, None if nothing was scored yet."""
+        pass
+    
+    def ingest_raw_file(self, source: str, year: int, month: int, store_trips: bool = False) -> None:
+        """Runs the whole transformation of a raw file inside the repository engine
+        and writes the result straight into pickup_hourly. Only repositories backed
+        by a SQL engine implement it.
+        """
+        raise NotImplementedError(f"{type(self).__name__} can't ingest raw files, use the polars ETL engine")
+    
     
 def initialize_repository(repo_type: str = "duckdb", **kwargs) -> NYCTaxiRepository:
     """Initialize and return a repository instance based on the specified type.
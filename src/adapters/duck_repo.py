@@ -1,14 +1,32 @@
 import os 
 import duckdb 
 import polars as pl
-from datetime import datetime
+from datetime import date, datetime
 from pathlib import Path
 
 
 
-from src.etl.models import NYCPickupHourlySchema
-from src.adapters.base import NYCTaxiRepository, DATABASE_NAME, SCHEMA
-from src.common import DATA_DIR, get_logger
+from src.etl.models import (
+    NYCPickupHourlySchema,
+    NYCPickupAggregatedSchema,
+    NYCPickupTripSchema,
+    NYCPickupFeatureSchema,
+    NYCPickupPredictionSchema,
+    NYCPickupMetricSchema
+)
+from src.adapters.base import (
+    NYCTaxiRepository,
+    DATABASE_NAME,
+    SCHEMA,
+    TRIP_TABLE,
+    FEATURE_TABLE,
+    PREDICTION_TABLE,
+    METRIC_TABLE,
+    GRANULARITIES,
+    pickup_table_name,
+    validate_aggregation
+)
+from src.common import DATA_DIR, get_logger, load_environment
 
 
 
@@ -25,6 +43,7 @@ class DuckDBRepository(NYCTaxiRepository):
     def _resolve_db_url(self, db_url: str = None) -> str:
         """Resolves the final DB URL based on input or environment defaults."""
         if not db_url:
+            load_environment()
             db_url = os.getenv('DB_URL')
             if db_url:
                 logger.info('DB_URL found')
@@ -35,7 +54,7 @@ class DuckDBRepository(NYCTaxiRepository):
         # For explicitly provided URLs
         if isinstance(db_url, Path):
             return str(db_url / f"{DATABASE_NAME}.duckdb")
-        db_url if db_url.startswith('md') else str( Path(db_url) / f"{DATABASE_NAME}.duckdb")
+        return db_url if db_url.startswith('md') else str( Path(db_url) / f"{DATABASE_NAME}.duckdb")
         
     def _check_connection(self) -> None:
         """Validates connection and creates database if needed."""
@@ -69,6 +88,11 @@ class DuckDBRepository(NYCTaxiRepository):
         This function drops the existing dwh.main.pickup_hourly table if it exists and then creates a new one.
         The new table includes columns for a unique key, the hour of the pickup, the location ID of the pickup,
         and the number of pickups that occurred during that hour.
+        
+        It also creates the trip level pickup_trips table, which is only filled when
+        the ETL runs with the trip store enabled, the pickup_daily_features
+        feature store table, the predictions table and the prediction_metrics
+        monitoring table.
 
         Parameters:
         - db (duckdb.DuckDBPyConnection): The database connection object.
@@ -77,6 +101,10 @@ class DuckDBRepository(NYCTaxiRepository):
         None
         """
         self._pickup_table = f"{DATABASE_NAME}.{SCHEMA}.pickup_hourly" # noqa
+        self._trip_table = f"{DATABASE_NAME}.{SCHEMA}.{TRIP_TABLE}" # noqa
+        self._feature_table = f"{DATABASE_NAME}.{SCHEMA}.{FEATURE_TABLE}" # noqa
+        self._prediction_table = f"{DATABASE_NAME}.{SCHEMA}.{PREDICTION_TABLE}" # noqa
+        self._metric_table = f"{DATABASE_NAME}.{SCHEMA}.{METRIC_TABLE}" # noqa
 
         with self._get_connection() as conn:
             conn.execute(
@@ -85,36 +113,104 @@ class DuckDBRepository(NYCTaxiRepository):
                 """
             )
             
+            self._create_pickup_table(conn, "pickup_hourly")
+            
             conn.execute(
                 f"""
-                CREATE TABLE IF NOT EXISTS {self._pickup_table} (
-                    key STRING PRIMARY KEY
-                    , pickup_datetime_hour TIMESTAMP
-                    , num_pickup SMALLINT
+                CREATE TABLE IF NOT EXISTS {self._trip_table} (
+                    pickup_datetime TIMESTAMP
                     , pickup_location_id SMALLINT
+                    , passenger_count TINYINT
+                );
+                """
+            )
+            logger.info("Created %s table", self._trip_table)
+            
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self._feature_table} (
+                    pickup_datetime TIMESTAMP
+                    , pickup_location_id SMALLINT
+                    , num_pickup BIGINT
+                    , num_pickup_lags BIGINT[]
+                    , PRIMARY KEY (pickup_location_id, pickup_datetime)
+                );
+                """
+            )
+            logger.info("Created %s table", self._feature_table)
+            
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self._prediction_table} (
+                    pickup_location_id SMALLINT
+                    , pickup_datetime TIMESTAMP
+                    , issued_at TIMESTAMP
+                    , model_version STRING
+                    , horizon SMALLINT
+                    , y_pred DOUBLE
+                    , PRIMARY KEY (pickup_location_id, pickup_datetime, issued_at, model_version)
                 );
                 """
-            )    
-            logger.info("Created %s table", self._pickup_table)
+            )
+            logger.info("Created %s table", self._prediction_table)
             
-    def upsert_pickup_data(self, data: pl.DataFrame):
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self._metric_table} (
+                    pickup_location_id SMALLINT
+                    , pickup_datetime TIMESTAMP
+                    , model_version STRING
+                    , horizon SMALLINT
+                    , n BIGINT
+                    , n_observed BIGINT
+                    , sum_error DOUBLE
+                    , sum_abs_error DOUBLE
+                    , PRIMARY KEY (pickup_location_id, pickup_datetime, model_version, horizon)
+                );
+                """
+            )
+            logger.info("Created %s table", self._metric_table)
+    
+    @staticmethod
+    def _create_pickup_table(conn: duckdb.DuckDBPyConnection, table_name: str) -> None:
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {DATABASE_NAME}.{SCHEMA}.{table_name} (
+                key STRING PRIMARY KEY
+                , pickup_datetime_hour TIMESTAMP
+                , num_pickup SMALLINT
+                , pickup_location_id SMALLINT
+            );
+            """
+        )    
+        logger.info("Created %s.%s.%s table", DATABASE_NAME, SCHEMA, table_name)
+            
+    def upsert_pickup_data(self, data: pl.DataFrame, granularity: str = "1h"):
         """
         Upserts data from a processed file into the pickup_hourly table.
         Duckdb and Polars have a strong interoperability, polars DF
         are part of the scope of a DuckDB connection therefore they can
         be reference as SQL tables
         
+        Data at any other granularity goes to its own table, which is created
+        on the first upsert.
+        
         https://duckdb.org/docs/guides/python/polars.html
         """
         
+        table_name = pickup_table_name(granularity)
+        
         with self._get_connection() as conn:
+            
+            if granularity != "1h":
+                self._create_pickup_table(conn, table_name)
                 
             statement = f"""
                 CREATE OR REPLACE TEMP TABLE stg_pickup_hourly AS
                 SELECT * 
                 FROM data;
                 
-                INSERT INTO {DATABASE_NAME}.{SCHEMA}.pickup_hourly  
+                INSERT INTO {DATABASE_NAME}.{SCHEMA}.{table_name}  
                 SELECT * FROM stg_pickup_hourly
                 ON CONFLICT(key)
                 DO UPDATE SET num_pickup = EXCLUDED.num_pickup;
@@ -123,10 +219,355 @@ class DuckDBRepository(NYCTaxiRepository):
             """    
             conn.execute(statement)
             
-            logger.info("Upserted into dwh.main.pickup_hourly")
+            logger.info("Upserted into dwh.main.%s", table_name)
+    
+    @staticmethod
+    def _month_range(year: int, month: int) -> tuple[datetime, datetime]:
+        month_start = datetime(year, month, 1)
+        if month == 12:
+            return month_start, datetime(year + 1, 1, 1)
+        return month_start, datetime(year, month + 1, 1)
+            
+    def upsert_trip_data(self, data: pl.DataFrame, year: int, month: int):
+        """
+        Replaces the trips of the given month in the pickup_trips table. DuckDB has
+        no explicit partitions, trips are inserted sorted by pickup time so the
+        per row-group min/max indexes prune every other month on reads.
+        """
+        
+        month_start, month_end = self._month_range(year, month)
+        data = NYCPickupTripSchema.enforce_schema(data).sort("pickup_datetime")
+        
+        with self._get_connection() as conn:
+            conn.execute("BEGIN TRANSACTION;")
+            conn.execute(
+                f"""
+                DELETE FROM {DATABASE_NAME}.{SCHEMA}.{TRIP_TABLE}
+                WHERE pickup_datetime >= '{month_start}' AND pickup_datetime < '{month_end}';
+                """
+            )
+            conn.execute(
+                f"""
+                INSERT INTO {DATABASE_NAME}.{SCHEMA}.{TRIP_TABLE}
+                SELECT pickup_datetime, pickup_location_id, passenger_count FROM data;
+                """
+            )
+            conn.execute("COMMIT;")
+            
+        logger.info("Stored %s trips for %s-%02d", data.height, year, month)
+    
+    def fetch_trip_data(self, year: int, month: int) -> pl.DataFrame:
+        
+        month_start, month_end = self._month_range(year, month)
+        
+        with self._get_connection() as conn:
+            df = conn.sql(
+                f"""
+                SELECT pickup_datetime, pickup_location_id, passenger_count
+                FROM {DATABASE_NAME}.{SCHEMA}.{TRIP_TABLE}
+                WHERE pickup_datetime >= '{month_start}' AND pickup_datetime < '{month_end}'
+                """
+            ).pl()
+        return NYCPickupTripSchema.enforce_schema(df)
+    
+    def list_trip_months(self) -> list[date]:
+        
+        with self._get_connection() as conn:
+            months = conn.sql(
+                f"""
+                SELECT DISTINCT CAST(date_trunc('month', pickup_datetime) AS DATE) AS month
+                FROM {DATABASE_NAME}.{SCHEMA}.{TRIP_TABLE}
+                ORDER BY month
+                """
+            ).fetchall()
+        return [month for (month,) in months]
             
+    def upsert_feature_data(self, data: pl.DataFrame):
+        
+        data = NYCPickupFeatureSchema.enforce_schema(data)
+        
+        with self._get_connection() as conn:
+            conn.execute(
+                f"""
+                INSERT INTO {DATABASE_NAME}.{SCHEMA}.{FEATURE_TABLE}
+                SELECT pickup_datetime, pickup_location_id, num_pickup, num_pickup_lags FROM data
+                ON CONFLICT(pickup_location_id, pickup_datetime)
+                DO UPDATE SET num_pickup = EXCLUDED.num_pickup, num_pickup_lags = EXCLUDED.num_pickup_lags;
+                """
+            )
+        logger.info("Upserted %s rows into dwh.main.%s", data.height, FEATURE_TABLE)
+    
+    def fetch_feature_data(self, from_date: datetime, to_date: datetime, pickup_locations: list[int] | None = None) -> pl.DataFrame:
+        
+        where_clause = (
+            self._pickup_filter(from_date, to_date, pickup_locations)
+            .replace("pickup_datetime_hour", "pickup_datetime")
+        )
+        
+        with self._get_connection() as conn:
+            df = conn.sql(
+                f"""
+                SELECT pickup_datetime, pickup_location_id, num_pickup, num_pickup_lags
+                FROM {DATABASE_NAME}.{SCHEMA}.{FEATURE_TABLE}
+                WHERE {where_clause}
+                ORDER BY pickup_location_id, pickup_datetime
+                """
+            ).pl()
+        return NYCPickupFeatureSchema.enforce_schema(df)
+    
+    def fetch_last_pickup_date(self) -> datetime | None:
+        
+        with self._get_connection() as conn:
+            return conn.sql(
+                f"SELECT MAX(pickup_datetime_hour) FROM {DATABASE_NAME}.{SCHEMA}.pickup_hourly"
+            ).fetchone()[0]
+    
+    def fetch_last_feature_date(self) -> datetime | None:
+        
+        with self._get_connection() as conn:
+            return conn.sql(
+                f"SELECT MAX(pickup_datetime) FROM {DATABASE_NAME}.{SCHEMA}.{FEATURE_TABLE}"
+            ).fetchone()[0]
             
-    def fetch_pickup_data(self, from_date: datetime, to_date: datetime, pickup_locations: list[int] | None = None) -> pl.DataFrame:
+    def upsert_prediction_data(self, data: pl.DataFrame):
+        
+        data = NYCPickupPredictionSchema.enforce_schema(data)
+        
+        with self._get_connection() as conn:
+            conn.execute(
+                f"""
+                INSERT INTO {DATABASE_NAME}.{SCHEMA}.{PREDICTION_TABLE}
+                SELECT pickup_location_id, pickup_datetime, issued_at, model_version, horizon, y_pred FROM data
+                ON CONFLICT(pickup_location_id, pickup_datetime, issued_at, model_version)
+                DO UPDATE SET horizon = EXCLUDED.horizon, y_pred = EXCLUDED.y_pred;
+                """
+            )
+        logger.info("Upserted %s rows into dwh.main.%s", data.height, PREDICTION_TABLE)
+    
+    def fetch_prediction_data(
+        self,
+        from_date: datetime,
+        to_date: datetime,
+        pickup_locations: list[int] | None = None,
+        model_version: str | None = None
+    ) -> pl.DataFrame:
+        
+        where_clause = (
+            self._pickup_filter(from_date, to_date, pickup_locations)
+            .replace("pickup_datetime_hour", "pickup_datetime")
+        )
+        if model_version is not None:
+            where_clause += f" AND model_version = '{model_version}'"
+        
+        with self._get_connection() as conn:
+            df = conn.sql(
+                f"""
+                SELECT pickup_location_id, pickup_datetime, issued_at, model_version, horizon, y_pred
+                FROM {DATABASE_NAME}.{SCHEMA}.{PREDICTION_TABLE}
+                WHERE {where_clause}
+                ORDER BY pickup_location_id, issued_at, pickup_datetime
+                """
+            ).pl()
+        return NYCPickupPredictionSchema.enforce_schema(df)
+    
+    def update_metric_data(self, from_date: datetime, to_date: datetime, freq: str = "1d") -> int:
+        """Both sides of the join are pruned to [from_date, to_date) before joining,
+        the cost only depends on the number of days scored.
+        """
+        
+        validate_aggregation(freq, "sum")
+        where_clause = self._pickup_filter(from_date, to_date)
+        
+        with self._get_connection() as conn:
+            return conn.execute(
+                f"""
+                WITH actuals AS (
+                    SELECT
+                        pickup_location_id
+                        , date_trunc('{GRANULARITIES[freq]}', pickup_datetime_hour) AS pickup_datetime
+                        , SUM(num_pickup) AS y
+                    FROM {DATABASE_NAME}.{SCHEMA}.pickup_hourly
+                    WHERE {where_clause}
+                    GROUP BY ALL
+                ), errors AS (
+                    SELECT
+                        predictions.pickup_location_id
+                        , date_trunc('day', predictions.pickup_datetime) AS pickup_datetime
+                        , predictions.model_version
+                        , predictions.horizon
+                        , predictions.y_pred - actuals.y AS error
+                        , actuals.y IS NOT NULL AS observed
+                    FROM {DATABASE_NAME}.{SCHEMA}.{PREDICTION_TABLE} AS predictions
+                    LEFT JOIN actuals USING (pickup_location_id, pickup_datetime)
+                    WHERE {where_clause.replace("pickup_datetime_hour", "predictions.pickup_datetime")}
+                )
+                INSERT INTO {DATABASE_NAME}.{SCHEMA}.{METRIC_TABLE}
+                SELECT
+                    pickup_location_id
+                    , pickup_datetime
+                    , model_version
+                    , horizon
+                    , COUNT(*) AS n
+                    , COUNT(*) FILTER (WHERE observed) AS n_observed
+                    , COALESCE(SUM(error), 0) AS sum_error
+                    , COALESCE(SUM(ABS(error)), 0) AS sum_abs_error
+                FROM errors
+                GROUP BY ALL
+                ON CONFLICT(pickup_location_id, pickup_datetime, model_version, horizon)
+                DO UPDATE SET
+                    n = EXCLUDED.n
+                    , n_observed = EXCLUDED.n_observed
+                    , sum_error = EXCLUDED.sum_error
+                    , sum_abs_error = EXCLUDED.sum_abs_error;
+                """
+            ).fetchone()[0]
+    
+    def fetch_metric_data(
+        self,
+        from_date: datetime,
+        to_date: datetime,
+        pickup_locations: list[int] | None = None,
+        model_version: str | None = None
+    ) -> pl.DataFrame:
+        
+        where_clause = (
+            self._pickup_filter(from_date, to_date, pickup_locations)
+            .replace("pickup_datetime_hour", "pickup_datetime")
+        )
+        if model_version is not None:
+            where_clause += f" AND model_version = '{model_version}'"
+        
+        with self._get_connection() as conn:
+            df = conn.sql(
+                f"""
+                SELECT pickup_location_id, pickup_datetime, model_version, horizon, n, n_observed, sum_error, sum_abs_error
+                FROM {DATABASE_NAME}.{SCHEMA}.{METRIC_TABLE}
+                WHERE {where_clause}
+                ORDER BY pickup_location_id, model_version, horizon, pickup_datetime
+                """
+            ).pl()
+        return NYCPickupMetricSchema.enforce_schema(df)
+    
+    def fetch_last_metric_date(self) -> datetime | None:
+        
+        with self._get_connection() as conn:
+            return conn.sql(
+                f"SELECT MAX(pickup_datetime) FROM {DATABASE_NAME}.{SCHEMA}.{METRIC_TABLE}"
+            ).fetchone()[0]
+    
+    def _raw_trips_query(self, source: str, year: int, month: int) -> str:
+        """SQL version of clean_raw_data: standardizes the raw schema and keeps the trips
+        of the given year and month.
+        """
+        return f"""
+            SELECT 
+                CAST(tpep_pickup_datetime AS TIMESTAMP) AS pickup_datetime
+                , CAST(PULocationID AS INTEGER) AS pickup_location_id
+                , CAST(passenger_count AS INTEGER) AS passenger_count
+            FROM 
+                read_parquet('{source}')
+            WHERE 
+                year(CAST(tpep_pickup_datetime AS TIMESTAMP)) = {year}
+                AND month(CAST(tpep_pickup_datetime AS TIMESTAMP)) = {month}
+        """
+            
+    def ingest_raw_file(self, source: str, year: int, month: int, store_trips: bool = False) -> None:
+        """
+        DuckDB ETL engine. Runs the same chain as transform_raw_data (standardization,
+        range filter, hourly aggregation, densification and key generation) as a single
+        SQL statement over read_parquet and upserts the result into pickup_hourly, so
+        the data never crosses into Python.
+        
+        When store_trips is set the clean trips are loaded into pickup_trips first and
+        the aggregation reads them from there instead of reading the file twice.
+        
+        The key must match the one built by add_surrogate_key, Polars casts the
+        datetime to string with microseconds.
+        """
+        
+        month_start, month_end = self._month_range(year, month)
+        trips_query = self._raw_trips_query(source, year, month)
+        
+        with self._get_connection() as conn:
+            
+            if store_trips:
+                conn.execute("BEGIN TRANSACTION;")
+                conn.execute(
+                    f"""
+                    DELETE FROM {DATABASE_NAME}.{SCHEMA}.{TRIP_TABLE}
+                    WHERE pickup_datetime >= '{month_start}' AND pickup_datetime < '{month_end}';
+                    """
+                )
+                conn.execute(
+                    f"""
+                    INSERT INTO {DATABASE_NAME}.{SCHEMA}.{TRIP_TABLE}
+                    SELECT pickup_datetime, pickup_location_id, passenger_count
+                    FROM ({trips_query})
+                    ORDER BY pickup_datetime;
+                    """
+                )
+                conn.execute("COMMIT;")
+                trips_query = f"""
+                    SELECT pickup_datetime, pickup_location_id
+                    FROM {DATABASE_NAME}.{SCHEMA}.{TRIP_TABLE}
+                    WHERE pickup_datetime >= '{month_start}' AND pickup_datetime < '{month_end}'
+                """
+                logger.info("Stored trips for %s-%02d", year, month)
+            
+            statement = f"""
+                INSERT INTO {DATABASE_NAME}.{SCHEMA}.pickup_hourly
+                WITH trips AS (
+                    {trips_query}
+                )
+                , hourly_pickups AS (
+                    SELECT 
+                        date_trunc('hour', pickup_datetime) AS pickup_datetime_hour
+                        , pickup_location_id
+                        , COUNT(pickup_location_id) AS num_pickup
+                    FROM trips
+                    GROUP BY ALL
+                )
+                , hours AS (
+                    SELECT unnest(range(TIMESTAMP '{month_start}', TIMESTAMP '{month_end}', INTERVAL 1 HOUR)) AS pickup_datetime_hour
+                )
+                , locations AS (
+                    SELECT DISTINCT pickup_location_id FROM hourly_pickups
+                )
+                SELECT 
+                    strftime(hours.pickup_datetime_hour, '%Y-%m-%d %H:%M:%S.%f') || '-' || locations.pickup_location_id AS key
+                    , hours.pickup_datetime_hour
+                    , COALESCE(hourly_pickups.num_pickup, 0) AS num_pickup
+                    , locations.pickup_location_id
+                FROM hours
+                CROSS JOIN locations
+                LEFT JOIN hourly_pickups USING (pickup_datetime_hour, pickup_location_id)
+                ON CONFLICT(key)
+                DO UPDATE SET num_pickup = EXCLUDED.num_pickup;
+            """
+            inserted_rows = conn.execute(statement).fetchone()[0]
+            
+            logger.info("Upserted %s rows for %s-%02d into dwh.main.pickup_hourly", inserted_rows, year, month)
+    
+    @staticmethod
+    def _pickup_filter(from_date: datetime, to_date: datetime, pickup_locations: list[int] | int | None = None) -> str:
+        """Builds the WHERE clause shared by the pickup_hourly queries."""
+        
+        if from_date > to_date:
+            raise ValueError(f"{from_date} can't be higher than {to_date}")
+        
+        if pickup_locations is None:
+            pickup_locations = []
+        
+        if isinstance(pickup_locations, int):
+            pickup_locations = [pickup_locations]
+        
+        return f"""
+                pickup_datetime_hour >= '{from_date}' 
+                AND pickup_datetime_hour < '{to_date}'
+                AND IF(LENGTH({pickup_locations}) > 0, list_contains({pickup_locations}, pickup_location_id), TRUE)
+            """
+            
+    def fetch_pickup_data(self, from_date: datetime, to_date: datetime, pickup_locations: list[int] | None = None, granularity: str = "1h") -> pl.DataFrame:
         """
         Fetches pickup data from the data warehouse for a given date range and optional list of pickup locations.
 
@@ -134,19 +575,13 @@ class DuckDBRepository(NYCTaxiRepository):
         - from_date (datetime): The start date and time for the query range.
         - to_date (datetime): The end date and time for the query range.
         - pickup_locations (list[int] | None): Optional. A list of integers representing pickup location IDs to filter the query. If None, no location filter is applied.
+        - granularity (str): The granularity table to read from, defaults to pickup_hourly.
 
         Returns:
         - pl.DataFrame: A Polars DataFrame containing the query results.
         """
         
-        if from_date > to_date:
-            raise ValueError(f"{from_date} can't be higher than {to_date}")
-        
-        if pickup_locations is None:
-            pickup_locations = []
-        
-        if isinstance(pickup_locations, int):
-            pickup_locations = [pickup_locations]
+        where_clause = self._pickup_filter(from_date, to_date, pickup_locations)
         
         with self._get_connection() as conn:
             query = f"""
@@ -156,12 +591,74 @@ class DuckDBRepository(NYCTaxiRepository):
                 , pickup_location_id
                 , num_pickup
             FROM 
-                {DATABASE_NAME}.{SCHEMA}.pickup_hourly
+                {DATABASE_NAME}.{SCHEMA}.{pickup_table_name(granularity)}
             WHERE 
-                pickup_datetime_hour >= '{from_date}' 
-                AND pickup_datetime_hour < '{to_date}'
-                AND IF(LENGTH({pickup_locations}) > 0, list_contains({pickup_locations}, pickup_location_id), TRUE)
+                {where_clause}
             """
             df = conn.sql(query).pl()  
         return NYCPickupHourlySchema.enforce_schema(df)
+    
+    def fetch_aggregated_pickup_data(
+        self,
+        from_date: datetime,
+        to_date: datetime,
+        granularity: str = "1d",
+        aggregate: str = "sum",
+        pickup_locations: list[int] | None = None,
+        group_by_location: bool = True
+    ) -> pl.DataFrame:
+        """
+        Fetches pickup data aggregated to the given granularity. The whole aggregation
+        is executed by DuckDB, only the aggregated rows are returned.
 
+        Parameters:
+        - from_date (datetime): The start date and time for the query range.
+        - to_date (datetime): The end date and time for the query range.
+        - granularity (str): Target granularity, one of '1h', '1d' or '1w'.
+        - aggregate (str): Aggregate applied to num_pickup, one of 'sum', 'mean' or 'max'.
+        - pickup_locations (list[int] | None): Optional. A list of pickup location IDs to filter the query.
+        - group_by_location (bool): If False, the hourly pickups are summed across locations before aggregating.
+
+        Returns:
+        - pl.DataFrame: A Polars DataFrame with pickup_datetime, [pickup_location_id,] num_pickup
+        """
+        
+        validate_aggregation(granularity, aggregate)
+        where_clause = self._pickup_filter(from_date, to_date, pickup_locations)
+        
+        if group_by_location:
+            location_column = ", pickup_location_id"
+            order_by = "pickup_location_id, pickup_datetime"
+            hourly_source = f"""
+                SELECT pickup_datetime_hour, pickup_location_id, num_pickup
+                FROM {DATABASE_NAME}.{SCHEMA}.pickup_hourly
+                WHERE {where_clause}
+            """
+        else:
+            location_column = ""
+            order_by = "pickup_datetime"
+            hourly_source = f"""
+                SELECT pickup_datetime_hour, SUM(num_pickup) AS num_pickup
+                FROM {DATABASE_NAME}.{SCHEMA}.pickup_hourly
+                WHERE {where_clause}
+                GROUP BY pickup_datetime_hour
+            """
+        
+        aggregate_function = {"sum": "SUM", "mean": "AVG", "max": "MAX"}[aggregate]
+        
+        with self._get_connection() as conn:
+            query = f"""
+            WITH hourly AS (
+                {hourly_source}
+            )
+            SELECT 
+                date_trunc('{GRANULARITIES[granularity]}', pickup_datetime_hour) AS pickup_datetime
+                {location_column}
+                , {aggregate_function}(num_pickup) AS num_pickup
+            FROM 
+                hourly
+            GROUP BY ALL
+            ORDER BY {order_by}
+            """
+            df = conn.sql(query).pl()
+        return NYCPickupAggregatedSchema.enforce_schema(df, aggregate)
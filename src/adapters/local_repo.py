@@ -1,12 +1,29 @@
 import os 
 import polars as pl
-from datetime import datetime
+from datetime import date, datetime
 from pathlib import Path
 
 
 
-from src.etl.models import NYCPickupHourlySchema
-from src.adapters.base import NYCTaxiRepository, DATABASE_NAME, SCHEMA
+from src.etl.models import (
+    NYCPickupHourlySchema,
+    NYCPickupAggregatedSchema,
+    NYCPickupTripSchema,
+    NYCPickupFeatureSchema,
+    NYCPickupPredictionSchema,
+    NYCPickupMetricSchema
+)
+from src.adapters.base import (
+    NYCTaxiRepository,
+    DATABASE_NAME,
+    SCHEMA,
+    TRIP_TABLE,
+    FEATURE_TABLE,
+    PREDICTION_TABLE,
+    METRIC_TABLE,
+    pickup_table_name,
+    validate_aggregation
+)
 from src.common import DATA_DIR, get_logger
 
 
@@ -38,9 +55,28 @@ class LocalRepository(NYCTaxiRepository):
         (self.root_dir / DATABASE_NAME).mkdir(exist_ok=True)
         (self.root_dir / DATABASE_NAME / SCHEMA).mkdir(exist_ok=True)
         (self.root_dir / DATABASE_NAME / SCHEMA / "pickup_hourly").mkdir(exist_ok=True)
+        (self.root_dir / DATABASE_NAME / SCHEMA / TRIP_TABLE).mkdir(exist_ok=True)
+        (self.root_dir / DATABASE_NAME / SCHEMA / FEATURE_TABLE).mkdir(exist_ok=True)
+        (self.root_dir / DATABASE_NAME / SCHEMA / PREDICTION_TABLE).mkdir(exist_ok=True)
+        (self.root_dir / DATABASE_NAME / SCHEMA / METRIC_TABLE).mkdir(exist_ok=True)
         
         logger.info("Created %s.%s.pickup_hourly table", DATABASE_NAME, SCHEMA)
+        logger.info("Created %s.%s.%s table", DATABASE_NAME, SCHEMA, TRIP_TABLE)
+        logger.info("Created %s.%s.%s table", DATABASE_NAME, SCHEMA, FEATURE_TABLE)
+        logger.info("Created %s.%s.%s table", DATABASE_NAME, SCHEMA, PREDICTION_TABLE)
+        logger.info("Created %s.%s.%s table", DATABASE_NAME, SCHEMA, METRIC_TABLE)
         self._pickup_table = self.root_dir / DATABASE_NAME / SCHEMA / "pickup_hourly" / "data.parquet"
+        self._trip_table = self.root_dir / DATABASE_NAME / SCHEMA / TRIP_TABLE
+        self._feature_table = self.root_dir / DATABASE_NAME / SCHEMA / FEATURE_TABLE / "data.parquet"
+        self._prediction_table = self.root_dir / DATABASE_NAME / SCHEMA / PREDICTION_TABLE / "data.parquet"
+        self._metric_table = self.root_dir / DATABASE_NAME / SCHEMA / METRIC_TABLE / "data.parquet"
+    
+    def _resolve_pickup_table(self, granularity: str = "1h") -> Path:
+        if granularity == "1h":
+            return self._pickup_table
+        table_dir = self.root_dir / DATABASE_NAME / SCHEMA / pickup_table_name(granularity)
+        table_dir.mkdir(exist_ok=True)
+        return table_dir / "data.parquet"
     
     @staticmethod
     def _deduplicate_pickup_data(new_data: pl.DataFrame, current_data:pl.DataFrame) -> pl.DataFrame:
@@ -58,27 +94,268 @@ class LocalRepository(NYCTaxiRepository):
         )
 
 
-    def upsert_pickup_data(self, data: pl.DataFrame):   
+    def upsert_pickup_data(self, data: pl.DataFrame, granularity: str = "1h"):   
+        
+        pickup_table = self._resolve_pickup_table(granularity)
              
-        if not self._pickup_table.exists():
-            data.write_parquet(self._pickup_table)
+        if not pickup_table.exists():
+            data.write_parquet(pickup_table)
         
-        current_data = NYCPickupHourlySchema.enforce_schema(pl.read_parquet(self._pickup_table))
+        current_data = NYCPickupHourlySchema.enforce_schema(pl.read_parquet(pickup_table))
         current_data = self._deduplicate_pickup_data(new_data=data, current_data=current_data)
-        current_data.write_parquet(self._pickup_table)
+        current_data.write_parquet(pickup_table)
         logger.info('data persisted')
+    
+    def _trip_partition(self, year: int, month: int) -> Path:
+        return self._trip_table / f"month={year}-{month:02d}" / "data.parquet"
+        
+    def upsert_trip_data(self, data: pl.DataFrame, year: int, month: int):
+        """Trips are stored as one parquet file per month, an upsert overwrites
+        the month partition.
+        """
+        
+        partition = self._trip_partition(year, month)
+        partition.parent.mkdir(exist_ok=True)
+        (
+            NYCPickupTripSchema.enforce_schema(data)
+            .sort("pickup_datetime")
+            .write_parquet(partition)
+        )
+        logger.info("Stored %s trips for %s-%02d", data.height, year, month)
+    
+    def fetch_trip_data(self, year: int, month: int) -> pl.DataFrame:
+        
+        partition = self._trip_partition(year, month)
+        if not partition.exists():
+            return NYCPickupTripSchema.enforce_schema(
+                pl.DataFrame(schema=NYCPickupTripSchema._get_type_mapping())
+            )
+        return NYCPickupTripSchema.enforce_schema(pl.read_parquet(partition))
+    
+    def list_trip_months(self) -> list[date]:
+        
+        return sorted(
+            datetime.strptime(partition.parent.name, "month=%Y-%m").date()
+            for partition in self._trip_table.glob("month=*/data.parquet")
+        )
 
     
     
-    def fetch_pickup_data(self, from_date: datetime, to_date: datetime, pickup_locations: list[int] | None = None) -> pl.DataFrame:
+    def upsert_feature_data(self, data: pl.DataFrame):
+        """The feature store is a single parquet file sorted by location and day,
+        new rows replace the stored rows of the same location and day.
+        """
+        
+        new_data = NYCPickupFeatureSchema.enforce_schema(data)
+        current_data = new_data
+        if self._feature_table.exists():
+            current_data = pl.concat([
+                pl.read_parquet(self._feature_table)
+                .join(new_data, on=['pickup_location_id', 'pickup_datetime'], how='anti'),
+                new_data
+            ])
+        (
+            current_data
+            .sort(['pickup_location_id', 'pickup_datetime'])
+            .write_parquet(self._feature_table)
+        )
+        logger.info("Upserted %s rows into %s", new_data.height, FEATURE_TABLE)
+    
+    def fetch_feature_data(self, from_date: datetime, to_date: datetime, pickup_locations: list[int] | None = None) -> pl.DataFrame:
         
         if from_date > to_date:
             raise ValueError(f"{from_date} can't be higher than {to_date}")
         
+        if not self._feature_table.exists():
+            return NYCPickupFeatureSchema.enforce_schema(
+                pl.DataFrame(schema=NYCPickupFeatureSchema._get_type_mapping())
+            )
+        
         data = (
+            pl.scan_parquet(self._feature_table)
+            .filter(pl.col('pickup_datetime').is_between(from_date, to_date, closed='left'))
+        )
+        if pickup_locations:
+            if isinstance(pickup_locations, int):
+                pickup_locations = [pickup_locations]
+            data = data.filter(pl.col('pickup_location_id').is_in(pickup_locations))
+        return NYCPickupFeatureSchema.enforce_schema(data.collect())
+    
+    def fetch_last_pickup_date(self) -> datetime | None:
+        
+        if not self._pickup_table.exists():
+            return None
+        return (
             pl.scan_parquet(self._pickup_table)
+            .select(pl.col('pickup_datetime_hour').max())
+            .collect()
+            .item()
+        )
+    
+    def fetch_last_feature_date(self) -> datetime | None:
+        
+        if not self._feature_table.exists():
+            return None
+        return (
+            pl.scan_parquet(self._feature_table)
+            .select(pl.col('pickup_datetime').max())
+            .collect()
+            .item()
+        )
+    
+    def upsert_prediction_data(self, data: pl.DataFrame):
+        """Predictions are a single parquet file, new forecasts replace the stored
+        ones with the same key.
+        """
+        
+        key = ['pickup_location_id', 'pickup_datetime', 'issued_at', 'model_version']
+        new_data = NYCPickupPredictionSchema.enforce_schema(data)
+        current_data = new_data
+        if self._prediction_table.exists():
+            current_data = pl.concat([
+                pl.read_parquet(self._prediction_table).join(new_data, on=key, how='anti'),
+                new_data
+            ])
+        (
+            current_data
+            .sort(['pickup_location_id', 'issued_at', 'pickup_datetime'])
+            .write_parquet(self._prediction_table)
+        )
+        logger.info("Upserted %s rows into %s", new_data.height, PREDICTION_TABLE)
+    
+    def fetch_prediction_data(
+        self,
+        from_date: datetime,
+        to_date: datetime,
+        pickup_locations: list[int] | None = None,
+        model_version: str | None = None
+    ) -> pl.DataFrame:
+        
+        if from_date > to_date:
+            raise ValueError(f"{from_date} can't be higher than {to_date}")
+        
+        if not self._prediction_table.exists():
+            return NYCPickupPredictionSchema.enforce_schema(
+                pl.DataFrame(schema=NYCPickupPredictionSchema._get_type_mapping())
+            )
+        
+        data = (
+            pl.scan_parquet(self._prediction_table)
+            .filter(pl.col('pickup_datetime').is_between(from_date, to_date, closed='left'))
+        )
+        if pickup_locations:
+            if isinstance(pickup_locations, int):
+                pickup_locations = [pickup_locations]
+            data = data.filter(pl.col('pickup_location_id').is_in(pickup_locations))
+        if model_version is not None:
+            data = data.filter(pl.col('model_version') == model_version)
+        return NYCPickupPredictionSchema.enforce_schema(data.collect())
+    
+    def update_metric_data(self, from_date: datetime, to_date: datetime, freq: str = "1d") -> int:
+        """Forecasts and actuals are joined lazily over the parquet files, both scans
+        are filtered to [from_date, to_date) so only these days are read. The
+        metrics are a single parquet file where the scored days are replaced.
+        """
+        
+        validate_aggregation(freq, "sum")
+        if from_date > to_date:
+            raise ValueError(f"{from_date} can't be higher than {to_date}")
+        if not self._prediction_table.exists():
+            return 0
+        
+        key = ['pickup_location_id', 'pickup_datetime']
+        actuals = (
+            self._scan_pickup_data(from_date, to_date)
+            .group_by(
+                pl.col('pickup_location_id'),
+                pl.col('pickup_datetime_hour').dt.truncate(freq).alias('pickup_datetime')
+            )
+            .agg(pl.col('num_pickup').cast(pl.Int64).sum().alias('y'))
+        )
+        metrics = (
+            pl.scan_parquet(self._prediction_table)
+            .filter(pl.col('pickup_datetime').is_between(from_date, to_date, closed='left'))
+            .join(actuals, on=key, how='left')
+            .with_columns(
+                (pl.col('y_pred') - pl.col('y')).alias('error'),
+                pl.col('pickup_datetime').dt.truncate('1d')
+            )
+            .group_by(key + ['model_version', 'horizon'])
+            .agg(
+                pl.len().alias('n'),
+                pl.col('y').is_not_null().sum().alias('n_observed'),
+                pl.col('error').sum().alias('sum_error'),
+                pl.col('error').abs().sum().alias('sum_abs_error')
+            )
+            .collect()
+            .pipe(NYCPickupMetricSchema.enforce_schema)
+        )
+        
+        current_data = metrics
+        if self._metric_table.exists():
+            current_data = pl.concat([
+                pl.read_parquet(self._metric_table)
+                .filter(~pl.col('pickup_datetime').is_between(from_date, to_date, closed='left')),
+                metrics
+            ])
+        (
+            current_data
+            .sort(['pickup_datetime', 'pickup_location_id', 'model_version', 'horizon'])
+            .write_parquet(self._metric_table)
+        )
+        logger.info("Upserted %s rows into %s", metrics.height, METRIC_TABLE)
+        return metrics.height
+    
+    def fetch_metric_data(
+        self,
+        from_date: datetime,
+        to_date: datetime,
+        pickup_locations: list[int] | None = None,
+        model_version: str | None = None
+    ) -> pl.DataFrame:
+        
+        if from_date > to_date:
+            raise ValueError(f"{from_date} can't be higher than {to_date}")
+        
+        if not self._metric_table.exists():
+            return NYCPickupMetricSchema.enforce_schema(
+                pl.DataFrame(schema=NYCPickupMetricSchema._get_type_mapping())
+            )
+        
+        data = (
+            pl.scan_parquet(self._metric_table)
+            .filter(pl.col('pickup_datetime').is_between(from_date, to_date, closed='left'))
+        )
+        if pickup_locations:
+            if isinstance(pickup_locations, int):
+                pickup_locations = [pickup_locations]
+            data = data.filter(pl.col('pickup_location_id').is_in(pickup_locations))
+        if model_version is not None:
+            data = data.filter(pl.col('model_version') == model_version)
+        return NYCPickupMetricSchema.enforce_schema(
+            data.sort(['pickup_location_id', 'model_version', 'horizon', 'pickup_datetime']).collect()
+        )
+    
+    def fetch_last_metric_date(self) -> datetime | None:
+        
+        if not self._metric_table.exists():
+            return None
+        return (
+            pl.scan_parquet(self._metric_table)
+            .select(pl.col('pickup_datetime').max())
+            .collect()
+            .item()
+        )
+    
+    def _scan_pickup_data(self, from_date: datetime, to_date: datetime, pickup_locations: list[int] | None = None, granularity: str = "1h") -> pl.LazyFrame:
+        
+        if from_date > to_date:
+            raise ValueError(f"{from_date} can't be higher than {to_date}")
+        
+        data = (
+            pl.scan_parquet(self._resolve_pickup_table(granularity))
             .filter(
-                pl.col('pickup_datetime_hour').is_between(from_date, to_date)
+                pl.col('pickup_datetime_hour').is_between(from_date, to_date, closed='left')
             )
         )
         
@@ -91,6 +368,53 @@ class LocalRepository(NYCTaxiRepository):
                         pl.col('pickup_location_id').is_in(pickup_locations)
                     )
             )
+        return data
+    
+    def fetch_pickup_data(self, from_date: datetime, to_date: datetime, pickup_locations: list[int] | None = None, granularity: str = "1h") -> pl.DataFrame:
         
+        data = self._scan_pickup_data(from_date, to_date, pickup_locations, granularity)
         return NYCPickupHourlySchema.enforce_schema(data.collect())
-            
\ No newline at end of file
+    
+    def fetch_aggregated_pickup_data(
+        self,
+        from_date: datetime,
+        to_date: datetime,
+        granularity: str = "1d",
+        aggregate: str = "sum",
+        pickup_locations: list[int] | None = None,
+        group_by_location: bool = True
+    ) -> pl.DataFrame:
+        """The aggregation is built as a lazy plan on top of the parquet
+        scan, therefore only the aggregated rows are materialized.
+        """
+        
+        validate_aggregation(granularity, aggregate)
+        
+        data = (
+            self._scan_pickup_data(from_date, to_date, pickup_locations)
+            .with_columns(pl.col('num_pickup').cast(pl.Int64))
+        )
+        
+        if group_by_location:
+            group_keys = ['pickup_location_id']
+        else:
+            group_keys = []
+            data = (
+                data
+                .group_by('pickup_datetime_hour')
+                .agg(pl.col('num_pickup').sum())
+            )
+        
+        aggregated_data = (
+            data
+            .group_by(
+                [pl.col('pickup_datetime_hour').dt.truncate(granularity).alias('pickup_datetime')]
+                + group_keys
+            )
+            .agg(
+                getattr(pl.col('num_pickup'), aggregate)()
+            )
+            .sort(group_keys + ['pickup_datetime'])
+        )
+        
+        return NYCPickupAggregatedSchema.enforce_schema(aggregated_data.collect(), aggregate)
@@ -1,7 +1,15 @@
+from functools import cache
 from pathlib import Path
-from dotenv import load_dotenv
 
-load_dotenv()
+
+@cache
+def load_environment() -> None:
+    """Loads the .env file into the environment, once. Called by the code reading
+    the environment instead of on import, so commands that don't need it skip
+    importing dotenv.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
 
 
 ### FOLDERS 
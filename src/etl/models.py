@@ -30,4 +30,112 @@ class NYCPickupHourlySchema:
             .select(cls._get_columns())
             .cast(cls._get_type_mapping())
         )
-        
\ No newline at end of file
+        
+
+
+class NYCPickupAggregatedSchema(NYCPickupHourlySchema):
+    """Types of the pickup data aggregated by the repository. The
+    location is optional since the data can be aggregated across all locations
+    and the type of num_pickup depends on the aggregate.
+    """
+    
+    SCHEMA = [
+        {"column": "pickup_datetime", "type": pl.Datetime},
+        {"column": "pickup_location_id", "type": pl.Int32},
+        {"column": "num_pickup", "type": pl.Int64}
+    ]
+    
+    @classmethod
+    def enforce_schema(cls, df: pl.DataFrame, aggregate: str = "sum") -> pl.DataFrame:
+        type_mapping = {
+            column: dtype for column, dtype in cls._get_type_mapping().items()
+            if column in df.columns
+        }
+        if aggregate == "mean":
+            type_mapping["num_pickup"] = pl.Float64
+        return (
+            df
+            .select(list(type_mapping))
+            .cast(type_mapping)
+        )
+
+
+
+class NYCPickupTripSchema(NYCPickupHourlySchema):
+    """Trip level data kept in the raw store. Types are as compact
+    as the values allow since this table holds one row per trip.
+    """
+    
+    SCHEMA = [
+        {"column": "pickup_datetime", "type": pl.Datetime},
+        {"column": "pickup_location_id", "type": pl.Int16},
+        {"column": "passenger_count", "type": pl.Int8}
+    ]
+
+
+
+class NYCPickupFeatureSchema(NYCPickupHourlySchema):
+    """Rows of the daily feature store. num_pickup_lags holds the dense lags
+    1..max_lag of the daily pickups, the i-th item being the value i days before.
+    """
+    
+    SCHEMA = [
+        {"column": "pickup_datetime", "type": pl.Datetime},
+        {"column": "pickup_location_id", "type": pl.Int32},
+        {"column": "num_pickup", "type": pl.Int64},
+        {"column": "num_pickup_lags", "type": pl.List(pl.Int64)}
+    ]
+
+
+
+class NYCPickupPredictionSchema(NYCPickupHourlySchema):
+    """Forecasts stored by the batch inference. A forecast is identified by
+    location, forecasted date, the moment it was issued and the model version.
+    """
+    
+    SCHEMA = [
+        {"column": "pickup_location_id", "type": pl.Int32},
+        {"column": "pickup_datetime", "type": pl.Datetime},
+        {"column": "issued_at", "type": pl.Datetime},
+        {"column": "model_version", "type": pl.String},
+        {"column": "horizon", "type": pl.Int32},
+        {"column": "y_pred", "type": pl.Float64}
+    ]
+
+
+class NYCPickupMetricSchema(NYCPickupHourlySchema):
+    """Daily sufficient statistics of the forecast errors by location, model
+    version and horizon. The error is y_pred - y, metrics over any window are
+    sums of the daily rows divided by n.
+    """
+    
+    SCHEMA = [
+        {"column": "pickup_location_id", "type": pl.Int32},
+        {"column": "pickup_datetime", "type": pl.Datetime},
+        {"column": "model_version", "type": pl.String},
+        {"column": "horizon", "type": pl.Int32},
+        {"column": "n", "type": pl.Int64},
+        {"column": "n_observed", "type": pl.Int64},
+        {"column": "sum_error", "type": pl.Float64},
+        {"column": "sum_abs_error", "type": pl.Float64}
+    ]
+
+
+class NYCPickupDashboardSchema(NYCPickupHourlySchema):
+    """Daily rows of the monitoring dashboard by location: the actual pickups,
+    the latest forecast issued for the day with its interval, and its error
+    y_pred - y once the day is observed.
+    """
+    
+    SCHEMA = [
+        {"column": "pickup_location_id", "type": pl.Int32},
+        {"column": "pickup_datetime", "type": pl.Datetime},
+        {"column": "actual", "type": pl.Int64},
+        {"column": "forecast", "type": pl.Float64},
+        {"column": "forecast_lo", "type": pl.Float64},
+        {"column": "forecast_hi", "type": pl.Float64},
+        {"column": "error", "type": pl.Float64},
+        {"column": "horizon", "type": pl.Int32},
+        {"column": "model_version", "type": pl.String},
+        {"column": "issued_at", "type": pl.Datetime}
+    ]
@@ -1,5 +1,6 @@
 import polars as pl
 from datetime import date
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
 
@@ -7,20 +8,25 @@ from src.common import get_logger
 from src.adapters.base import NYCTaxiRepository
 
 
-from src.etl.transform import transform_raw_data
+from src.etl.transform import clean_raw_data, aggregate_trip_data
 from src.etl.helpers import generate_list_of_months
 
 
 logger = get_logger(__name__)
 
-def fetch_raw_data(year:int, month:int) -> pl.DataFrame:
-    """
-    """
+ETL_ENGINES = ["polars", "duckdb"]
+
+
+def raw_data_url(year:int, month:int) -> str:
     FILE_PATTERN = "yellow_tripdata_{year}-{month:02d}.parquet"
     BASE_URL = f"https://d37ci6vzurychx.cloudfront.net/trip-data/{FILE_PATTERN}"
+    return BASE_URL.format(year=year, month=month)
 
 
-    url = BASE_URL.format(year=year, month=month)
+def fetch_raw_data(year:int, month:int) -> pl.DataFrame:
+    """
+    """
+    url = raw_data_url(year, month)
     
     try:
         df = pl.read_parquet(url)
@@ -29,28 +35,54 @@ def fetch_raw_data(year:int, month:int) -> pl.DataFrame:
         logger.exception("Error downloading %s", url)
         
     
-def file_etl(repo: NYCTaxiRepository, year:int, month:int) -> None:
+def validate_engine(repo: NYCTaxiRepository, engine: str) -> None:
+    """
+    Checks that engine is an ETL engine the repository supports.
+
+    Raises:
+        ValueError: If engine isn't one of ETL_ENGINES
+        NotImplementedError: If engine is 'duckdb' and the repository can't ingest raw files
+    """
+    if engine not in ETL_ENGINES:
+        raise ValueError(f"Unsupported ETL engine: {engine}. Must be one of: {ETL_ENGINES}")
+    if engine == "duckdb" and type(repo).ingest_raw_file is NYCTaxiRepository.ingest_raw_file:
+        raise NotImplementedError(f"{type(repo).__name__} can't ingest raw files, use the polars ETL engine")
+
+
+def file_etl(repo: NYCTaxiRepository, year:int, month:int, store_trips: bool = False, engine: str = "polars") -> None:
     """
     Executes the ETL process for a single file corresponding to a given year and month.
     Parameters:
     - year (int): The year of the data file to process.
     - month (int): The month of the data file to process.
+    - store_trips (bool): If True, the clean trip level data is kept in the trip store
+      so it can be re-aggregated later without downloading the file again.
+    - engine (str): 'polars' transforms the file in Polars and upserts the result, 'duckdb'
+      delegates the whole transformation to the repository SQL engine.
 
     Returns:
     None. The function performs operations that result in writing to disk and database but does not return any value.
     """
     
+    validate_engine(repo, engine)
+    
+    if engine == "duckdb":
+        repo.ingest_raw_file(raw_data_url(year, month), year, month, store_trips)
+        return
     
     # clean and load the file
-    clean_data =  (
+    trip_data = (
         fetch_raw_data(year, month)
-        .pipe(transform_raw_data, year, month)
+        .pipe(clean_raw_data, year, month)
     )
     
-    repo.upsert_pickup_data(clean_data)
+    if store_trips:
+        repo.upsert_trip_data(trip_data, year, month)
+    
+    repo.upsert_pickup_data(trip_data.pipe(aggregate_trip_data, year, month))
     
     
-def batch_etl(repo: NYCTaxiRepository, from_date:date, to_date:date) -> None:
+def batch_etl(repo: NYCTaxiRepository, from_date:date, to_date:date, store_trips: bool = False, engine: str = "polars") -> None:
     """
     Loads raw taxi trip data for a specified year and optional list of months, validates it, and saves the validated data.
 
@@ -62,20 +94,70 @@ def batch_etl(repo: NYCTaxiRepository, from_date:date, to_date:date) -> None:
     - year (int): The year for which to download and validate the data.
     - months (Optional[list[int]]): An optional list of integers representing the months for which to download and validate the data.
       If None, data for all months in the specified year will be processed.
+    - store_trips (bool): If True, the trip level data is kept in the trip store as well.
+    - engine (str): ETL engine, one of ETL_ENGINES.
 
     Returns:
     None. The function saves the validated data into a processed data directory without returning any value.
     """
     
+    # a bad engine fails every month the same way, it's raised before the loop
+    validate_engine(repo, engine)
     logger.info("Downloading data from %s to %s", from_date, to_date)
     
     list_of_months = generate_list_of_months(from_date, to_date)
  
     for period in tqdm(list_of_months):
         try:
-            file_etl(repo, period.year, period.month)
+            file_etl(repo, period.year, period.month, store_trips, engine)
         except Exception:
             logger.exception("Error downloading data for %s", period)
             continue
     logger.info("Data from %s to %s has been downloaded and validated", from_date, to_date)
 
+
+def reaggregate_trip_data(
+    repo: NYCTaxiRepository,
+    from_date: date,
+    to_date: date,
+    granularity: str = "1h",
+    max_workers: int | None = None
+) -> None:
+    """
+    Rebuilds the pickup timeseries at the given granularity from the trip store, without
+    touching the network. With the default granularity it rebuilds pickup_hourly, any other
+    granularity (e.g. 15m) is written to its own table.
+    
+    Months are read and aggregated in parallel threads, both DuckDB and Polars release
+    the GIL while working. Writes are kept in the calling thread so the repository only
+    sees one writer at a time.
+
+    Parameters:
+    - from_date (date): First month to rebuild.
+    - to_date (date): Last month to rebuild.
+    - granularity (str): Granularity of the rebuilt timeseries.
+    - max_workers (int | None): Number of threads, defaults to the ThreadPoolExecutor default.
+    """
+    
+    available_months = set(repo.list_trip_months())
+    list_of_months = [
+        period for period in generate_list_of_months(from_date, to_date)
+        if period in available_months
+    ]
+    
+    missing_months = len(generate_list_of_months(from_date, to_date)) - len(list_of_months)
+    if missing_months:
+        logger.warning("%s months are not in the trip store and will be skipped", missing_months)
+    
+    logger.info("Re-aggregating %s months of trips to %s", len(list_of_months), granularity)
+    
+    def _aggregate_month(period: date) -> pl.DataFrame:
+        return (
+            repo.fetch_trip_data(period.year, period.month)
+            .pipe(aggregate_trip_data, period.year, period.month, granularity)
+        )
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for period, data in tqdm(zip(list_of_months, executor.map(_aggregate_month, list_of_months)), total=len(list_of_months)):
+            repo.upsert_pickup_data(data, granularity=granularity)
+            logger.info("Re-aggregated %s", period)
@@ -69,7 +69,7 @@ def filter_out_of_range_points(df: pl.DataFrame, year:int, month:int) -> pl.Data
 
     return clean_data
 
-def _generate_hourly_datetimes_with_ranges(year: int, month: int) -> pl.DataFrame:
+def _generate_hourly_datetimes_with_ranges(year: int, month: int, interval: str = "1h") -> pl.DataFrame:
     """
     Generates a Polars DataFrame with a single column containing datetimes for every hour in the specified month
     using the pl.datetime_ranges function.
@@ -77,6 +77,7 @@ def _generate_hourly_datetimes_with_ranges(year: int, month: int) -> pl.DataFram
     Parameters:
     - year (int): The year of the month for which to generate hourly datetimes.
     - month (int): The month for which to generate hourly datetimes.
+    - interval (str): The spacing between datetimes, defaults to one hour.
 
     Returns:
     - pl.DataFrame: A DataFrame with a single column named 'datetime', containing hourly datetimes for the specified month.
@@ -94,7 +95,7 @@ def _generate_hourly_datetimes_with_ranges(year: int, month: int) -> pl.DataFram
         "pickup_datetime_hour": pl.datetime_range(
             start=start_date, 
             end=end_date, 
-            interval="1h", 
+            interval=interval, 
             eager=True, 
             time_unit="us",
             closed="left")
@@ -102,7 +103,7 @@ def _generate_hourly_datetimes_with_ranges(year: int, month: int) -> pl.DataFram
     
     return df
 
-def aggregate_pickup_into_timeseries_data(df: pl.DataFrame, year: int, month: int) -> pl.DataFrame:
+def aggregate_pickup_into_timeseries_data(df: pl.DataFrame, year: int, month: int, every: str = "1h") -> pl.DataFrame:
     """
     Aggregate the pickup data into hourly timeseries data for the specified year and month. Timeseries
     must contain all hours in the month, and the number of pickups for each pickup location ID at each hour.
@@ -113,17 +114,19 @@ def aggregate_pickup_into_timeseries_data(df: pl.DataFrame, year: int, month: in
     - year (int): The year of the month for which to aggregate the pickup data.
     - month (int): The month for which to aggregate the pickup data.
     - df (pl.DataFrame): The DataFrame containing the pickup data to be aggregated.
+    - every (str): The granularity of the timeseries, defaults to hourly. Any sub-daily
+      Polars duration string works (e.g. 15m, 30m).
 
     Returns:
     - pl.DataFrame: The DataFrame containing the aggregated pickup data.
     """
     # Truncate the pickup datetime to the nearest hour and group by the pickup location ID
-    logger.info("Aggregating data to hourly frequency")
+    logger.info("Aggregating data to %s frequency", every)
 
     hourly_pickups = (
         df
         .group_by([
-            pl.col("pickup_datetime").dt.truncate("1h").alias("pickup_datetime_hour"),
+            pl.col("pickup_datetime").dt.truncate(every).alias("pickup_datetime_hour"),
             pl.col("pickup_location_id")
         ])
         .agg(
@@ -131,7 +134,7 @@ def aggregate_pickup_into_timeseries_data(df: pl.DataFrame, year: int, month: in
         )
     )
     
-    hourly_df = _generate_hourly_datetimes_with_ranges(year, month)
+    hourly_df = _generate_hourly_datetimes_with_ranges(year, month, every)
     
     
     return ( 
@@ -160,14 +163,34 @@ def add_surrogate_key(df: pl.DataFrame) -> pl.DataFrame:
     ])
 
 
-def transform_raw_data(df: pl.DataFrame, year: int, month:int):
-    clean_data = (
+def clean_raw_data(df: pl.DataFrame, year: int, month: int) -> pl.DataFrame:
+    """
+    Standardizes the raw file and keeps the trips within the year and month of the file.
+    The result is still at trip level, one row per trip.
+    """
+    return (
         df 
         .pipe(standardize_raw_schema)
         .pipe(filter_out_of_range_points, year, month)
-        .pipe(aggregate_pickup_into_timeseries_data, year, month)
+    )
+
+
+def aggregate_trip_data(df: pl.DataFrame, year: int, month: int, every: str = "1h") -> pl.DataFrame:
+    """
+    Aggregates clean trip level data into the pickup timeseries at the given granularity.
+    """
+    clean_data = (
+        df
+        .pipe(aggregate_pickup_into_timeseries_data, year, month, every)
         .pipe(add_surrogate_key)
-        
     )
     
     return NYCPickupHourlySchema.enforce_schema(clean_data)
+
+
+def transform_raw_data(df: pl.DataFrame, year: int, month:int):
+    return (
+        df 
+        .pipe(clean_raw_data, year, month)
+        .pipe(aggregate_trip_data, year, month)
+    )
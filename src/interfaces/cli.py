@@ -2,23 +2,34 @@
 TODO 
 - Expose ETL methods
 - Expose Repo DDL
+
+Commands import the modules they run, polars, the repositories and the model
+libraries, when they're called, so a command only pays for what it uses. The
+startup budget is checked by tests/test_cli.py.
 """
 
 import typer
 import datetime
 from typing_extensions import Annotated
-from datetime import datetime
+from datetime import datetime, timedelta
+from pathlib import Path
 
-from src.etl.pipeline import batch_etl
-from src.adapters.base import initialize_repository
-from src.model.train import train_model as train_model_pipeline
 from src.model.config import (
+    DEFAULT_DASHBOARD_PATH,
+    DEFAULT_METRIC_STORE_PATH,
+    DEFAULT_MODEL_PATH,
+    DEFAULT_RESULTS_PATH,
+    DEFAULT_TRACE_PATH,
     TRAIN_DATA_FROM,
     TRAIN_DATA_TO,
     TEST_DATA_FROM,
     MAX_HORIZON,
     PICKUPS_LOCATION,
-    CROSS_VALIDATION_FREQUENCY
+    CROSS_VALIDATION_FREQUENCY,
+    TUNE_LAG_SETS,
+    TUNE_REGRESSORS,
+    TUNE_HORIZONS,
+    default_horizon
 )
 
 app = typer.Typer()
@@ -34,18 +45,74 @@ app.add_typer(model_app, name='model')
 def download_taxi_data(
     from_date:  Annotated[datetime, typer.Argument()],
     to_date:  Annotated[datetime, typer.Argument()],
-    repo: Annotated[str, typer.Option()] = "duckdb"
+    repo: Annotated[str, typer.Option()] = "duckdb",
+    store_trips: Annotated[bool, typer.Option()] = False,
+    engine: Annotated[str, typer.Option()] = "polars",
+    dashboard_path: Annotated[Path, typer.Option()] = DEFAULT_DASHBOARD_PATH
 ):
     """ 
-    Download taxi data from source 
+    Download taxi data from source, then refresh the dashboard once it's built
     """
+    from src.adapters.base import initialize_repository
+    from src.etl.pipeline import batch_etl
+    from src.model.dashboard import refresh_dashboard
     
     repo_obj = initialize_repository(repo)
      
     batch_etl(
         repo = repo_obj,
         from_date = from_date,
-        to_date = to_date
+        to_date = to_date,
+        store_trips = store_trips,
+        engine = engine
+    )
+    refresh_dashboard(repo_obj, dashboard_path)
+    
+@etl_app.command()
+def reaggregate(
+    from_date:  Annotated[datetime, typer.Argument()],
+    to_date:  Annotated[datetime, typer.Argument()],
+    granularity: Annotated[str, typer.Option()] = "1h",
+    jobs: Annotated[int, typer.Option()] = None,
+    repo: Annotated[str, typer.Option()] = "duckdb"
+):
+    """ 
+    Rebuild the pickup timeseries from the trip store at the given granularity
+    """
+    from src.adapters.base import initialize_repository
+    from src.etl.pipeline import reaggregate_trip_data
+    
+    repo_obj = initialize_repository(repo)
+    repo_obj.create_tables()
+    
+    reaggregate_trip_data(
+        repo = repo_obj,
+        from_date = from_date,
+        to_date = to_date,
+        granularity = granularity,
+        max_workers = jobs
+    )
+    
+@etl_app.command()
+def update_features(
+    to_date:  Annotated[datetime, typer.Argument()],
+    from_date: Annotated[datetime, typer.Option()] = None,
+    repo: Annotated[str, typer.Option()] = "duckdb"
+):
+    """ 
+    Append the days up to to_date to the lag feature store. Without from_date
+    the store is extended from its last stored day
+    """
+    from src.adapters.base import initialize_repository
+    from src.model.features import update_feature_store
+    
+    repo_obj = initialize_repository(repo)
+    repo_obj.create_tables()
+    
+    update_feature_store(
+        repo = repo_obj,
+        to_date = to_date,
+        from_date = from_date
     )
     
 @etl_app.command()
@@ -56,6 +123,7 @@ def create_tables(
     """ 
     Create tables
     """
+    from src.adapters.base import initialize_repository
     
     repo_obj = initialize_repository(repo)
     repo_obj.create_tables()
@@ -68,8 +136,26 @@ def train_model(
     train_data_to: Annotated[datetime, typer.Option()] = TRAIN_DATA_TO,
     test_data_from: Annotated[datetime, typer.Option()] = TEST_DATA_FROM,
     pickup_locations: Annotated[list[int], typer.Option()] = PICKUPS_LOCATION,
-    max_horizon: Annotated[int, typer.Option()] = MAX_HORIZON,
+    max_horizon: Annotated[int, typer.Option()] = None,
     cross_validation_split: Annotated[str, typer.Option()] = CROSS_VALIDATION_FREQUENCY,
+    jobs: Annotated[int, typer.Option()] = 1,
+    feature_store: Annotated[bool, typer.Option()] = False,
+    global_model: Annotated[bool, typer.Option()] = False,
+    all_locations: Annotated[bool, typer.Option()] = False,
+    per_location_metrics: Annotated[bool, typer.Option()] = False,
+    freq: Annotated[str, typer.Option()] = "1d",
+    save: Annotated[bool, typer.Option()] = False,
+    model_path: Annotated[Path, typer.Option()] = DEFAULT_MODEL_PATH,
+    model_version: Annotated[str, typer.Option()] = None,
+    slim: Annotated[bool, typer.Option()] = False,
+    regressor: Annotated[str, typer.Option()] = "linear",
+    model_jobs: Annotated[int, typer.Option()] = 1,
+    metric: Annotated[list[str], typer.Option()] = None,
+    level: Annotated[int, typer.Option()] = None,
+    log_metrics: Annotated[bool, typer.Option()] = False,
+    metric_store_path: Annotated[Path, typer.Option()] = DEFAULT_METRIC_STORE_PATH,
+    profile: Annotated[bool, typer.Option()] = False,
+    profile_path: Annotated[Path, typer.Option()] = DEFAULT_TRACE_PATH,
     repo: Annotated[str, typer.Option()] = "duckdb"
 ):
     """
@@ -80,18 +166,386 @@ def train_model(
         train_data_to: End date for training data
         test_data_from: Start date for test data
         pickup_locations: List of pickup location IDs to train on
-        max_horizon: Maximum number of days to forecast
+        max_horizon: Maximum number of steps to forecast, days or hours depending on freq, 7 days or 24 hours if not given
         cross_validation_split: Frequency for cross-validation splits (e.g. '3mo')
+        jobs: Number of processes used to run the cross-validation folds
+        feature_store: Read the lags from the feature store instead of computing them
+        global_model: Fit one model over all the locations with the location as a feature
+        all_locations: Train on every location, pickup_locations is ignored
+        per_location_metrics: Report the backtest metrics of each location
+        freq: '1d' for the daily model, '1h' for the hourly model
+        save: Fit the model on the whole data and save it to model_path after the cross-validation, only backtested if not given
+        model_path: Where the model is saved
+        model_version: Version of the saved model, defaults to the training timestamp
+        slim: Save only the estimators, the config and the last observations of each series
+        regressor: Regressor of the model (linear, ridge, hgb) or statistical model (seasonal_naive, auto_ets, auto_arima, mstl)
+        model_jobs: Processes a statistical model is fitted with
+        metric: Metric reported for each fold, repeat for each metric, all of them if not given
+        level: Backtest the level% prediction intervals too, statistical models only
+        log_metrics: Log the backtest statistics of the run to the metric store, nothing is logged if not given
+        metric_store_path: Directory of the metric store
+        profile: Record the time and memory of every training step and print a summary
+        profile_path: Where the Chrome trace of the profile is written
         repo: Repository type to use ('duckdb' or other supported types)
     """
+    from contextlib import nullcontext
+    import polars as pl
+    from src.adapters.base import initialize_repository
+    from src.model.evaluation import MetricStore
+    from src.model.profiling import profiling
+    from src.model.train import train_model as train_model_pipeline
+    
     repo_obj = initialize_repository(repo)
     
-    train_model_pipeline(
+    with profiling() if profile else nullcontext() as profiler:
+        train_model_pipeline(
+            repo=repo_obj,
+            train_data_from=train_data_from,
+            train_data_to=train_data_to,
+            test_data_from=test_data_from,
+            pickup_locations=None if all_locations else pickup_locations,
+            max_horizon=max_horizon or default_horizon(freq),
+            cross_validation_split_frequency=cross_validation_split,
+            n_jobs=jobs,
+            feature_store=feature_store,
+            global_model=global_model,
+            per_location_metrics=per_location_metrics,
+            freq=freq,
+            model_path=model_path if save else None,
+            model_version=model_version,
+            slim_model=slim,
+            regressor=regressor,
+            model_n_jobs=model_jobs,
+            metrics=metric,
+            level=level,
+            metric_store=MetricStore(metric_store_path) if log_metrics else None
+        )
+    
+    if profiler is not None:
+        with pl.Config(tbl_rows=-1):
+            print(profiler.summary())
+        print(f"Chrome trace written to {profiler.write_chrome_trace(profile_path)}")
+    
+
+@model_app.command()
+def tune(
+    train_data_from: Annotated[datetime, typer.Option()] = TRAIN_DATA_FROM,
+    train_data_to: Annotated[datetime, typer.Option()] = TRAIN_DATA_TO,
+    test_data_from: Annotated[datetime, typer.Option()] = TEST_DATA_FROM,
+    pickup_locations: Annotated[list[int], typer.Option()] = PICKUPS_LOCATION,
+    all_locations: Annotated[bool, typer.Option()] = False,
+    cross_validation_split: Annotated[str, typer.Option()] = CROSS_VALIDATION_FREQUENCY,
+    lag_set: Annotated[list[str], typer.Option()] = [",".join(map(str, lags)) for lags in TUNE_LAG_SETS],
+    regressor: Annotated[list[str], typer.Option()] = TUNE_REGRESSORS,
+    horizon: Annotated[list[int], typer.Option()] = TUNE_HORIZONS,
+    n_candidates: Annotated[int, typer.Option()] = None,
+    seed: Annotated[int, typer.Option()] = 0,
+    jobs: Annotated[int, typer.Option()] = 1,
+    global_model: Annotated[bool, typer.Option()] = False,
+    prune_after: Annotated[int, typer.Option()] = 1,
+    prune_margin: Annotated[float, typer.Option()] = 0.05,
+    output_path: Annotated[Path, typer.Option()] = DEFAULT_RESULTS_PATH,
+    repo: Annotated[str, typer.Option()] = "duckdb"
+):
+    """
+    Search the lag sets and regressors of the daily model and write the
+    candidates ranked at each horizon.
+    
+    Args:
+        train_data_from: Start date of the data
+        train_data_to: End date of the data
+        test_data_from: Start date of the first test fold
+        pickup_locations: List of pickup location IDs to tune on
+        all_locations: Tune on every location, pickup_locations is ignored
+        cross_validation_split: Frequency for cross-validation splits (e.g. '3mo')
+        lag_set: Comma separated lags of a candidate, repeat for each lag set
+        regressor: Regressor of the search, repeat for each regressor
+        horizon: Horizon, in days, candidates are ranked at, repeat for each horizon
+        n_candidates: Random search over this many candidates instead of the grid
+        seed: Seed of the random search
+        jobs: Number of processes evaluating the candidates
+        global_model: Tune global models over all the locations
+        prune_after: Folds every candidate is evaluated on before pruning
+        prune_margin: Relative margin a candidate must be beaten by at every horizon to be pruned
+        output_path: CSV or parquet file of the ranked results
+        repo: Repository type to use ('duckdb' or other supported types)
+    """
+    import polars as pl
+    from src.adapters.base import initialize_repository
+    from src.model.tune import tune_model
+    
+    repo_obj = initialize_repository(repo)
+    
+    ranked = tune_model(
         repo=repo_obj,
         train_data_from=train_data_from,
         train_data_to=train_data_to,
         test_data_from=test_data_from,
+        pickup_locations=None if all_locations else pickup_locations,
+        cross_validation_split_frequency=cross_validation_split,
+        lag_sets=[[int(lag) for lag in lags.split(",")] for lags in lag_set],
+        regressors=regressor,
+        horizons=horizon,
+        n_candidates=n_candidates,
+        seed=seed,
+        n_jobs=jobs,
+        global_model=global_model,
+        prune_after=prune_after,
+        prune_margin=prune_margin,
+        output_path=output_path
+    )
+    print(ranked.filter(pl.col('rank') <= 5))
+
+
+@model_app.command()
+def compare_runs(
+    run_id: Annotated[list[str], typer.Argument()] = None,
+    by: Annotated[list[str], typer.Option()] = ["horizon"],
+    metric: Annotated[list[str], typer.Option()] = None,
+    metric_store_path: Annotated[Path, typer.Option()] = DEFAULT_METRIC_STORE_PATH
+):
+    """
+    Print the backtest metrics of training runs logged to the metric store.
+    
+    Args:
+        run_id: Runs to compare, all of them if not given
+        by: Grouping of the metrics within a run (horizon, fold_id, unique_id), repeat for each column
+        metric: Metric to print, repeat for each metric, all of them if not given
+        metric_store_path: Directory of the metric store
+    """
+    import polars as pl
+    from src.model.evaluation import MetricStore
+    
+    store = MetricStore(metric_store_path)
+    with pl.Config(tbl_rows=-1):
+        print(store.fetch_runs())
+        print(store.compare_runs(run_id, by, metric))
+
+
+@model_app.command()
+def predict(
+    from_date:  Annotated[datetime, typer.Argument()],
+    to_date:  Annotated[datetime, typer.Argument()],
+    pickup_locations: Annotated[list[int], typer.Option()] = PICKUPS_LOCATION,
+    all_locations: Annotated[bool, typer.Option()] = False,
+    max_horizon: Annotated[int, typer.Option()] = None,
+    model_path: Annotated[Path, typer.Option()] = DEFAULT_MODEL_PATH,
+    model_version: Annotated[str, typer.Option()] = None,
+    repo: Annotated[str, typer.Option()] = "duckdb",
+    dashboard_path: Annotated[Path, typer.Option()] = DEFAULT_DASHBOARD_PATH
+):
+    """
+    Forecast every day from from_date to to_date, both included, as reference
+    date and write the forecasts to the predictions table, then refresh the
+    dashboard once it's built.
+    
+    Args:
+        from_date: First reference date
+        to_date: Last reference date
+        pickup_locations: List of pickup location IDs to predict
+        all_locations: Predict every location, pickup_locations is ignored
+        max_horizon: Number of steps to forecast after each reference date, 7 days or 24 hours depending on the model if not given
+        model_path: The model artifact
+        model_version: Expected model version, any version if not given
+        repo: Repository type to use ('duckdb' or other supported types)
+        dashboard_path: The dashboard tables
+    """
+    import polars as pl
+    from src.adapters.base import initialize_repository
+    from src.model.dashboard import refresh_dashboard
+    from src.model.inference import batch_predict
+    
+    repo_obj = initialize_repository(repo)
+    repo_obj.create_tables()
+    
+    batch_predict(
+        repo=repo_obj,
+        reference_dates=pl.datetime_range(from_date, to_date, "1d", eager=True).to_list(),
+        pickup_locations=None if all_locations else pickup_locations,
+        h=max_horizon,
+        model_path=model_path,
+        model_version=model_version
+    )
+    refresh_dashboard(repo_obj, dashboard_path)
+
+
+@model_app.command()
+def monitor(
+    to_date:  Annotated[datetime, typer.Argument()],
+    from_date: Annotated[datetime, typer.Option()] = None,
+    freq: Annotated[str, typer.Option()] = "1d",
+    window_days: Annotated[int, typer.Option()] = 28,
+    repo: Annotated[str, typer.Option()] = "duckdb"
+):
+    """
+    Score the stored forecasts of the days up to to_date against the actuals.
+    Without from_date scoring resumes from the last scored day. Prints the
+    rolling metrics by model version and horizon.
+    
+    Args:
+        to_date: End of the scored days, excluded
+        from_date: First day to score
+        freq: Frequency of the scored forecasts, '1d' or '1h'
+        window_days: Days of the rolling metrics
+        repo: Repository type to use ('duckdb' or other supported types)
+    """
+    from src.adapters.base import initialize_repository
+    from src.model.monitoring import summarize_metrics, update_monitoring_metrics
+    
+    repo_obj = initialize_repository(repo)
+    repo_obj.create_tables()
+    
+    update_monitoring_metrics(repo=repo_obj, to_date=to_date, from_date=from_date, freq=freq)
+    
+    metrics = repo_obj.fetch_metric_data(to_date - timedelta(days=window_days), to_date)
+    print(summarize_metrics(metrics, by=['model_version', 'horizon']))
+
+
+@model_app.command()
+def replay(
+    from_date:  Annotated[datetime, typer.Argument()],
+    to_date:  Annotated[datetime, typer.Argument()],
+    retrain_every: Annotated[int, typer.Option()] = 7,
+    train_days: Annotated[int, typer.Option()] = 365,
+    max_horizon: Annotated[int, typer.Option()] = MAX_HORIZON,
+    regressor: Annotated[str, typer.Option()] = "linear",
+    pickup_locations: Annotated[list[int], typer.Option()] = None,
+    flush_every: Annotated[int, typer.Option()] = 30,
+    repo: Annotated[str, typer.Option()] = "duckdb",
+    target_path: Annotated[Path, typer.Option()] = None
+):
+    """
+    Replay the daily operations from from_date to to_date, excluded, on the
+    stored pickups: ingest every day, retrain on schedule and store the
+    forecasts issued each day, then print the time spent per day.
+    
+    Args:
+        from_date: First simulated day
+        to_date: End of the simulated days, excluded
+        retrain_every: Days between two retrainings
+        train_days: Days of history the model is trained on
+        max_horizon: Number of days forecast each day
+        regressor: Regressor of the model
+        pickup_locations: Locations to replay, repeat for each location, all of them if not given
+        flush_every: Days between two writes of the simulated rows
+        repo: Repository type of the pickups ('duckdb' or other supported types)
+        target_path: Local repository the simulation is written to, the pickup repository if not given
+    """
+    import polars as pl
+    from src.adapters.base import initialize_repository
+    from src.model.replay import ReplaySimulator
+    
+    source = initialize_repository(repo)
+    source.create_tables()
+    target = None
+    if target_path is not None:
+        target = initialize_repository("local", custom_root_dir=target_path)
+        target.create_tables()
+    
+    simulator = ReplaySimulator(
+        source,
+        from_date,
+        target=target,
+        retrain_every=retrain_every,
+        train_days=train_days,
+        h=max_horizon,
+        regressor=regressor,
         pickup_locations=pickup_locations,
-        max_horizon=max_horizon,
-        cross_validation_split_frequency=cross_validation_split
-    )
\ No newline at end of file
+        flush_every=flush_every
+    )
+    days = simulator.run(to_date)
+    print(days.group_by('retrained').agg(pl.len().alias('days'), pl.col('seconds').sum(), pl.col('seconds').mean().alias('mean_seconds')))
+
+
+@model_app.command()
+def serve(
+    host: Annotated[str, typer.Option()] = "127.0.0.1",
+    port: Annotated[int, typer.Option()] = 8000,
+    model_path: Annotated[Path, typer.Option()] = DEFAULT_MODEL_PATH,
+    model_version: Annotated[str, typer.Option()] = None,
+    as_of: Annotated[datetime, typer.Option()] = None,
+    refresh_interval: Annotated[float, typer.Option()] = 300.0,
+    max_batch: Annotated[int, typer.Option()] = 64,
+    max_wait_ms: Annotated[float, typer.Option()] = 2.0,
+    repo: Annotated[str, typer.Option()] = "duckdb"
+):
+    """
+    Serve forecasts over HTTP from an in-memory history of every location.
+    
+    Args:
+        host: Interface to listen on
+        port: Port to listen on
+        model_path: The model artifact
+        model_version: Expected model version, any version if not given
+        as_of: Serve as if the current time was as_of, the history isn't refreshed
+        refresh_interval: Seconds between two refreshes of the history
+        max_batch: Maximum requests answered by one predict
+        max_wait_ms: How long the first request of a batch waits for others
+        repo: Repository type to use ('duckdb' or other supported types)
+    """
+    import asyncio
+    from src.adapters.base import initialize_repository
+    from src.interfaces.server import ForecastService
+    
+    repo_obj = initialize_repository(repo)
+    repo_obj.create_tables()
+    
+    service = ForecastService(
+        repo=repo_obj,
+        model_path=model_path,
+        model_version=model_version,
+        as_of=as_of,
+        max_batch=max_batch,
+        max_wait_ms=max_wait_ms
+    )
+    asyncio.run(service.serve(host, port, refresh_interval))
+
+
+@model_app.command()
+def refresh_dashboard(
+    to_date: Annotated[datetime, typer.Option()] = None,
+    from_date: Annotated[datetime, typer.Option()] = None,
+    dashboard_path: Annotated[Path, typer.Option()] = DEFAULT_DASHBOARD_PATH,
+    repo: Annotated[str, typer.Option()] = "duckdb"
+):
+    """
+    Rebuild the dashboard tables of the days from from_date, the day after the
+    last observed actual if not given, with the actuals before to_date and the
+    forecasts stored for them.
+    
+    Args:
+        to_date: End of the actuals, excluded, today if not given
+        from_date: First rebuilt day, required the first time
+        dashboard_path: The dashboard tables
+        repo: Repository type to use ('duckdb' or other supported types)
+    """
+    from src.adapters.base import initialize_repository
+    from src.model.dashboard import DashboardStore
+    
+    repo_obj = initialize_repository(repo)
+    repo_obj.create_tables()
+    
+    store = DashboardStore(dashboard_path)
+    written = store.refresh(repo_obj, to_date=to_date, from_date=from_date)
+    print(f"{written} location files written, watermark {store.watermark}")
+
+
+@model_app.command()
+def serve_dashboard(
+    host: Annotated[str, typer.Option()] = "127.0.0.1",
+    port: Annotated[int, typer.Option()] = 8001,
+    dashboard_path: Annotated[Path, typer.Option()] = DEFAULT_DASHBOARD_PATH
+):
+    """
+    Serve the dashboard tables over HTTP as JSON or Arrow, with ETags.
+    
+    Args:
+        host: Interface to listen on
+        port: Port to listen on
+        dashboard_path: The dashboard tables
+    """
+    import asyncio
+    from src.interfaces.dashboard import DashboardService
+    from src.model.dashboard import DashboardStore
+    
+    asyncio.run(DashboardService(DashboardStore(dashboard_path)).serve(host, port))
@@ -0,0 +1,154 @@
+"""
+Local HTTP endpoint of the dashboard tables.
+
+Responses are read from the files of the DashboardStore, refreshed by the ETL
+and inference commands, and cached encoded in memory. Their ETag is derived from
+the file they're read from, so an unchanged page is answered 304 without a body
+and a changed file is read again on the next request.
+
+    GET /locations                      stored locations and the refresh state
+    GET /locations/{id}?from=&to=       daily rows of a location
+    GET /days?from=&to=                 daily totals across the locations
+    GET /health
+
+Rows are JSON, or an Arrow IPC stream with ?format=arrow or
+Accept: application/vnd.apache.arrow.stream.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+from collections import OrderedDict
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Callable, NamedTuple
+from urllib.parse import parse_qs, urlsplit
+
+import polars as pl
+
+from src.common import get_logger
+from src.interfaces.http import HTTPResponse, handle_connection
+from src.model.dashboard import DashboardStore
+
+
+logger = get_logger("dashboard_server")
+
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+JSON_CONTENT_TYPE = "application/json"
+
+
+class Response(NamedTuple):
+    status: str
+    body: bytes = b""
+    content_type: str = JSON_CONTENT_TYPE
+    etag: str | None = None
+
+
+def _error(status: str, message: str) -> Response:
+    return Response(status, json.dumps({"error": message}).encode())
+
+
+def encode(df: pl.DataFrame, content_type: str) -> bytes:
+    if content_type == ARROW_CONTENT_TYPE:
+        buffer = io.BytesIO()
+        df.write_ipc_stream(buffer)
+        return buffer.getvalue()
+    return df.write_json().encode()
+
+
+class DashboardService:
+    """
+    Serves the dashboard tables of store with ETags and an in-memory cache of
+    the last cache_size encoded responses.
+    """
+
+    def __init__(self, store: DashboardStore, cache_size: int = 1024):
+        self.store = store
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, bytes] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _etag(self, path: Path, *parts: str) -> str | None:
+        """ETag of a response read from path, None when the file doesn't exist."""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        key = "|".join([str(path), str(stat.st_mtime_ns), str(stat.st_size), *parts])
+        return f'"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"'
+
+    def _cached(self, etag: str, load: Callable[[], bytes]) -> bytes:
+        if etag in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(etag)
+            return self._cache[etag]
+        self.misses += 1
+        body = load()
+        self._cache[etag] = body
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return body
+
+    def handle(self, method: str, target: str, headers: dict[str, str]) -> Response:
+        """Answers a request, headers are keyed by their lowercase name."""
+        if method != "GET":
+            return _error("405 Method Not Allowed", f"{method} not allowed")
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        content_type = JSON_CONTENT_TYPE
+        if query.get("format", [""])[0] == "arrow" or ARROW_CONTENT_TYPE in headers.get("accept", ""):
+            content_type = ARROW_CONTENT_TYPE
+
+        if url.path == "/health":
+            return Response("200 OK", json.dumps({"status": "ok"}).encode())
+
+        if url.path == "/locations":
+            etag = self._etag(self.store.state_path)
+            load = lambda: json.dumps({"locations": self.store.fetch_locations(), **self.store.state}).encode()
+            content_type = JSON_CONTENT_TYPE
+        else:
+            try:
+                from_date = datetime.fromisoformat(query["from"][0]) if "from" in query else None
+                to_date = datetime.fromisoformat(query["to"][0]) if "to" in query else None
+            except ValueError:
+                return _error("400 Bad Request", "from and to must be ISO dates")
+
+            if url.path == "/days":
+                etag = self._etag(self.store.days_path, url.query, content_type)
+                load = lambda: encode(self.store.fetch_days(from_date, to_date), content_type)
+            elif url.path.startswith("/locations/"):
+                try:
+                    pickup_location_id = int(url.path.removeprefix("/locations/"))
+                except ValueError:
+                    return _error("400 Bad Request", "the location must be an integer")
+                etag = self._etag(self.store.location_path(pickup_location_id), url.query, content_type)
+                load = lambda: encode(self.store.fetch_location(pickup_location_id, from_date, to_date), content_type)
+            else:
+                return _error("404 Not Found", f"{url.path} not found")
+
+        if etag is None:
+            return _error("404 Not Found", f"{url.path} not found, is the dashboard refreshed?")
+        if headers.get("if-none-match") == etag:
+            return Response("304 Not Modified", content_type=content_type, etag=etag)
+        return Response("200 OK", self._cached(etag, load), content_type, etag)
+
+    async def _respond(self, method: str, target: str, headers: dict[str, str]) -> HTTPResponse:
+        response = self.handle(method, target, headers)
+        cache_headers = {}
+        if response.etag is not None:
+            # browsers revalidate every time, unchanged pages cost a 304
+            cache_headers = {"ETag": response.etag, "Cache-Control": "no-cache"}
+        return HTTPResponse(response.status, response.content_type, cache_headers, response.body)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8001, started: asyncio.Event | None = None) -> None:
+        """Serves until cancelled."""
+        server = await asyncio.start_server(partial(handle_connection, handler=self._respond), host, port)
+        self.port = server.sockets[0].getsockname()[1]
+        logger.info("Serving the dashboard of %s on http://%s:%s", self.store.path, host, self.port)
+        if started is not None:
+            started.set()
+        async with server:
+            await server.serve_forever()
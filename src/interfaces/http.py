@@ -0,0 +1,47 @@
+"""
+HTTP/1.1 connection loop of the local services.
+
+Connections are kept alive until the client closes them or sends
+Connection: close, every request is answered by the handler of the service.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, NamedTuple
+
+
+class HTTPResponse(NamedTuple):
+    status: str
+    content_type: str
+    headers: dict[str, str]
+    body: bytes
+
+
+Handler = Callable[[str, str, dict[str, str]], Awaitable[HTTPResponse]]
+
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, handler: Handler) -> None:
+    """Answers the requests of a connection with handler(method, target, headers),
+    headers are keyed by their lowercase name.
+    """
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            response = await handler(method, target, headers)
+            head = f"HTTP/1.1 {response.status}\r\nContent-Type: {response.content_type}\r\n"
+            head += "".join(f"{name}: {value}\r\n" for name, value in response.headers.items())
+            writer.write(f"{head}Content-Length: {len(response.body)}\r\n\r\n".encode() + response.body)
+            await writer.drain()
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
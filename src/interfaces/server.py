@@ -0,0 +1,257 @@
+"""
+Local forecast HTTP service.
+
+The model is loaded once and the last max(lags) steps of every location are kept
+in memory, refreshed from the repository in the background with only the steps
+that arrived since the previous refresh. Concurrent requests are queued and
+answered by one predict call per micro-batch.
+
+    GET /forecast?locations=10,40&h=7   forecasts, all the locations if none given
+    GET /stats                          p50/p99 latency and batching stats
+    GET /health
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from functools import partial
+from pathlib import Path
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import polars as pl
+
+from src.adapters.base import NYCTaxiRepository
+from src.common import get_logger
+from src.interfaces.http import HTTPResponse, handle_connection
+from src.model.artifacts import DEFAULT_MODEL_PATH, load_model
+from src.model.config import default_horizon
+from src.model.inference import fetch_history
+from src.model.pipeline import history_length
+
+
+logger = get_logger("server")
+
+
+class LatencyStats:
+    """Latencies of the last `window` requests, in milliseconds."""
+
+    def __init__(self, window: int = 10_000):
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.batches = 0
+
+    def record_batch(self, latencies_ms: list[float]) -> None:
+        self.latencies.extend(latencies_ms)
+        self.requests += len(latencies_ms)
+        self.batches += 1
+
+    def summary(self) -> dict:
+        latencies = np.fromiter(self.latencies, dtype=float)
+        p50, p99 = np.percentile(latencies, [50, 99]) if latencies.size else (None, None)
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else None,
+            "p50_ms": p50,
+            "p99_ms": p99,
+        }
+
+
+class _PendingRequest(NamedTuple):
+    pickup_locations: list[int] | None
+    h: int
+    received_at: float
+    future: asyncio.Future
+
+
+class ForecastService:
+    """
+    Keeps the model and the recent history of every location in memory and
+    answers forecasts in micro-batches.
+
+    Args:
+        repo (NYCTaxiRepository): Repository the history is read from
+        model_path (str | Path, optional): The model artifact. Defaults to DEFAULT_MODEL_PATH.
+        model_version (str | None, optional): Expected model version, any version if None.
+        as_of (datetime | None, optional): Serve as if the current time was as_of, used to replay past data.
+            The history then stops at as_of and is never refreshed. Defaults to None.
+        max_batch (int, optional): Maximum requests answered by one predict. Defaults to 64.
+        max_wait_ms (float, optional): How long the first request of a batch waits for others. Defaults to 2.
+    """
+
+    def __init__(
+        self,
+        repo: NYCTaxiRepository,
+        model_path: str | Path = DEFAULT_MODEL_PATH,
+        model_version: str | None = None,
+        as_of: datetime | None = None,
+        max_batch: int = 64,
+        max_wait_ms: float = 2.0
+    ):
+        self.repo = repo
+        self.artifact = load_model(model_path, model_version)
+        self.as_of = as_of
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_lag = history_length(self.artifact.model)
+        self.step = timedelta(days=1) if self.artifact.freq == '1d' else timedelta(hours=1)
+        self.history: pl.DataFrame | None = None
+        self.stats = LatencyStats()
+        self._queue: asyncio.Queue[_PendingRequest] | None = None
+
+    def _history_end(self) -> datetime:
+        # only complete steps are forecast from
+        now = self.as_of or datetime.now()
+        return pl.Series([now]).dt.truncate(self.artifact.freq).item()
+
+    def refresh_history(self) -> int:
+        """
+        Appends the steps observed since the last refresh to the history buffer
+        and keeps the last max(lags) steps of each location.
+
+        Returns:
+            int: The number of new rows
+        """
+        to_date = self._history_end()
+        if self.history is None or self.history.is_empty():
+            from_date = to_date - self.max_lag * self.step
+        else:
+            from_date = self.history['ds'].max() + self.step
+        if from_date >= to_date:
+            return 0
+
+        new_rows = fetch_history(self.repo, from_date, to_date, None, self.artifact.freq, self.artifact.global_model)
+        history = new_rows if self.history is None else pl.concat([self.history, new_rows])
+        self.history = (
+            history
+            .sort('unique_id', 'ds')
+            .group_by('unique_id', maintain_order=True)
+            .tail(self.max_lag)
+        )
+        logger.info("History refreshed with %s rows up to %s", new_rows.height, to_date)
+        return new_rows.height
+
+    def predict(self, pickup_locations: list[int] | None, h: int) -> pl.DataFrame:
+        history = self.history
+        if pickup_locations is not None:
+            history = history.filter(pl.col('unique_id').is_in(pickup_locations))
+        if history.is_empty():
+            return pl.DataFrame(schema={'unique_id': history.schema['unique_id'], 'ds': pl.Datetime('us'), 'y_pred': pl.Float64})
+        return self.artifact.model.predict(h=h, new_df=history)
+
+    async def forecast(self, pickup_locations: list[int] | None, h: int | None = None) -> pl.DataFrame:
+        """Queues a request, it's answered with the next micro-batch."""
+        h = h or default_horizon(self.artifact.freq)
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingRequest(pickup_locations, h, time.perf_counter(), future))
+        return await future
+
+    async def _run_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # one predict over the union of the requested locations and the longest horizon
+            pickup_locations = None
+            if all(request.pickup_locations is not None for request in batch):
+                pickup_locations = sorted({location for request in batch for location in request.pickup_locations})
+            h = max(request.h for request in batch)
+            try:
+                predictions = await loop.run_in_executor(None, self.predict, pickup_locations, h)
+            except Exception as error:
+                for request in batch:
+                    request.future.set_exception(error)
+                continue
+
+            if len(batch) > 1:
+                predictions = predictions.with_columns(
+                    horizon=pl.int_range(1, pl.len() + 1).over('unique_id')
+                )
+            latencies = []
+            for request in batch:
+                result = predictions
+                if 'horizon' in result.columns:
+                    result = result.filter(pl.col('horizon') <= request.h).drop('horizon')
+                if request.pickup_locations is not None and pickup_locations != request.pickup_locations:
+                    result = result.filter(pl.col('unique_id').is_in(request.pickup_locations))
+                request.future.set_result(result)
+                latencies.append((time.perf_counter() - request.received_at) * 1000)
+            self.stats.record_batch(latencies)
+
+    async def _refresh_periodically(self, interval: float) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(None, self.refresh_history)
+            except Exception:
+                logger.exception("History refresh failed")
+
+    async def _respond(self, method: str, target: str, headers: dict[str, str]) -> HTTPResponse:
+        status, body = await self._route(method, target)
+        return HTTPResponse(status, "application/json", {}, json.dumps(body).encode())
+
+    async def _route(self, method: str, target: str) -> tuple[str, dict | list]:
+        url = urlsplit(target)
+        if method != "GET":
+            return "405 Method Not Allowed", {"error": f"{method} not allowed"}
+        if url.path == "/health":
+            return "200 OK", {"status": "ok", "model_version": self.artifact.version}
+        if url.path == "/stats":
+            last_ds = self.history['ds'].max() if self.history is not None else None
+            return "200 OK", {**self.stats.summary(), "history_to": str(last_ds)}
+        if url.path != "/forecast":
+            return "404 Not Found", {"error": f"{url.path} not found"}
+
+        query = parse_qs(url.query)
+        try:
+            h = int(query.get("h", [default_horizon(self.artifact.freq)])[0])
+            pickup_locations = None
+            if "locations" in query:
+                pickup_locations = [int(location) for value in query["locations"] for location in value.split(",")]
+        except ValueError:
+            return "400 Bad Request", {"error": "locations and h must be integers"}
+        max_horizon = getattr(getattr(self.artifact.model, 'ts', None), 'max_horizon', None)
+        if h < 1 or (max_horizon is not None and h > max_horizon):
+            return "400 Bad Request", {"error": f"h must be between 1 and {max_horizon or 'any'}"}
+
+        try:
+            predictions = await self.forecast(pickup_locations, h)
+        except ValueError as error:
+            return "400 Bad Request", {"error": str(error)}
+        return "200 OK", predictions.with_columns(pl.col('ds').dt.to_string()).to_dicts()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000, refresh_interval: float = 300.0, started: asyncio.Event | None = None) -> None:
+        """Loads the history and serves until cancelled."""
+        self._queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.refresh_history)
+
+        tasks = [asyncio.create_task(self._run_batches())]
+        if self.as_of is None:
+            tasks.append(asyncio.create_task(self._refresh_periodically(refresh_interval)))
+
+        server = await asyncio.start_server(partial(handle_connection, handler=self._respond), host, port)
+        self.port = server.sockets[0].getsockname()[1]
+        logger.info("Serving model version %s on http://%s:%s", self.artifact.version, host, self.port)
+        if started is not None:
+            started.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,217 @@
+"""
+Model artifacts.
+
+An artifact is a joblib file holding the fitted model and its metadata (version,
+frequency, whether it's a global model). Inference keeps the loaded artifacts in a
+process-level cache and only reads the file again when it changes on disk.
+
+MLForecast models can be saved in a slim format: the fitted estimators, the
+feature config and the last max(lags) observations of each series, which is all
+predict needs. The model is rebuilt from it once, when loaded. It doesn't depend
+on the internal state of MLForecast, which keeps the full training history unless
+keep_last_n is set (recent versions set it to max(lags) on fit).
+"""
+
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import joblib
+import numpy as np
+import polars as pl
+from mlforecast import MLForecast
+
+from src.common import get_logger
+from src.model.config import DEFAULT_MODEL_PATH
+
+
+logger = get_logger("artifacts")
+
+
+class ModelArtifact(NamedTuple):
+    model: Any
+    version: str
+    freq: str = '1d'
+    global_model: bool = False
+    trained_at: datetime | None = None
+
+
+class SlimModel(NamedTuple):
+    """The parts of a fitted MLForecast needed to predict. The last observations
+    of every series are stored back to back in y, sizes holds how many belong to
+    each series and last_dates the date of the last one.
+    """
+    models: dict
+    freq: str
+    lags: list[int]
+    date_features: list | None
+    static_features: dict[str, np.ndarray]
+    max_horizon: int | None
+    columns: tuple[str, str, str]
+    uids: np.ndarray
+    last_dates: np.ndarray
+    sizes: np.ndarray
+    y: np.ndarray
+
+
+# step of each model frequency as NumPy timedelta
+_FREQ_STEPS = {
+    '1d': np.timedelta64(1, 'D'),
+    '1h': np.timedelta64(1, 'h')
+}
+
+
+def export_slim_model(model: MLForecast) -> SlimModel:
+    """
+    Extracts the estimators, the config and the last max(lags) observations of
+    each series of a fitted MLForecast.
+
+    Raises:
+        ValueError: If the model uses transforms that keep state besides the lags
+    """
+    ts = model.ts
+    if ts.lag_transforms or ts.target_transforms:
+        raise ValueError("Models with lag or target transforms can't be exported in the slim format")
+    if ts.freq not in _FREQ_STEPS:
+        raise ValueError(f"Unsupported frequency: {ts.freq}. Must be one of: {list(_FREQ_STEPS)}")
+
+    # the target of every series is stored contiguously, ga.indptr delimits them
+    indptr = ts.ga.indptr
+    sizes = np.minimum(np.diff(indptr), max(ts.lags))
+    series = np.repeat(np.arange(sizes.size), sizes)
+    rows = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes), sizes) + indptr[1:][series]
+
+    return SlimModel(
+        models=model.models_,
+        freq=ts.freq,
+        lags=list(ts.lags),
+        date_features=ts.date_features,
+        static_features={column: ts.static_features_[column].to_numpy() for column in ts.static_features},
+        max_horizon=ts.max_horizon,
+        columns=(ts.id_col, ts.time_col, ts.target_col),
+        uids=ts.uids.to_numpy(),
+        last_dates=ts.last_dates.to_numpy(),
+        sizes=sizes.astype(np.int32),
+        y=ts.ga.data[rows]
+    )
+
+
+def rebuild_model(slim: SlimModel) -> MLForecast:
+    """Rebuilds a predict-capable MLForecast from the slim format."""
+    id_col, time_col, target_col = slim.columns
+    sizes = slim.sizes.astype(np.int64)
+    series = np.repeat(np.arange(sizes.size), sizes)
+    steps_to_last = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes), sizes) + 1
+    
+    tail = pl.DataFrame({
+        id_col: slim.uids[series],
+        time_col: slim.last_dates[series] + steps_to_last * _FREQ_STEPS[slim.freq],
+        target_col: np.asarray(slim.y),
+        **{column: values[series] for column, values in slim.static_features.items()}
+    })
+    
+    model = MLForecast(
+        models=slim.models,
+        freq=slim.freq,
+        lags=slim.lags,
+        date_features=slim.date_features
+    )
+    # the tail is only used as the series state, its rows aren't training rows
+    model.preprocess(
+        tail,
+        id_col=id_col,
+        time_col=time_col,
+        target_col=target_col,
+        static_features=list(slim.static_features),
+        max_horizon=slim.max_horizon,
+        dropna=False
+    )
+    model.models_ = slim.models
+    return model
+
+
+def save_model(
+    model: Any,
+    path: str | Path = DEFAULT_MODEL_PATH,
+    version: str | None = None,
+    freq: str = '1d',
+    global_model: bool = False,
+    slim: bool = False
+) -> ModelArtifact:
+    """
+    Persists the model with its metadata. The version defaults to the training
+    timestamp. The file is not compressed so NumPy payloads can be memory mapped
+    when loaded.
+    
+    If slim is set, fitted MLForecast models are stored in the slim format.
+    """
+    if slim and isinstance(model, MLForecast) and hasattr(model, 'models_'):
+        model = export_slim_model(model)
+    
+    trained_at = datetime.now()
+    artifact = ModelArtifact(
+        model=model,
+        version=version or trained_at.strftime("%Y%m%d%H%M%S"),
+        freq=freq,
+        global_model=global_model,
+        trained_at=trained_at
+    )
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # written aside and renamed, a process reading the artifact never sees a partial file
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    joblib.dump(artifact, tmp_path)
+    tmp_path.replace(path)
+
+    logger.info("Saved model version %s to %s", artifact.version, path)
+    return artifact
+
+
+class _CacheEntry(NamedTuple):
+    artifact: ModelArtifact
+    mtime_ns: int
+
+
+_model_cache: dict[Path, _CacheEntry] = {}
+_cache_lock = threading.Lock()
+
+
+def load_model(path: str | Path = DEFAULT_MODEL_PATH, version: str | None = None) -> ModelArtifact:
+    """
+    Returns the artifact stored at path from the process cache. The file is read
+    again only when its mtime changed or when the cached artifact isn't the
+    requested version. Arrays are memory mapped instead of copied into memory.
+    Slim models are rebuilt into an MLForecast before being cached.
+
+    Raises:
+        FileNotFoundError: If there is no artifact at path
+        ValueError: If the stored artifact isn't the requested version
+    """
+    path = Path(path).resolve()
+    mtime_ns = path.stat().st_mtime_ns
+
+    with _cache_lock:
+        entry = _model_cache.get(path)
+        if (
+            entry is not None
+            and entry.mtime_ns == mtime_ns
+            and (version is None or entry.artifact.version == version)
+        ):
+            return entry.artifact
+
+        artifact = joblib.load(path, mmap_mode='r')
+        if version is not None and artifact.version != version:
+            raise ValueError(f"{path} holds model version {artifact.version}, not {version}")
+        if isinstance(artifact.model, SlimModel):
+            artifact = artifact._replace(model=rebuild_model(artifact.model))
+
+        _model_cache[path] = _CacheEntry(artifact, mtime_ns)
+        logger.info("Loaded model version %s from %s", artifact.version, path)
+        return artifact
+
+
+def clear_model_cache() -> None:
+    with _cache_lock:
+        _model_cache.clear()
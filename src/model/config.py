@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta
 
+from src.common import DATA_DIR, MODEL_DIR
+
 
 # training default options
 TRAIN_DATA_FROM =  datetime(2022,1,1)
@@ -13,4 +15,37 @@ PICKUPS_LOCATION = [43]
 # model config
 MODEL_PARAMS = {
     "lags": [1,7,14,28]
-}
\ No newline at end of file
+}
+
+# hourly model config, next day to next week of hourly demand
+HOURLY_MODEL_PARAMS = {
+    "lags": [1, 24, 168],
+    "date_features": ["hour", "weekday"]
+}
+HOURLY_MAX_HORIZON = 24
+
+
+def default_horizon(freq: str) -> int:
+    """Default number of steps forecast by the model of the frequency."""
+    return HOURLY_MAX_HORIZON if freq == '1h' else MAX_HORIZON
+
+# feature store, the store keeps the dense lags 1..FEATURE_MAX_LAG of the daily pickups
+# so any lag set up to it can be read without recomputing
+FEATURE_MAX_LAG = 28
+
+# default search space of the model tuning
+TUNE_LAG_SETS = [
+    [1, 7],
+    [1, 7, 14],
+    [1, 7, 14, 28],
+    [1, 2, 3, 7, 14, 21, 28]
+]
+TUNE_REGRESSORS = ["linear", "ridge", "hgb"]
+TUNE_HORIZONS = [1, 7]
+
+# default paths of the model outputs, here so the CLI reads them without importing the modules writing them
+DEFAULT_MODEL_PATH = MODEL_DIR / "baseline_model.pkl"
+DEFAULT_RESULTS_PATH = MODEL_DIR / "tuning_results.csv"
+DEFAULT_METRIC_STORE_PATH = MODEL_DIR / "metrics"
+DEFAULT_TRACE_PATH = MODEL_DIR / "train_profile.json"
+DEFAULT_DASHBOARD_PATH = DATA_DIR / "dashboard"
@@ -0,0 +1,255 @@
+"""
+Serving tables of the monitoring dashboard.
+
+The dashboard reads compact daily rows by location, the actual pickups, the
+latest forecast of the day with its interval and its error, precomputed from the
+pickups, predictions and prediction_metrics tables. The rows are kept in one
+parquet file per location plus a daily overview across the locations, so a page
+load reads one small file instead of joining the repository tables.
+
+Refreshes are incremental: the days before the watermark, the day after the last
+observed actual, are final and kept as they are, only the days from the
+watermark on are rebuilt from the repository, and files whose rows didn't change
+aren't rewritten.
+"""
+
+import json
+import math
+from datetime import datetime, timedelta
+from pathlib import Path
+from statistics import NormalDist
+
+import polars as pl
+
+from src.adapters.base import NYCTaxiRepository
+from src.common import get_logger
+from src.etl.models import NYCPickupDashboardSchema
+from src.model.config import DEFAULT_DASHBOARD_PATH, MAX_HORIZON
+
+
+logger = get_logger("dashboard")
+
+DASHBOARD_LEVEL = 95
+DASHBOARD_INTERVAL_DAYS = 28
+
+
+def _day(date: datetime) -> datetime:
+    return datetime.combine(date.date(), datetime.min.time())
+
+
+def dashboard_rows(
+    repo: NYCTaxiRepository,
+    from_date: datetime,
+    to_date: datetime,
+    horizon_days: int = MAX_HORIZON,
+    interval_days: int = DASHBOARD_INTERVAL_DAYS,
+    level: int = DASHBOARD_LEVEL
+) -> pl.DataFrame:
+    """
+    Dashboard rows of the days from from_date: actuals of the days before
+    to_date, and the forecasts of the days up to horizon_days after it.
+
+    The forecast of a day is the latest one issued for it, hourly forecasts are
+    summed over the day. The stored forecasts are point forecasts, the level%
+    interval is the normal one of the errors of the same location, model version
+    and horizon, whose standard deviation is estimated from the mean absolute
+    error of the interval_days scored days before to_date as mae * sqrt(pi / 2).
+    The interval is null when these forecasts weren't scored.
+    """
+    actuals = (
+        repo.fetch_aggregated_pickup_data(from_date=from_date, to_date=to_date, granularity='1d', aggregate='sum')
+        .select('pickup_location_id', 'pickup_datetime', pl.col('num_pickup').alias('actual'))
+    )
+    forecasts = (
+        repo.fetch_prediction_data(from_date, to_date + timedelta(days=horizon_days))
+        .with_columns(pl.col('pickup_datetime').dt.truncate('1d'))
+        .group_by('pickup_location_id', 'pickup_datetime', 'issued_at', 'model_version')
+        .agg(pl.col('y_pred').sum().alias('forecast'), pl.col('horizon').min())
+        .sort('issued_at', 'model_version')
+        .group_by('pickup_location_id', 'pickup_datetime', maintain_order=True)
+        .last()
+    )
+    spreads = (
+        repo.fetch_metric_data(to_date - timedelta(days=interval_days), to_date)
+        .filter(pl.col('n_observed') > 0)
+        .group_by('pickup_location_id', 'model_version', 'horizon')
+        .agg((pl.col('sum_abs_error').sum() / pl.col('n_observed').sum() * math.sqrt(math.pi / 2)).alias('sigma'))
+    )
+    z = NormalDist().inv_cdf((1 + level / 100) / 2)
+
+    return (
+        actuals
+        .join(forecasts, on=['pickup_location_id', 'pickup_datetime'], how='full', coalesce=True)
+        .join(spreads, on=['pickup_location_id', 'model_version', 'horizon'], how='left')
+        .with_columns(
+            (pl.col('forecast') - z * pl.col('sigma')).alias('forecast_lo'),
+            (pl.col('forecast') + z * pl.col('sigma')).alias('forecast_hi'),
+            (pl.col('forecast') - pl.col('actual')).alias('error')
+        )
+        .pipe(NYCPickupDashboardSchema.enforce_schema)
+        .sort('pickup_location_id', 'pickup_datetime')
+    )
+
+
+def summarize_days(rows: pl.DataFrame) -> pl.DataFrame:
+    """Daily totals across the locations of the dashboard rows, null while
+    none of the day's rows has a value.
+    """
+    def total(expr: pl.Expr) -> pl.Expr:
+        return pl.when(expr.count() > 0).then(expr.sum())
+
+    return (
+        rows
+        .group_by('pickup_datetime')
+        .agg(
+            pl.col('pickup_location_id').n_unique().alias('locations'),
+            total(pl.col('actual')).alias('actual'),
+            total(pl.col('forecast')).alias('forecast'),
+            total(pl.col('error')).alias('error'),
+            total(pl.col('error').abs()).alias('abs_error'),
+            pl.col('error').count().alias('n_scored')
+        )
+        .sort('pickup_datetime')
+    )
+
+
+def _write(df: pl.DataFrame, path: Path) -> None:
+    # readers never see a partially written file
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    df.write_parquet(tmp_path)
+    tmp_path.replace(path)
+
+
+class DashboardStore:
+    """
+    Dashboard rows in parquet files under path, locations/ with the rows of
+    every location, days.parquet with the daily totals and state.json with the
+    watermark of the last refresh.
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_DASHBOARD_PATH):
+        self.path = Path(path)
+        self.locations_path = self.path / "locations"
+        self.days_path = self.path / "days.parquet"
+        self.state_path = self.path / "state.json"
+
+    def location_path(self, pickup_location_id: int) -> Path:
+        return self.locations_path / f"pickup_location_id={pickup_location_id}.parquet"
+
+    @property
+    def state(self) -> dict:
+        if not self.state_path.exists():
+            return {}
+        return json.loads(self.state_path.read_text())
+
+    @property
+    def watermark(self) -> datetime | None:
+        """First day whose rows can still change, None before the first refresh."""
+        watermark = self.state.get("watermark")
+        return datetime.fromisoformat(watermark) if watermark else None
+
+    def refresh(
+        self,
+        repo: NYCTaxiRepository,
+        to_date: datetime | None = None,
+        from_date: datetime | None = None,
+        horizon_days: int = MAX_HORIZON,
+        interval_days: int = DASHBOARD_INTERVAL_DAYS,
+        level: int = DASHBOARD_LEVEL
+    ) -> int:
+        """
+        Rebuilds the rows of the days from from_date, the watermark when not
+        given, with the actuals before to_date, today by default, and the
+        forecasts stored for them. Forecasts stored later for days before the
+        watermark are only picked up by a refresh from an earlier from_date.
+
+        Returns:
+            int: The number of location files written
+
+        Raises:
+            ValueError: If the dashboard was never refreshed and no from_date is given
+        """
+        from_date = from_date or self.watermark
+        if from_date is None:
+            raise ValueError("The dashboard was never refreshed, from_date is required to build it")
+        from_date = _day(from_date)
+        to_date = _day(to_date or datetime.now())
+
+        rows = dashboard_rows(repo, from_date, to_date, horizon_days, interval_days, level)
+        self.locations_path.mkdir(parents=True, exist_ok=True)
+
+        written = 0
+        final = pl.col('pickup_datetime') < from_date
+        new_rows = rows.partition_by('pickup_location_id', as_dict=True)
+        stored_locations = {int(path.stem.split("=")[1]) for path in self.locations_path.glob("*.parquet")}
+        for pickup_location_id in stored_locations | {key[0] for key in new_rows}:
+            path = self.location_path(pickup_location_id)
+            location_rows = new_rows.get((pickup_location_id,), rows.clear())
+            if path.exists():
+                stored = pl.read_parquet(path)
+                location_rows = pl.concat([stored.filter(final), location_rows])
+                if location_rows.equals(stored):
+                    continue
+            _write(location_rows, path)
+            written += 1
+
+        days = summarize_days(rows)
+        if self.days_path.exists():
+            days = pl.concat([pl.read_parquet(self.days_path).filter(final), days])
+        _write(days, self.days_path)
+
+        # the day after the last actual, or from_date while nothing new was observed
+        last_actual = rows.filter(pl.col('actual').is_not_null())['pickup_datetime'].max()
+        watermark = last_actual + timedelta(days=1) if last_actual is not None else from_date
+        self.state_path.write_text(json.dumps({
+            "watermark": watermark.isoformat(),
+            "refreshed_at": datetime.now().isoformat(),
+            "to_date": to_date.isoformat()
+        }))
+        logger.info("Dashboard refreshed from %s, %s location files written", from_date, written)
+        return written
+
+    def fetch_locations(self) -> list[int]:
+        return sorted(int(path.stem.split("=")[1]) for path in self.locations_path.glob("*.parquet"))
+
+    def fetch_location(
+        self,
+        pickup_location_id: int,
+        from_date: datetime | None = None,
+        to_date: datetime | None = None
+    ) -> pl.DataFrame:
+        """Rows of a location in [from_date, to_date), empty for an unknown location."""
+        path = self.location_path(pickup_location_id)
+        if not path.exists():
+            return pl.DataFrame(schema=NYCPickupDashboardSchema._get_type_mapping())
+        return self._between(pl.read_parquet(path), from_date, to_date)
+
+    def fetch_days(self, from_date: datetime | None = None, to_date: datetime | None = None) -> pl.DataFrame:
+        """Daily totals in [from_date, to_date)."""
+        if not self.days_path.exists():
+            return summarize_days(pl.DataFrame(schema=NYCPickupDashboardSchema._get_type_mapping()))
+        return self._between(pl.read_parquet(self.days_path), from_date, to_date)
+
+    @staticmethod
+    def _between(df: pl.DataFrame, from_date: datetime | None, to_date: datetime | None) -> pl.DataFrame:
+        if from_date is not None:
+            df = df.filter(pl.col('pickup_datetime') >= from_date)
+        if to_date is not None:
+            df = df.filter(pl.col('pickup_datetime') < to_date)
+        return df
+
+
+def refresh_dashboard(repo: NYCTaxiRepository, path: str | Path = DEFAULT_DASHBOARD_PATH, to_date: datetime | None = None) -> int:
+    """
+    Refreshes the dashboard from its watermark after the repository changed,
+    called by the ETL and inference runs. Nothing is done until the dashboard
+    was built by a first refresh with a from_date.
+
+    Returns:
+        int: The number of location files written
+    """
+    store = DashboardStore(path)
+    if store.watermark is None:
+        logger.info("No dashboard in %s, refresh skipped", store.path)
+        return 0
+    return store.refresh(repo, to_date)
@@ -0,0 +1,207 @@
+"""
+Backtest evaluation.
+
+The forecasts of a backtest are reduced in one grouped pass to the error
+statistics of every fold, series and horizon: counts and sums of errors, from
+which every metric is derived. Metrics are computed per series and averaged over
+the series and folds of a group, so the metrics of any grouping are combined
+from the statistics without reading the forecasts again.
+
+The statistics of training runs are kept in a parquet metric store, so runs are
+compared without retraining them.
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+from src.common import get_logger
+from src.model.config import DEFAULT_METRIC_STORE_PATH
+
+
+logger = get_logger("evaluation")
+
+# metrics of the statistics of one series, horizon and fold
+METRICS = {
+    "bias": pl.col("sum_error") / pl.col("n"),
+    "mae": pl.col("sum_abs_error") / pl.col("n"),
+    "mae_per": pl.col("sum_abs_error") / pl.col("sum_y"),
+    "rmse": (pl.col("sum_squared_error") / pl.col("n")).sqrt(),
+    "smape": pl.col("sum_smape") / pl.col("n"),
+    "pinball": pl.col("sum_pinball") / pl.col("n"),
+    "coverage": pl.col("n_covered") / pl.col("n"),
+    "score": (pl.col("sum_abs_error") + pl.col("sum_error").abs()) / pl.col("n"),
+}
+
+
+def interval_columns(level: int, model_name: str = "y_pred") -> tuple[str, str]:
+    """Lower and upper bound columns of the level% prediction interval."""
+    return f"{model_name}-lo-{level}", f"{model_name}-hi-{level}"
+
+
+def _pinball_loss(y: pl.Expr, y_pred: pl.Expr, quantile: float) -> pl.Expr:
+    diff = y - y_pred
+    return pl.max_horizontal(quantile * diff, (quantile - 1) * diff)
+
+
+def error_statistics(df: pl.DataFrame, level: int | None = None) -> pl.DataFrame:
+    """
+    Error statistics of the backtest forecasts by series and horizon, and fold
+    when df has a fold_id column, in a single group_by.
+
+    The point forecast is taken as the median, pinball is its quantile loss
+    averaged with the ones of the interval bounds, as the (1 - level) / 2 and
+    (1 + level) / 2 quantiles, when the level% interval is given, so it only
+    compares runs backtested with the same level. n_covered counts the actuals
+    within the interval, it's null without one.
+    """
+    keys = [key for key in ['fold_id', 'unique_id'] if key in df.columns] + ['horizon']
+    abs_error = pl.col('error').abs()
+
+    if level is None:
+        pinball = 0.5 * abs_error
+        covered = pl.lit(None, dtype=pl.Int64)
+    else:
+        lo, hi = interval_columns(level)
+        lower_quantile = (1 - level / 100) / 2
+        pinball = (
+            0.5 * abs_error
+            + _pinball_loss(pl.col('y'), pl.col(lo), lower_quantile)
+            + _pinball_loss(pl.col('y'), pl.col(hi), 1 - lower_quantile)
+        ) / 3
+        covered = pl.col('y').is_between(pl.col(lo), pl.col(hi)).cast(pl.Int64)
+
+    # the terms of every sum are computed first, so the group_by only runs plain
+    # sums, and grouping on the integer horizon is faster than on the duration
+    horizon_dtype = pl.Duration(df.schema['ds'].time_unit)
+    return (
+        df
+        .lazy()
+        .with_columns(
+            horizon=(pl.col('ds') - pl.col('cutoff')).cast(pl.Int64),
+            error=pl.col('y_pred') - pl.col('y')
+        )
+        .select(
+            *keys,
+            pl.col('y').cast(pl.Float64).alias('sum_y'),
+            pl.col('error').alias('sum_error'),
+            abs_error.alias('sum_abs_error'),
+            pl.col('error').pow(2).alias('sum_squared_error'),
+            # zero when the actual and the forecast are both zero
+            (2 * abs_error / (pl.col('y').abs() + pl.col('y_pred').abs())).fill_nan(0.0).alias('sum_smape'),
+            pinball.alias('sum_pinball'),
+            covered.alias('n_covered')
+        )
+        .group_by(keys)
+        .agg(pl.len().alias('n'), pl.all().sum())
+        .with_columns(
+            pl.col('horizon').cast(horizon_dtype),
+            # a sum of nulls is zero, coverage stays null without intervals
+            pl.col('n_covered') if level is not None else pl.lit(None, dtype=pl.Int64).alias('n_covered')
+        )
+        .sort(keys)
+        .collect()
+    )
+
+
+def summarize_statistics(
+    statistics: pl.DataFrame,
+    by: list[str] | None = None,
+    metrics: list[str] | None = None
+) -> pl.DataFrame:
+    """
+    Metrics of every group of by, horizon by default, averaged over the series
+    and folds of the group. metrics defaults to the metrics of METRICS the
+    statistics hold, coverage only with prediction intervals.
+
+    Raises:
+        ValueError: If a metric is unknown
+    """
+    by = ['horizon'] if by is None else by
+    if metrics is None:
+        has_intervals = statistics['n_covered'].null_count() < statistics.height
+        metrics = [metric for metric in METRICS if metric != 'coverage' or has_intervals]
+    unknown_metrics = set(metrics) - set(METRICS)
+    if unknown_metrics:
+        raise ValueError(f"Unsupported metrics: {sorted(unknown_metrics)}. Must be in: {list(METRICS)}")
+
+    return (
+        statistics
+        .select(*by, **{metric: METRICS[metric] for metric in metrics})
+        .group_by(by)
+        .agg(pl.col(metrics).mean())
+        .sort(by)
+    )
+
+
+class MetricStore:
+    """
+    Backtest statistics of the training runs in parquet files under path,
+    runs.parquet with the parameters of every run and the statistics of each
+    run partitioned by run_id under statistics/.
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_METRIC_STORE_PATH):
+        self.path = Path(path)
+        self.runs_path = self.path / "runs.parquet"
+        self.statistics_path = self.path / "statistics"
+
+    def log_run(self, run_id: str, statistics: pl.DataFrame, params: dict | None = None) -> None:
+        """Stores the statistics of a run, replacing a run with the same id."""
+        run_path = self.statistics_path / f"run_id={run_id}"
+        run_path.mkdir(parents=True, exist_ok=True)
+        statistics.write_parquet(run_path / "statistics.parquet")
+
+        run = pl.DataFrame({
+            "run_id": [run_id],
+            "logged_at": [datetime.now()],
+            "params": [json.dumps(params or {}, default=str)],
+        })
+        if self.runs_path.exists():
+            run = pl.concat([pl.read_parquet(self.runs_path).filter(pl.col("run_id") != run_id), run])
+        run.write_parquet(self.runs_path)
+        logger.info("Logged the backtest of run %s to %s", run_id, self.path)
+
+    def fetch_runs(self) -> pl.DataFrame:
+        """The runs with their parameters as columns."""
+        if not self.runs_path.exists():
+            return pl.DataFrame(schema={"run_id": pl.String, "logged_at": pl.Datetime})
+        runs = pl.read_parquet(self.runs_path)
+        params = pl.DataFrame([json.loads(value) for value in runs["params"]])
+        return pl.concat([runs.drop("params"), params], how="horizontal").sort("logged_at")
+
+    def fetch_statistics(self, run_ids: list[str] | None = None) -> pl.DataFrame:
+        """The statistics of the runs, all of them by default, with their run_id.
+
+        Raises:
+            ValueError: If no run is requested or stored, or a requested run isn't stored
+        """
+        stored_run_ids = self.fetch_runs()["run_id"].to_list()
+        run_ids = stored_run_ids if run_ids is None else run_ids
+        if not run_ids:
+            raise ValueError(f"No run stored in {self.path}")
+        missing_run_ids = set(run_ids) - set(stored_run_ids)
+        if missing_run_ids:
+            raise ValueError(f"Runs not found in {self.path}: {sorted(missing_run_ids)}")
+
+        # runs with and without fold or series keys are stacked
+        return pl.concat(
+            [
+                pl.read_parquet(self.statistics_path / f"run_id={run_id}" / "statistics.parquet")
+                .select(pl.lit(run_id).alias("run_id"), pl.all())
+                for run_id in run_ids
+            ],
+            how="diagonal_relaxed"
+        )
+
+    def compare_runs(
+        self,
+        run_ids: list[str] | None = None,
+        by: list[str] | None = None,
+        metrics: list[str] | None = None
+    ) -> pl.DataFrame:
+        """Metrics of the runs, all of them by default, by run and the groups of by, horizon by default."""
+        by = ['horizon'] if by is None else by
+        return summarize_statistics(self.fetch_statistics(run_ids), ['run_id', *by], metrics)
@@ -0,0 +1,225 @@
+"""
+Daily lag feature store.
+
+The store keeps one row per pickup location and day with the daily pickups and
+the dense lags 1..max_lag of them as a list column. Lags and rolling means of
+any configured lag set are expanded from that list with vectorized expressions,
+so training and inference read precomputed rows instead of rebuilding the
+lags over the full history on every call.
+"""
+
+from datetime import datetime, timedelta
+import numpy as np
+import polars as pl
+from mlforecast import MLForecast
+
+from src.adapters.base import NYCTaxiRepository
+from src.common import get_logger
+from src.model.config import FEATURE_MAX_LAG
+
+
+logger = get_logger("features")
+
+
+def compute_lag_features(
+    df: pl.DataFrame,
+    max_lag: int = FEATURE_MAX_LAG,
+    target: str = 'num_pickup',
+    ts_column: str = 'pickup_datetime',
+    unique_id: str = 'pickup_location_id'
+) -> pl.DataFrame:
+    """
+    Adds the {target}_lags list column with the lags 1..max_lag of the target
+    of each series. Lags are row based like get_time_lags, missing history
+    is left as null items.
+    
+    The (rows x max_lag) matrix is gathered with NumPy from the sorted target
+    instead of one windowed shift per lag.
+    """
+    df = df.sort([unique_id, ts_column])
+    n_rows = df.height
+    
+    ids = df[unique_id].to_numpy()
+    series_starts = np.r_[0, np.flatnonzero(ids[1:] != ids[:-1]) + 1] if n_rows else np.array([], dtype=np.int64)
+    position = np.arange(n_rows) - np.repeat(series_starts, np.diff(np.r_[series_starts, n_rows]))
+    
+    lags = np.arange(1, max_lag + 1)
+    rows = np.arange(n_rows)[:, None] - lags
+    values = df[target].to_numpy()[np.maximum(rows, 0)]
+    lag_values = (
+        pl.Series(values.ravel(), dtype=df.schema[target])
+        .set(pl.Series(np.ravel(position[:, None] < lags)), None)
+    )
+    
+    return df.with_columns(
+        lag_values
+        .reshape((n_rows, max_lag))
+        .cast(pl.List(df.schema[target]))
+        .alias(f"{target}_lags")
+    )
+
+
+def update_feature_store(
+    repo: NYCTaxiRepository,
+    to_date: datetime,
+    from_date: datetime | None = None,
+    max_lag: int = FEATURE_MAX_LAG
+) -> int:
+    """
+    Appends the days in [from_date, to_date) to the feature store. When from_date
+    is not given, the store is extended from the day after its last stored day, so
+    only newly ingested days are computed. Only the max_lag days before from_date
+    are read to fill the lags of the new rows.
+    
+    Days are complete days, to_date is truncated to the start of its day.
+
+    Returns:
+        int: The number of rows upserted.
+
+    Raises:
+        ValueError: If the store is empty and no from_date is given
+    """
+    
+    if from_date is None:
+        last_date = repo.fetch_last_feature_date()
+        if last_date is None:
+            raise ValueError("The feature store is empty, from_date is required to build it")
+        from_date = last_date + timedelta(days=1)
+    
+    to_date = datetime.combine(to_date.date(), datetime.min.time())
+    if from_date >= to_date:
+        logger.info("Feature store is up to date")
+        return 0
+    
+    features = (
+        repo.fetch_aggregated_pickup_data(
+            from_date=from_date - timedelta(days=max_lag),
+            to_date=to_date,
+            granularity='1d',
+            aggregate='sum'
+        )
+        .pipe(compute_lag_features, max_lag)
+        .filter(pl.col('pickup_datetime') >= from_date)
+    )
+    
+    repo.upsert_feature_data(features)
+    logger.info("Feature store updated from %s to %s", from_date, to_date)
+    return features.height
+
+
+def expand_lag_features(
+    df: pl.DataFrame,
+    lags: list[int],
+    rolling_windows: list[int] | None = None,
+    lags_column: str = 'num_pickup_lags',
+    target: str = 'y',
+    drop_nulls: bool = True
+) -> pl.DataFrame:
+    """
+    Expands the lag list of the feature store into one column per lag and
+    rolling mean. Column names follow get_time_lags, {target}__{i}__lag, and
+    {target}__{w}__rolling_mean for the mean of the last w values.
+
+    Raises:
+        ValueError: If a lag or window is longer than the stored lags
+    """
+    
+    rolling_windows = rolling_windows or []
+    stored_lags = df.select(pl.col(lags_column).list.len().min()).item()
+    longest = max(lags + rolling_windows)
+    if stored_lags is not None and longest > stored_lags:
+        raise ValueError(f"The feature store holds {stored_lags} lags, {longest} were requested")
+    
+    df = (
+        df
+        .with_columns(
+            [
+                pl.col(lags_column).list.get(i - 1).alias(f"{target}__{i}__lag")
+                for i in lags
+            ]
+            +
+            [
+                pl.when(pl.col(lags_column).list.head(w).list.drop_nulls().list.len() == w)
+                .then(pl.col(lags_column).list.head(w).list.mean())
+                .alias(f"{target}__{w}__rolling_mean")
+                for w in rolling_windows
+            ]
+        )
+        .drop(lags_column)
+    )
+    
+    if drop_nulls:
+        return df.drop_nulls()
+    return df
+
+
+def next_step_lags(df: pl.DataFrame, lags_column: str = 'num_pickup_lags', target: str = 'num_pickup') -> pl.DataFrame:
+    """
+    Shifts the stored lags of each row one step ahead, i.e. the lags of the
+    following day: the target of the row becomes lag 1. Applied to the last row
+    of each series it gives the features of the first forecast step.
+    """
+    return (
+        df
+        .with_columns(
+            pl.concat_list(
+                pl.col(target),
+                pl.col(lags_column).list.head(pl.col(lags_column).list.len() - 1)
+            )
+            .alias(lags_column)
+        )
+    )
+
+
+def fit_from_features(
+    model: MLForecast,
+    df: pl.DataFrame,
+    lags_column: str = 'y_lags',
+    static_features: list[str] | None = None,
+    ts_col: str = 'ds',
+    unique_id: str = 'unique_id',
+    y: str = 'y'
+) -> MLForecast:
+    """
+    Fits the models of an MLForecast whose only features are lags with the
+    feature store rows, instead of letting MLForecast rebuild the lags of the
+    full history. The series state needed by predict is initialized from the
+    last max_lag + 1 rows of each series only.
+    
+    Rows with missing lags are dropped, same as MLForecast does. Static features
+    are columns of df passed to the models ahead of the lags.
+
+    Raises:
+        ValueError: If the model uses features other than lags
+    """
+    
+    if model.ts.lag_transforms or model.ts.date_features:
+        raise ValueError("Only models whose features are lags can be fitted from the feature store")
+    
+    lags = model.ts.lags
+    static_features = static_features or []
+    training_data = (
+        df
+        .pipe(expand_lag_features, lags, lags_column=lags_column, target=y)
+        .rename({f"{y}__{i}__lag": f"lag{i}" for i in lags})
+    )
+    
+    (
+        model
+        .preprocess(
+            df
+            .drop(lags_column)
+            .sort([unique_id, ts_col])
+            .group_by(unique_id, maintain_order=True)
+            .tail(max(lags) + 1),
+            id_col=unique_id,
+            time_col=ts_col,
+            target_col=y,
+            static_features=static_features
+        )
+    )
+    model.fit_models(
+        training_data.select(static_features + [f"lag{i}" for i in lags]),
+        training_data[y].to_numpy().astype(np.float64)
+    )
+    return model
@@ -1,44 +1,193 @@
-
-import joblib
+import time
 from datetime import datetime, timedelta
+from pathlib import Path
 import polars as pl
-import argparse
 
-from src.model.config import ModelConfig
-from src.common import MODEL_DIR
-from src.dwh import run_database_operation
+from src.adapters.base import NYCTaxiRepository
+from src.common import get_logger
+from src.etl.models import NYCPickupPredictionSchema
+from src.model.artifacts import DEFAULT_MODEL_PATH, ModelArtifact, load_model
+from src.model.config import PICKUPS_LOCATION, default_horizon
+from src.model.pipeline import LOCATION_FEATURE, history_length
+from src.model.train import fetch_series, forecast_from_cutoffs
+
+
+logger = get_logger("inference")
 
 
-def make_prediction(reference_date:datetime, pickup_locations=ModelConfig.LOCATIONS) -> pl.DataFrame:
+def fetch_history(
+    repo: NYCTaxiRepository,
+    from_date: datetime,
+    to_date: datetime,
+    pickup_locations: list[int] | None,
+    freq: str = '1d',
+    global_model: bool = False
+) -> pl.DataFrame:
+    """
+    Model series of [from_date, to_date), in the fetch_series format. Daily
+    series are read from the daily rows precomputed in the feature store, the
+    model builds its lags from them. The hourly pickups are aggregated instead
+    for hourly models, or when the store is stale, doesn't reach back to
+    from_date or misses a requested location.
+    """
+    last_feature_date = repo.fetch_last_feature_date() if freq == '1d' else None
+    if last_feature_date is not None and last_feature_date >= to_date - timedelta(days=1):
+        features = repo.fetch_feature_data(from_date, to_date, pickup_locations)
+        covered = (
+            not features.is_empty()
+            and features['pickup_datetime'].min() == from_date
+            and (pickup_locations is None or set(pickup_locations) <= set(features['pickup_location_id'].unique()))
+        )
+        if covered:
+            history = features.select(
+                pl.col('pickup_location_id').alias('unique_id'),
+                pl.col('pickup_datetime').alias('ds'),
+                pl.col('num_pickup').alias('y')
+            )
+            if global_model:
+                history = history.with_columns(pl.col('unique_id').alias(LOCATION_FEATURE))
+            return history
+    logger.info("Feature store doesn't cover %s to %s, the pickups are aggregated", from_date, to_date)
+    return fetch_series(repo, from_date, to_date, pickup_locations, freq, global_model)
+
+
+def make_prediction(
+    repo: NYCTaxiRepository,
+    reference_date: datetime,
+    pickup_locations: list[int] | None = PICKUPS_LOCATION,
+    h: int | None = None,
+    model_path: str | Path = DEFAULT_MODEL_PATH,
+    model_version: str | None = None
+) -> pl.DataFrame:
     """Make a prediction for the given reference date and pickup locations
 
+    The model is taken from the process cache, it's only read from disk when the
+    artifact changed. Only the last max(lags) steps of history up to the end of
+    the reference date are fetched, see fetch_history.
+
     Args:
-        reference_date (datetime): The date for which we want to make the prediction
-        pickup_locations (List[str], optional): The list of pickup locations for which we want to make the prediction. Defaults to LOCATIONS.
+        repo (NYCTaxiRepository): Repository holding the pickup data
+        reference_date (datetime): The last day of observed data, the forecast starts after it
+        pickup_locations (list[int] | None, optional): The pickup locations to predict, None for all of them. Defaults to PICKUPS_LOCATION.
+        h (int | None, optional): Forecast horizon in steps of the model frequency. Defaults to default_horizon of the model frequency.
+        model_path (str | Path, optional): The model artifact. Defaults to DEFAULT_MODEL_PATH.
+        model_version (str | None, optional): Expected model version, any version if None.
 
     Returns:
         pl.DataFrame: A DataFrame containing the predictions for the given reference date and pickup locations
     """
+    start = time.perf_counter()
+
+    artifact = load_model(model_path, model_version)
+    model = artifact.model
+    max_lag = history_length(model)
+    h = h or default_horizon(artifact.freq)
 
-    # + 1 guarantees we have enough data for the prediction of the reference date
-    # database operation is not inclusive of the to_date
-    df = run_database_operation(
-        operation="fetch_pickup_data",
-        from_date= reference_date - timedelta(days=max(ModelConfig.LAGS)), 
-        to_date=reference_date + timedelta(days=1),
-        pickup_locations=pickup_locations
+    # the database operation is not inclusive of the to_date
+    to_date = datetime.combine(reference_date.date(), datetime.min.time()) + timedelta(days=1)
+    step = timedelta(days=1) if artifact.freq == '1d' else timedelta(hours=1)
+    from_date = to_date - max_lag * step
+
+    history = fetch_history(repo, from_date, to_date, pickup_locations, artifact.freq, artifact.global_model)
+
+    predictions = model.predict(h=h, new_df=history)
+
+    logger.info(
+        "Predicted %s series with model version %s in %.1f ms",
+        predictions['unique_id'].n_unique(), artifact.version, (time.perf_counter() - start) * 1000
     )
+    return predictions
+
+
+
+
+def issue_times(reference_dates: list[datetime], freq: str = '1d') -> pl.DataFrame:
+    """Issue time and cutoff of the forecasts of the reference dates. A forecast is
+    issued at the end of its reference date, its cutoff is the last step before.
+    """
+    step = timedelta(days=1) if freq == '1d' else timedelta(hours=1)
+    return (
+        pl.DataFrame({'reference_date': reference_dates})
+        .select(
+            pl.col('reference_date').cast(pl.Datetime('us')).dt.truncate('1d').dt.offset_by('1d').unique().sort().alias('issued_at')
+        )
+        .with_columns(cutoff=pl.col('issued_at') - step)
+    )
+
+
+def forecast_reference_dates(
+    artifact: ModelArtifact,
+    history: pl.DataFrame,
+    reference_dates: list[datetime],
+    h: int | None = None
+) -> pl.DataFrame:
+    """Forecasts every reference date for every series of history, in the
+    predictions table format. history is the model series (unique_id, ds, y),
+    the steps after the last reference date are left out. Nothing is read from or
+    written to a repository, so the series can be forecast in separate batches.
+    """
+    step = timedelta(days=1) if artifact.freq == '1d' else timedelta(hours=1)
+    h = h or default_horizon(artifact.freq)
+    issued_at = issue_times(reference_dates, artifact.freq)
+    history = history.filter(pl.col('ds') < issued_at['issued_at'].max())
     
-    model = joblib.load(MODEL_DIR / "baseline_model.pkl")
+    return (
+        forecast_from_cutoffs(artifact.model, h, history, issued_at.select('cutoff'))
+        .join(issued_at, on='cutoff', how='inner')
+        .select(
+            pl.col('unique_id').alias('pickup_location_id'),
+            pl.col('ds').alias('pickup_datetime'),
+            'issued_at',
+            pl.lit(artifact.version).alias('model_version'),
+            ((pl.col('ds') - pl.col('cutoff')).dt.total_seconds() // int(step.total_seconds())).alias('horizon'),
+            'y_pred'
+        )
+    )
+
+
+def batch_predict(
+    repo: NYCTaxiRepository,
+    reference_dates: list[datetime],
+    pickup_locations: list[int] | None = PICKUPS_LOCATION,
+    h: int | None = None,
+    model_path: str | Path = DEFAULT_MODEL_PATH,
+    model_version: str | None = None
+) -> pl.DataFrame:
+    """Forecasts every reference date for every location in a single batch and
+    upserts the forecasts into the predictions table.
     
-    return model.predict(df)
+    The history of all reference dates is read with one repository fetch and
+    the forecasts of all (location, reference date) pairs come from one predict
+    call. A forecast is issued at the end of its reference date.
 
+    Args:
+        repo (NYCTaxiRepository): Repository holding the pickup data, the predictions are written there
+        reference_dates (list[datetime]): The last days of observed data of each forecast
+        pickup_locations (list[int] | None, optional): The pickup locations to predict, None for all of them.
+        h (int | None, optional): Forecast horizon in steps of the model frequency. Defaults to default_horizon of the model frequency.
+        model_path (str | Path, optional): The model artifact. Defaults to DEFAULT_MODEL_PATH.
+        model_version (str | None, optional): Expected model version, any version if None.
 
- 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Run inference for a given date")
-    parser.add_argument("--date", type=str, required=True, help="Reference date for prediction in YYYY-MM-DD format")
-    args = parser.parse_args()
-    reference_date = datetime.strptime(args.date, "%Y-%m-%d")
-    predictions = make_prediction(reference_date)
-    print(predictions)
+    Returns:
+        pl.DataFrame: The forecasts in the predictions table format
+    """
+    start = time.perf_counter()
+    
+    artifact = load_model(model_path, model_version)
+    max_lag = history_length(artifact.model)
+    step = timedelta(days=1) if artifact.freq == '1d' else timedelta(hours=1)
+    issued_at = issue_times(reference_dates, artifact.freq)
+    
+    from_date = issued_at['issued_at'].min() - max_lag * step
+    to_date = issued_at['issued_at'].max()
+    history = fetch_history(repo, from_date, to_date, pickup_locations, artifact.freq, artifact.global_model)
+    
+    predictions = forecast_reference_dates(artifact, history, reference_dates, h)
+    
+    repo.upsert_prediction_data(predictions)
+    
+    logger.info(
+        "Predicted %s reference dates of %s series with model version %s in %.1f ms",
+        issued_at.height, history['unique_id'].n_unique(), artifact.version, (time.perf_counter() - start) * 1000
+    )
+    return NYCPickupPredictionSchema.enforce_schema(predictions)
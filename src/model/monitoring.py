@@ -0,0 +1,96 @@
+"""
+Forecast accuracy monitoring.
+
+The stored forecasts are scored against the actuals day by day inside the
+repository, which keeps the daily error statistics in the prediction_metrics
+table. The statistics are sums, so the metrics over any window are rebuilt from
+the daily rows of the window without reading the forecasts again.
+"""
+
+from datetime import datetime, timedelta
+import polars as pl
+
+from src.adapters.base import NYCTaxiRepository
+from src.common import get_logger
+
+
+logger = get_logger("monitoring")
+
+
+def update_monitoring_metrics(
+    repo: NYCTaxiRepository,
+    to_date: datetime,
+    from_date: datetime | None = None,
+    freq: str = '1d'
+) -> int:
+    """
+    Scores the forecasts of the days in [from_date, to_date). When from_date is
+    not given, scoring resumes from the day after the last scored day, so only
+    the days closed since the previous run are read.
+
+    Days are complete days, to_date is truncated to the start of its day and
+    capped to the day after the last pickups loaded, so days whose actuals
+    aren't loaded yet are scored by a later run once they are.
+
+    Returns:
+        int: The number of metric rows upserted.
+
+    Raises:
+        ValueError: If nothing was scored yet and no from_date is given
+    """
+
+    if from_date is None:
+        last_date = repo.fetch_last_metric_date()
+        if last_date is None:
+            raise ValueError("No forecast was scored yet, from_date is required to start monitoring")
+        from_date = last_date + timedelta(days=1)
+
+    to_date = datetime.combine(to_date.date(), datetime.min.time())
+    last_pickup_date = repo.fetch_last_pickup_date()
+    if last_pickup_date is None:
+        logger.info("No pickups loaded, nothing to score")
+        return 0
+    to_date = min(to_date, datetime.combine(last_pickup_date.date(), datetime.min.time()) + timedelta(days=1))
+    if from_date >= to_date:
+        logger.info("Monitoring metrics are up to date")
+        return 0
+
+    rows = repo.update_metric_data(from_date, to_date, freq)
+    logger.info("Monitoring metrics updated from %s to %s", from_date, to_date)
+    return rows
+
+
+def summarize_metrics(metrics: pl.DataFrame, by: list[str] | None = None) -> pl.DataFrame:
+    """
+    Combines daily error statistics into mae and bias (mean of y_pred - y) over
+    the forecasts with an actual, n_observed of the n forecasts.
+    """
+    if by is None:
+        by = ['pickup_location_id', 'model_version', 'horizon']
+    return (
+        metrics
+        .group_by(by, maintain_order=True)
+        .agg(
+            pl.col('n').sum(),
+            pl.col('n_observed').sum(),
+            (pl.col('sum_abs_error').sum() / pl.col('n_observed').sum()).alias('mae'),
+            (pl.col('sum_error').sum() / pl.col('n_observed').sum()).alias('bias')
+        )
+    )
+
+
+def fetch_rolling_metrics(
+    repo: NYCTaxiRepository,
+    to_date: datetime,
+    window_days: int = 28,
+    pickup_locations: list[int] | None = None,
+    model_version: str | None = None
+) -> pl.DataFrame:
+    """Returns the metrics by location, model version and horizon over the
+    window_days days before to_date.
+    """
+    if window_days < 1:
+        raise ValueError(f"window_days must be positive, got {window_days}")
+
+    metrics = repo.fetch_metric_data(to_date - timedelta(days=window_days), to_date, pickup_locations, model_version)
+    return summarize_metrics(metrics)
@@ -1,12 +1,23 @@
+from datetime import timedelta
+
 import polars as pl
 import polars.selectors as cs
 import numpy as np
-from sklearn.pipeline import Pipeline
+from sklearn.pipeline import Pipeline, make_pipeline
 from sklearn.base import BaseEstimator, RegressorMixin
-from sklearn.linear_model import LinearRegression
+from sklearn.compose import make_column_transformer
+from sklearn.preprocessing import OneHotEncoder
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.ensemble import HistGradientBoostingRegressor
 from mlforecast import MLForecast
+from statsforecast import StatsForecast
+from statsforecast.models import AutoARIMA, AutoETS, MSTL, SeasonalNaive
+
+from src.common import get_logger
+from src.model.config import MODEL_PARAMS, HOURLY_MODEL_PARAMS
+
 
-from src.model.config import MODEL_PARAMS
+logger = get_logger("pipeline")
 
 
 
@@ -75,12 +86,16 @@ class MeanLagPredictor(BaseEstimator, RegressorMixin):
         self.model_name = model_name
         self.random_state = random_state
         self.residuals = None
+        self.residual_ids = None
         
     def fit(self, X:pl.DataFrame, y:pl.DataFrame=None):
         """
         Fitting function. 'y' is present to maintain consistency with
         ML libraries API but it's not required because the predict function
         returns the y as well due to TS data nature.
+        
+        The in-sample residuals are kept as a (series x observations) float32
+        matrix padded with NaN, residual_ids holds the series of each row. 
 
         Args:
             X (pl.DataFrame): _description_
@@ -89,20 +104,93 @@ class MeanLagPredictor(BaseEstimator, RegressorMixin):
         Returns:
             _type_: _description_
         """
-        self.residuals = (
+        residuals = (
             self.predict(X)
             .filter(pl.col(self.target).is_not_null())
-            .select(
+            .group_by(self.unique_id, maintain_order=True)
+            .agg(
                 (pl.col(self.target) - pl.col("y_hat")).alias("residual")
             )
-            ["residual"]
-            .to_list()
-        )   
+        )
+        
+        lengths = residuals["residual"].list.len().to_numpy().astype(np.int64)
+        offsets = np.cumsum(lengths) - lengths
+        rows = np.repeat(np.arange(residuals.height), lengths)
+        
+        self.residual_ids = residuals[self.unique_id]
+        self.residuals = np.full((residuals.height, lengths.max(initial=0)), np.nan, dtype=np.float32)
+        self.residuals[rows, np.arange(lengths.sum()) - np.repeat(offsets, lengths)] = (
+            residuals["residual"].explode().to_numpy()
+        )
         return self
     
+    def _residual_quantiles(self, levels: list[float], method: str = 'quantile') -> pl.DataFrame:
+        """Computes the lower and upper offsets of every level for all series at once.
+        
+        - quantile: empirical (1-level)/2 and (1+level)/2 quantiles of the residuals.
+        - conformal: split conformal, symmetric offset given by the ceil((n+1) * level)-th
+          smallest absolute residual of each series.
+        """
+        if self.residuals is None:
+            raise ValueError("Prediction intervals require the model to be fitted")
+        
+        if method not in ['quantile', 'conformal']:
+            raise ValueError(f"Unsupported interval method: {method}. Must be one of: ['quantile', 'conformal']")
+        
+        offsets = {self.unique_id: self.residual_ids}
+        
+        # NaN are sorted last, so the first n_obs columns hold each series residuals
+        n_obs = (~np.isnan(self.residuals)).sum(axis=1)
+        
+        if method == 'quantile':
+            sorted_residuals = np.sort(self.residuals, axis=1)
+            for level in levels:
+                alpha = (1 - level / 100) / 2
+                offsets[f"lo_{level:g}"] = self._quantile_from_sorted(sorted_residuals, n_obs, alpha)
+                offsets[f"hi_{level:g}"] = self._quantile_from_sorted(sorted_residuals, n_obs, 1 - alpha)
+            return pl.DataFrame(offsets)
+        
+        sorted_abs_residuals = np.sort(np.abs(self.residuals), axis=1)
+        for level in levels:
+            rank = np.ceil((n_obs + 1) * level / 100).astype(int)
+            rank = np.clip(rank, 1, np.maximum(n_obs, 1)) - 1
+            width = np.take_along_axis(sorted_abs_residuals, rank[:, None], axis=1)[:, 0]
+            offsets[f"lo_{level:g}"] = -width
+            offsets[f"hi_{level:g}"] = width
+        return pl.DataFrame(offsets)
+    
+    @staticmethod
+    def _quantile_from_sorted(sorted_values: np.ndarray, n_obs: np.ndarray, q: float) -> np.ndarray:
+        """Row-wise quantile with linear interpolation (numpy default) over the first
+        n_obs values of each row. Much faster than np.nanquantile on padded matrices.
+        """
+        last = np.maximum(n_obs - 1, 0)
+        position = q * last
+        below = np.floor(position).astype(int)
+        above = np.minimum(below + 1, last)
+        lower = np.take_along_axis(sorted_values, below[:, None], axis=1)[:, 0]
+        upper = np.take_along_axis(sorted_values, above[:, None], axis=1)[:, 0]
+        return lower + (position - below) * (upper - lower)
+    
+    def _add_intervals(self, X: pl.DataFrame, prediction: str, levels: list[float], method: str, step: pl.Expr) -> pl.DataFrame:
+        """Adds y_hat_lo_X/y_hat_hi_X columns around the prediction column. The residuals
+        are 1-step ahead, the offsets are widened by sqrt(step) for further horizons.
+        """
+        offsets = self._residual_quantiles(levels, method)
+        offset_columns = [col for col in offsets.columns if col != self.unique_id]
+        return (
+            X
+            .join(offsets, on=self.unique_id, how='left', maintain_order='left')
+            .with_columns([
+                (pl.col(prediction) + pl.col(col) * step.sqrt()).alias(f"y_hat_{col}")
+                for col in offset_columns
+            ])
+            .drop(offset_columns)
+        )
+    
     
     
-    def predict(self, X: pl.DataFrame) -> pl.DataFrame:
+    def predict(self, X: pl.DataFrame, levels: list[float] | None = None, method: str = 'quantile') -> pl.DataFrame:
         """Implement a 1-step ahead forecast. The to take into account
         that pipeline uses lags value of the target, we first add one more row equal to
         the next prediction before calculating the lags. In addition, since
@@ -112,7 +200,8 @@ class MeanLagPredictor(BaseEstimator, RegressorMixin):
         Note that the function returns the input DF plus 1 more row (the forecast) and
         a new column (the in-sample prediction).
         
-        # TODO | 2024-12-11 | Add predictions intervals
+        If levels are given, y_hat_lo_X/y_hat_hi_X columns are added for each level
+        based on the residuals of the fitted model.
 
         """
         
@@ -158,17 +247,28 @@ class MeanLagPredictor(BaseEstimator, RegressorMixin):
                 )
                 .select(input_col+["y_hat"])
         )
+        
+        if levels:
+            X_with_pred = self._add_intervals(X_with_pred, "y_hat", levels, method, pl.lit(1.0))
 
         return X_with_pred
     
-    def forecast(self, X:pl.DataFrame, h:int):
+    def forecast(self, X:pl.DataFrame, h:int, levels: list[float] | None = None, method: str = 'quantile'):
         """Forecast just means multiple multi-step prediction into the future.
         This function applies the recursive strategy in which we iterate over 1-step
         ahead forecast and the result becomes part of the input data and is used for following prediction.
         More info here: https://skforecast.org/0.14.0/user_guides/autoregresive-forecaster
         
-        Note that the function returns the input dataframe plus h more rows and one
-        additional column to flag which rows are predictions
+        Since the prediction is the mean of the lags, each step only depends on the
+        trailing max(lags) values of the series. Those windows are moved into a
+        (series x (max_lag + h)) NumPy buffer and the h recursive steps are filled
+        for all series at once, instead of calling predict over the full history h times.
+        Series with less than max(lags) observations are not forecasted.
+        
+        Note that the function returns the input dataframe, sorted by series and date, plus
+        h more rows per series appended at the end and one additional column to flag which
+        rows are predictions. If levels are given, forecasted rows carry y_hat_lo_X/y_hat_hi_X
+        columns as well.
         
         
 
@@ -180,27 +280,59 @@ class MeanLagPredictor(BaseEstimator, RegressorMixin):
             _type_: _description_
         """
         input_col = X.columns
-        latest_ds = X.pipe(self._get_last_ds, 'last_ds')
-        for i in range(1,h+1):
-            X = (
-                X
-                .pipe(self.predict)
-                .with_columns(
-                    pl.coalesce([self.target, 'y_hat']).alias(self.target)
-                )
-                .select(input_col)
+        max_lag = max(self.lags)
+        
+        history = X.sort([self.unique_id, self.ds])
+        windows = (
+            history
+            .group_by(self.unique_id, maintain_order=True)
+            .agg(
+                pl.col(self.ds).last().alias('last_ds'),
+                pl.col(self.target).tail(max_lag).cast(pl.Float64).alias('window'),
+                pl.len().alias('n_obs')
             )
-            
+            .filter(pl.col('n_obs') >= max_lag)
+        )
+        n_series = windows.height
+        
+        buffer = np.empty((n_series, max_lag + h), dtype=np.float64)
+        buffer[:, :max_lag] = windows['window'].list.to_array(max_lag).to_numpy()
+        
+        # the sum is accumulated in the lags order, same as pl.mean_horizontal
+        for step in range(max_lag, max_lag + h):
+            acc = buffer[:, step - self.lags[0]].copy()
+            for lag in self.lags[1:]:
+                acc += buffer[:, step - lag]
+            buffer[:, step] = acc / len(self.lags)
+        
+        forecast_ds = [windows['last_ds']]
+        for _ in range(h):
+            forecast_ds.append(forecast_ds[-1].dt.offset_by(self.freq))
+        
+        # forecast rows are laid out step by step, hence the transposed buffer
+        forecast = (
+            pl.DataFrame({
+                self.unique_id: windows[self.unique_id].gather(np.tile(np.arange(n_series), h)),
+                self.ds: pl.concat(forecast_ds[1:]),
+                self.target: buffer[:, max_lag:].T.ravel(),
+                'step': np.repeat(np.arange(1, h + 1, dtype=np.float64), n_series)
+            })
+            .sort([self.unique_id, self.ds])
+        )
+        
+        output_col = input_col + ['IsForecasted']
+        if levels:
+            forecast = self._add_intervals(forecast, self.target, levels, method, pl.col('step'))
+            output_col += [col for col in forecast.columns if col.startswith('y_hat_')]
+        
         # add a flag indicating which are forecasted value
-        X = (
-            X
-            .join(latest_ds, on=[self.unique_id])
-            .with_columns(
-                IsForecasted=pl.col(self.ds).gt(pl.col('last_ds'))
-            )
-            .select(input_col + ['IsForecasted'])
+        return (
+            pl.concat([
+                history.with_columns(IsForecasted=pl.lit(False)),
+                forecast.with_columns(IsForecasted=pl.lit(True))
+            ], how='diagonal_relaxed')
+            .select(output_col)
         )
-        return X
     
     def _get_last_ds(self, X:pl.DataFrame, return_name:str=None):
         if not return_name:
@@ -214,13 +346,191 @@ class MeanLagPredictor(BaseEstimator, RegressorMixin):
             )
         )
 
-def build_model() -> MLForecast:
+# static feature holding the pickup location of each series in the global model
+LOCATION_FEATURE = 'location'
+MODEL_FREQUENCIES = ['1d', '1h']
+
+# regressors the model can be built with, the gradient boosting one only takes dense features
+REGRESSORS = {
+    "linear": LinearRegression,
+    "ridge": Ridge,
+    "hgb": HistGradientBoostingRegressor
+}
+DENSE_REGRESSORS = ["hgb"]
+
+# statistical models of the statsforecast backend, one model fitted per series
+STATS_MODELS = {
+    "seasonal_naive": SeasonalNaive,
+    "auto_ets": AutoETS,
+    "auto_arima": AutoARIMA,
+    "mstl": MSTL
+}
+# seasonalities of each frequency, weekly for the daily model, daily and weekly for the hourly one
+SEASON_LENGTHS = {
+    "1d": [7],
+    "1h": [24, 168]
+}
+
+
+class StatsModel:
+    """
+    statsforecast backend with the interface of MLForecast used by training and
+    inference: fit(df), predict(h, new_df) and the models dict with the y_pred
+    model.
+    
+    fit estimates one model per series with the compiled statsforecast models,
+    over n_jobs processes. predict with new_df applies the fitted model of each
+    series to its new history without refitting, only the last input_size steps
+    of it are used, about as many as start on the seasonal phase of the train
+    data, which the fitted seasonal states are relative to. Series the model
+    wasn't fitted on, or with less than two seasons of new history, fall back
+    to the seasonal naive forecast.
+    """
+    
+    def __init__(self, model_name: str, freq: str = '1d', n_jobs: int = 1, input_size: int | None = None):
+        if model_name not in STATS_MODELS:
+            raise ValueError(f"Unsupported statistical model: {model_name}. Must be one of: {list(STATS_MODELS)}")
+        
+        season_lengths = SEASON_LENGTHS[freq]
+        if model_name == "mstl":
+            model = MSTL(season_length=season_lengths, alias="y_pred")
+        else:
+            # single seasonality models use the shortest one
+            model = STATS_MODELS[model_name](season_length=season_lengths[0], alias="y_pred")
+        
+        self.model_name = model_name
+        self.freq = freq
+        self.n_jobs = n_jobs
+        self.season_length = max(season_lengths)
+        self.input_size = input_size or 4 * self.season_length
+        self.models = {"y_pred": model}
+        self.fallback_model = SeasonalNaive(season_length=season_lengths[0])
+        self.sf = StatsForecast(models=[model], freq=freq, n_jobs=n_jobs, fallback_model=self.fallback_model)
+    
+    def fit(self, df: pl.DataFrame, static_features: list[str] | None = None, **kwargs) -> "StatsModel":
+        """Static features and the MLForecast fit options are ignored, the models are univariate."""
+        self.sf.fit(df.select("unique_id", "ds", pl.col("y").cast(pl.Float64)))
+        self.fitted_models_ = dict(zip(self.sf.uids.to_list(), self.sf.fitted_[:, 0]))
+        self.fitted_starts_ = dict(df.group_by("unique_id").agg(pl.col("ds").min()).iter_rows())
+        return self
+    
+    def predict(self, h: int, new_df: pl.DataFrame | None = None, level: int | None = None) -> pl.DataFrame:
+        """With level, adds the bounds of the level% prediction interval, as the
+        y_pred-lo-{level} and y_pred-hi-{level} columns.
+        """
+        levels = None if level is None else [level]
+        if new_df is None:
+            return self.sf.predict(h=h, level=levels)
+        
+        step_duration = timedelta(days=1) if self.freq == "1d" else timedelta(hours=1)
+        series = (
+            new_df
+            .sort("unique_id", "ds")
+            .group_by("unique_id", maintain_order=True)
+            .agg(pl.col("ds").last(), pl.col("y").cast(pl.Float64).tail(self.input_size + self.season_length))
+        )
+        outputs = {"mean": "y_pred"}
+        if level is not None:
+            outputs.update({f"lo-{level}": f"y_pred-lo-{level}", f"hi-{level}": f"y_pred-hi-{level}"})
+        forecasts = {column: [] for column in outputs.values()}
+        fallbacks = []
+        for uid, last_ds, y in zip(series["unique_id"], series["ds"], series["y"].to_numpy()):
+            model = self.fitted_models_.get(uid)
+            if model is not None:
+                # steps from the start of the train data to the first kept one are a multiple of the season
+                steps_since_start = (last_ds - self.fitted_starts_[uid]) // step_duration + 1
+                size = min(len(y), self.input_size)
+                start = len(y) - size + (size - steps_since_start) % self.season_length
+            if model is None or len(y) - start < 2 * self.season_length:
+                # unseen series or history too short for the fitted model
+                fallbacks.append(uid)
+                forecast = self.fallback_model.forecast(y=y, h=h, level=levels)
+            else:
+                forecast = model.forward(y=y[start:], h=h, level=levels)
+            for output, column in outputs.items():
+                forecasts[column].append(np.asarray(forecast[output], dtype=float))
+        
+        if fallbacks:
+            logger.warning(
+                "%s of %s series forecast with the seasonal naive fallback, unseen or shorter than %s steps: %s",
+                len(fallbacks), series.height, 2 * self.season_length, fallbacks[:10]
+            )
+        
+        step = {"days": pl.col("step")} if self.freq == "1d" else {"hours": pl.col("step")}
+        return (
+            series
+            .with_columns(
+                step=pl.int_ranges(1, h + 1),
+                **{column: pl.Series(values, dtype=pl.List(pl.Float64)) for column, values in forecasts.items()}
+            )
+            .explode("step", *forecasts)
+            .select(
+                "unique_id",
+                pl.col("ds") + pl.duration(**step),
+                *forecasts
+            )
+        )
+
+
+def history_length(model) -> int:
+    """Steps of history a fitted model needs to forecast a series."""
+    if isinstance(model, StatsModel):
+        return model.input_size
+    return max(model.ts.lags)
+
+
+def build_model(
+    global_model: bool = False,
+    freq: str = '1d',
+    lags: list[int] | None = None,
+    regressor: str = 'linear',
+    n_jobs: int = 1
+) -> MLForecast | StatsModel:
+    """
+    Builds the forecasting model. The global model is fitted over many locations at
+    once and receives the location as a categorical static feature, one-hot encoded
+    as a sparse matrix so the stacked features stay small with hundreds of zones.
+    It must be fitted with static_features=[LOCATION_FEATURE].
+    
+    The hourly model uses daily and weekly lags plus hour and weekday features. It's
+    meant to be fitted with max_horizon, one model per step (direct strategy), so a
+    24 to 168 steps forecast is computed at once instead of step by step.
+    
+    lags overrides the lags of the frequency config and regressor picks one of
+    REGRESSORS, both default to the production config. A regressor of STATS_MODELS
+    selects the statsforecast backend instead, fitted over n_jobs processes.
+    
+    Raises:
+        ValueError: If freq is not one of MODEL_FREQUENCIES, regressor not one of
+            REGRESSORS or STATS_MODELS, or a statistical model is asked to be global
+    """
+    if freq not in MODEL_FREQUENCIES:
+        raise ValueError(f"Unsupported frequency: {freq}. Must be one of: {MODEL_FREQUENCIES}")
+    if regressor in STATS_MODELS:
+        if global_model:
+            raise ValueError("Statistical models are fitted per series, they can't be global models")
+        return StatsModel(regressor, freq, n_jobs)
+    if regressor not in REGRESSORS:
+        raise ValueError(f"Unsupported regressor: {regressor}. Must be one of: {list(REGRESSORS) + list(STATS_MODELS)}")
+    
+    model_params = HOURLY_MODEL_PARAMS if freq == '1h' else MODEL_PARAMS
+    
+    estimator = REGRESSORS[regressor]()
+    if global_model:
+        estimator = make_pipeline(
+            make_column_transformer(
+                (OneHotEncoder(handle_unknown='ignore'), [LOCATION_FEATURE]),
+                remainder='passthrough',
+                sparse_threshold=0 if regressor in DENSE_REGRESSORS else 0.3
+            ),
+            estimator
+        )
     
-    # TODO | 2025-02-28 | abstract params
     return MLForecast(
         models={
-            "y_pred": LinearRegression()
+            "y_pred": estimator
         },
-        freq='1d',
-        lags=MODEL_PARAMS.get('lags')
+        freq=freq,
+        lags=lags or model_params.get('lags'),
+        date_features=model_params.get('date_features')
     )
\ No newline at end of file
@@ -0,0 +1,271 @@
+"""
+Opt-in profiling of the training pipeline.
+
+Code paths are wrapped in span(name), a no-op unless a Profiler is active. The
+active profiler records every span with its wall time, the time spent outside
+its child spans and the resident memory before and after it, while a thread
+samples the resident memory at a fixed interval. The recording is exported as a
+Chrome trace (chrome://tracing or https://ui.perfetto.dev) and summarized by
+span name.
+
+Worker processes of the fold pool profile into a profiler of their own, whose
+events are merged back into the one of the parent.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import NamedTuple
+
+import polars as pl
+
+from src.model.config import DEFAULT_TRACE_PATH
+
+
+class SpanEvent(NamedTuple):
+    name: str
+    start: float
+    duration: float
+    self_time: float
+    pid: int
+    tid: int
+    rss_start_mb: float | None
+    rss_end_mb: float | None
+    args: dict
+
+
+# columns of the summary, args are left out
+SPAN_SCHEMA = {
+    "name": pl.String,
+    "start": pl.Float64,
+    "duration": pl.Float64,
+    "self_time": pl.Float64,
+    "pid": pl.Int64,
+    "tid": pl.Int64,
+    "rss_start_mb": pl.Float64,
+    "rss_end_mb": pl.Float64,
+}
+
+
+class MemorySample(NamedTuple):
+    time: float
+    pid: int
+    rss_mb: float
+
+
+def current_rss_mb() -> float | None:
+    """Resident memory of the process in MB, None where it can't be read."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # peak instead of current outside of Linux, in KB on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 2**20 if os.uname().sysname == "Darwin" else max_rss / 2**10
+
+
+class Profiler:
+    """
+    Records spans and memory samples of the current process. Starts are wall
+    clock times so the events of different processes share the same timeline,
+    durations are measured with perf_counter.
+    """
+
+    def __init__(self, memory_interval: float | None = 0.05):
+        self.memory_interval = memory_interval
+        self.events: list[SpanEvent] = []
+        self.memory: list[MemorySample] = []
+        self.process_names: dict[int, str] = {os.getpid(): "main"}
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+        self._start = None
+        self._wall = 0.0
+
+    def start(self) -> "Profiler":
+        self._start = time.perf_counter()
+        if self.memory_interval and self._sampler is None:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample_memory, daemon=True)
+            self._sampler.start()
+        return self
+
+    def stop(self) -> None:
+        if self._start is not None:
+            self._wall += time.perf_counter() - self._start
+            self._start = None
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def _sample_memory(self) -> None:
+        pid = os.getpid()
+        while not self._stop.wait(self.memory_interval):
+            rss = current_rss_mb()
+            if rss is not None:
+                self.memory.append(MemorySample(time.time(), pid, rss))
+
+    @contextmanager
+    def span(self, name: str, **args):
+        stack = self._local.__dict__.setdefault("stack", [])
+        # child time of the span, added to by the spans opened inside it
+        children = [0.0]
+        stack.append(children)
+        rss_start = current_rss_mb()
+        start = time.time()
+        start_counter = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_counter
+            stack.pop()
+            if stack:
+                stack[-1][0] += duration
+            self.events.append(SpanEvent(
+                name,
+                start,
+                duration,
+                duration - children[0],
+                os.getpid(),
+                threading.get_native_id(),
+                rss_start,
+                current_rss_mb(),
+                args
+            ))
+
+    @property
+    def wall_time(self) -> float:
+        running = time.perf_counter() - self._start if self._start is not None else 0.0
+        return self._wall + running
+
+    def drain(self) -> tuple[list[SpanEvent], list[MemorySample]]:
+        """Returns the recorded events and memory samples and clears them."""
+        events, memory = self.events, self.memory
+        self.events, self.memory = [], []
+        return events, memory
+
+    def merge(self, events: list[SpanEvent], memory: list[MemorySample], process_name: str | None = None) -> None:
+        """Adds the events recorded by another process."""
+        self.events.extend(events)
+        self.memory.extend(memory)
+        if process_name:
+            self.process_names.update({event.pid: process_name for event in events})
+
+    def to_chrome_trace(self) -> dict:
+        """The recording in the Chrome trace event format, times in microseconds."""
+        origin = min(
+            [event.start for event in self.events] + [sample.time for sample in self.memory],
+            default=0.0
+        )
+        trace_events = [
+            {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}}
+            for pid, name in self.process_names.items()
+        ]
+        trace_events.extend(
+            {
+                "name": event.name,
+                "cat": "train",
+                "ph": "X",
+                "ts": (event.start - origin) * 1e6,
+                "dur": event.duration * 1e6,
+                "pid": event.pid,
+                "tid": event.tid,
+                "args": {
+                    **{key: str(value) for key, value in event.args.items()},
+                    "rss_start_mb": event.rss_start_mb,
+                    "rss_end_mb": event.rss_end_mb,
+                },
+            }
+            for event in sorted(self.events, key=lambda event: event.start)
+        )
+        trace_events.extend(
+            {
+                "name": "memory",
+                "ph": "C",
+                "ts": (sample.time - origin) * 1e6,
+                "pid": sample.pid,
+                "args": {"rss_mb": round(sample.rss_mb, 1)},
+            }
+            for sample in self.memory
+        )
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_chrome_trace()))
+        return path
+
+    def summary(self) -> pl.DataFrame:
+        """
+        Time and memory by span name. self_s excludes the time of the child
+        spans, so nested spans aren't counted twice. share is self_s over the
+        wall time of the profiler, the spans of worker processes run in
+        parallel, their shares can add up over 1.
+        """
+        if not self.events:
+            return pl.DataFrame()
+        wall_time = self.wall_time or 1.0
+        return (
+            pl.DataFrame(
+                [event[:-1] for event in self.events],
+                schema=SPAN_SCHEMA,
+                orient="row"
+            )
+            .group_by("name")
+            .agg(
+                pl.len().alias("calls"),
+                pl.col("duration").sum().alias("total_s"),
+                pl.col("self_time").sum().alias("self_s"),
+                (pl.col("duration").mean() * 1000).alias("mean_ms"),
+                (pl.col("duration").max() * 1000).alias("max_ms"),
+                (pl.col("rss_end_mb") - pl.col("rss_start_mb")).max().alias("max_rss_delta_mb"),
+                pl.col("rss_end_mb").max().alias("max_rss_mb"),
+            )
+            .with_columns(share=pl.col("self_s") / wall_time)
+            .sort("self_s", descending=True)
+        )
+
+
+_active_profiler: Profiler | None = None
+
+
+def get_profiler() -> Profiler | None:
+    return _active_profiler
+
+
+def set_profiler(profiler: Profiler | None) -> Profiler | None:
+    """Sets the active profiler of the process, returns the previous one."""
+    global _active_profiler
+    previous, _active_profiler = _active_profiler, profiler
+    return previous
+
+
+@contextmanager
+def profiling(profiler: Profiler | None = None):
+    """Makes profiler, a new one by default, the active profiler of the process
+    within the context.
+    """
+    profiler = profiler or Profiler()
+    previous = set_profiler(profiler.start())
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        set_profiler(previous)
+
+
+def span(name: str, **args):
+    """Records the wrapped block in the active profiler, if any."""
+    if _active_profiler is None:
+        return nullcontext()
+    return _active_profiler.span(name, **args)
@@ -0,0 +1,274 @@
+"""
+Replay of the daily operations over historical pickups.
+
+A virtual clock steps day by day over the pickups of a source repository. At the
+end of every simulated day the pickups of the day are ingested, the daily
+features are extended by one row per location, the model is retrained when it's
+due and the forecasts issued at midnight are stored, as the scheduled ETL,
+feature, training and inference jobs would do on that day.
+
+The features and the model stay in memory from one day to the next. The source
+is read once per run, and the target repository is written and scored every
+flush_every days. A year of operations therefore replays in minutes instead of
+a year of cron runs.
+"""
+
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+import polars as pl
+
+from src.adapters.base import NYCTaxiRepository
+from src.common import get_logger
+from src.etl.models import NYCPickupFeatureSchema
+from src.model.artifacts import ModelArtifact
+from src.model.config import FEATURE_MAX_LAG, MAX_HORIZON
+from src.model.features import compute_lag_features, next_step_lags
+from src.model.inference import forecast_reference_dates
+from src.model.monitoring import update_monitoring_metrics
+from src.model.pipeline import history_length
+from src.model.profiling import span
+from src.model.train import fit_model
+
+
+logger = get_logger("replay")
+
+
+class ReplayDay(NamedTuple):
+    day: datetime
+    locations: int
+    retrained: bool
+    model_version: str
+    forecasts: int
+    seconds: float
+
+
+class ReplaySimulator:
+    """
+    Replays the operations from start on the pickups of source. Forecasts,
+    features, pickups and monitoring metrics are written to target. When target
+    is the source, the pickups are already there and aren't ingested again.
+
+    The model is trained on the train_days days before the clock and retrained
+    every retrain_every days. Its version is the day it was trained on. Models
+    are fitted on the stored lags, like the feature store models, so
+    pickup_locations without a full train_days of history are fitted on the
+    rows they have.
+
+    Raises:
+        ValueError: If retrain_every, train_days or flush_every isn't positive
+    """
+
+    def __init__(
+        self,
+        source: NYCTaxiRepository,
+        start: datetime,
+        target: NYCTaxiRepository | None = None,
+        retrain_every: int = 7,
+        train_days: int = 365,
+        h: int = MAX_HORIZON,
+        regressor: str = 'linear',
+        pickup_locations: list[int] | None = None,
+        flush_every: int = 30,
+        score: bool = True,
+        max_lag: int = FEATURE_MAX_LAG
+    ):
+        for name, value in [("retrain_every", retrain_every), ("train_days", train_days), ("flush_every", flush_every)]:
+            if value < 1:
+                raise ValueError(f"{name} must be positive, got {value}")
+
+        self.source = source
+        self.target = target or source
+        self.clock = datetime.combine(start.date(), datetime.min.time())
+        self.retrain_every = retrain_every
+        self.train_days = train_days
+        self.h = h
+        self.regressor = regressor
+        self.pickup_locations = pickup_locations
+        self.flush_every = flush_every
+        self.score = score
+        self.max_lag = max_lag
+
+        self.start = self.clock
+        self.artifact: ModelArtifact | None = None
+        # feature store rows of the last train_days days, one frame per day
+        self._feature_days: deque[pl.DataFrame] | None = None
+        # last feature row of every location, the lags of its next row are shifted from it
+        self._last_rows: pl.DataFrame | None = None
+        self._pending: dict[str, list[pl.DataFrame]] = {"pickups": [], "features": [], "predictions": []}
+        self._unscored_from = self.clock
+        self._days_since_flush = 0
+
+    def _warm_up(self) -> None:
+        """Features of the train_days days before the clock, read from the source."""
+        train_from = self.clock - timedelta(days=self.train_days)
+        features = (
+            self.source.fetch_aggregated_pickup_data(
+                from_date=train_from - timedelta(days=self.max_lag),
+                to_date=self.clock,
+                granularity='1d',
+                aggregate='sum',
+                pickup_locations=self.pickup_locations
+            )
+            .pipe(compute_lag_features, self.max_lag)
+            .pipe(NYCPickupFeatureSchema.enforce_schema)
+        )
+        self._last_rows = features.group_by('pickup_location_id', maintain_order=True).last().pipe(NYCPickupFeatureSchema.enforce_schema)
+        self._feature_days = deque(
+            features
+            .filter(pl.col('pickup_datetime') >= train_from)
+            .partition_by('pickup_datetime', maintain_order=True),
+            maxlen=self.train_days
+        )
+        logger.info("Warmed up on %s days of %s locations", len(self._feature_days), self._last_rows.height)
+
+    def _ingest(self, day: datetime, pickups: pl.DataFrame) -> pl.DataFrame:
+        """
+        Feature rows of the day, their lags are the ones of the previous rows
+        shifted by a day. Known locations without pickups on the day get a row
+        with 0 pickups, as the ETL fills the hours without pickups.
+        """
+        daily = (
+            pl.concat([
+                self._last_rows.select('pickup_location_id', pl.lit(0, dtype=pl.Int64).alias('num_pickup')),
+                pickups.select(
+                    pl.col('pickup_location_id').cast(pl.Int32),
+                    pl.col('num_pickup').cast(pl.Int64)
+                )
+            ])
+            .group_by('pickup_location_id')
+            .agg(pl.col('num_pickup').sum())
+            .with_columns(pickup_datetime=pl.lit(day))
+        )
+        lags = next_step_lags(self._last_rows).select('pickup_location_id', 'num_pickup_lags')
+        features = (
+            daily
+            .join(lags, on='pickup_location_id', how='left')
+            # a new location has no history yet
+            .with_columns(
+                pl.col('num_pickup_lags').fill_null(pl.lit([None] * self.max_lag, dtype=pl.List(pl.Int64)))
+            )
+            .sort('pickup_location_id')
+            .pipe(NYCPickupFeatureSchema.enforce_schema)
+        )
+        self._last_rows = (
+            pl.concat([
+                self._last_rows.join(features, on='pickup_location_id', how='anti'),
+                features
+            ])
+            .sort('pickup_location_id')
+        )
+        self._feature_days.append(features)
+        return features
+
+    def _retrain(self, day: datetime) -> None:
+        train = (
+            pl.concat(self._feature_days)
+            .select(
+                pl.col('pickup_location_id').alias('unique_id'),
+                pl.col('pickup_datetime').alias('ds'),
+                pl.col('num_pickup').alias('y'),
+                pl.col('num_pickup_lags').alias('y_lags')
+            )
+            .sort('ds', maintain_order=True)
+        )
+        model = fit_model(train, self.h, regressor=self.regressor)
+        self.artifact = ModelArtifact(
+            model=model,
+            version=f"replay-{day:%Y%m%d}",
+            trained_at=day + timedelta(days=1)
+        )
+
+    def _forecast(self, day: datetime) -> pl.DataFrame:
+        """Forecasts issued at the end of the day."""
+        history = (
+            pl.concat(list(self._feature_days)[-history_length(self.artifact.model):])
+            .select(
+                pl.col('pickup_location_id').alias('unique_id'),
+                pl.col('pickup_datetime').alias('ds'),
+                pl.col('num_pickup').alias('y')
+            )
+        )
+        return forecast_reference_dates(self.artifact, history, [day], self.h)
+
+    def flush(self) -> None:
+        """Writes the pending rows to the target and scores the forecasts of the
+        days ingested since the last flush.
+        """
+        pending = {table: pl.concat(frames) for table, frames in self._pending.items() if frames}
+        if "pickups" in pending:
+            self.target.upsert_pickup_data(pending["pickups"])
+        if "features" in pending:
+            self.target.upsert_feature_data(pending["features"])
+        if "predictions" in pending:
+            self.target.upsert_prediction_data(pending["predictions"])
+        self._pending = {table: [] for table in self._pending}
+        self._days_since_flush = 0
+
+        if self.score and self.clock > self._unscored_from:
+            update_monitoring_metrics(self.target, to_date=self.clock, from_date=self._unscored_from)
+            self._unscored_from = self.clock
+
+    def run(self, to_date: datetime) -> pl.DataFrame:
+        """
+        Replays the days from the clock to to_date, excluded, and flushes the
+        pending rows. Runs resume where the previous one stopped.
+
+        Returns:
+            pl.DataFrame: One ReplayDay row per simulated day
+        """
+        to_date = datetime.combine(to_date.date(), datetime.min.time())
+        if self._feature_days is None:
+            self._warm_up()
+
+        with span("replay_read", from_date=self.clock, to_date=to_date):
+            pickups = self.source.fetch_pickup_data(self.clock, to_date, self.pickup_locations)
+            pickups_by_day = (
+                pickups
+                .with_columns(day=pl.col('pickup_datetime_hour').dt.truncate('1d'))
+                .partition_by('day', as_dict=True, include_key=False)
+            )
+        # a day without any pickup is still replayed
+        no_pickups = pickups.clear()
+        logger.info("Replaying %s to %s", self.clock.date(), to_date.date())
+
+        days = []
+        while self.clock < to_date:
+            start = time.perf_counter()
+            day = self.clock
+            pickups = pickups_by_day.get((day,), no_pickups)
+
+            with span("replay_ingest", day=day):
+                features = self._ingest(day, pickups)
+            retrained = self.artifact is None or (day - self.start).days % self.retrain_every == 0
+            if retrained:
+                with span("replay_retrain", day=day):
+                    self._retrain(day)
+            with span("replay_forecast", day=day):
+                predictions = self._forecast(day)
+
+            if self.target is not self.source:
+                self._pending["pickups"].append(pickups)
+            self._pending["features"].append(features)
+            self._pending["predictions"].append(predictions)
+
+            self.clock = day + timedelta(days=1)
+            self._days_since_flush += 1
+            if self._days_since_flush >= self.flush_every:
+                with span("replay_flush", day=day):
+                    self.flush()
+
+            days.append(ReplayDay(
+                day,
+                features.height,
+                retrained,
+                self.artifact.version,
+                predictions.height,
+                time.perf_counter() - start
+            ))
+
+        self.flush()
+        logger.info("Replayed %s days", len(days))
+        return pl.DataFrame(days, schema=list(ReplayDay._fields), orient="row")
@@ -1,21 +1,56 @@
+import os
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime 
+from itertools import repeat
+from pathlib import Path
+from typing import NamedTuple
 import polars as pl 
+from threadpoolctl import threadpool_limits
 
 from mlforecast import MLForecast
 
 from src.common import get_logger
-from src.model.pipeline import build_model
+from src.model.pipeline import build_model, history_length, StatsModel, LOCATION_FEATURE, MODEL_FREQUENCIES, STATS_MODELS
+from src.model.features import fit_from_features
+from src.model.artifacts import save_model
+from src.model.evaluation import MetricStore, error_statistics, interval_columns, summarize_statistics
+from src.model.profiling import Profiler, get_profiler, set_profiler, span
 from src.adapters.base import  NYCTaxiRepository
 
 
 logger = get_logger("train")
 
+class Fold(NamedTuple):
+    """
+    A cross-validation fold as row offsets over a frame sorted by time. The
+    train split is rows [0, test_offset) and the test split rows
+    [test_offset, test_end), so the data is sliced on demand without copies.
+    """
+    fold_id: int
+    train_from: datetime
+    test_from: datetime
+    test_to: datetime
+    test_offset: int
+    test_end: int
+
+    def train(self, df: pl.DataFrame) -> pl.DataFrame:
+        return df.slice(0, self.test_offset)
+
+    def test(self, df: pl.DataFrame) -> pl.DataFrame:
+        return df.slice(self.test_offset, self.test_end - self.test_offset)
+
+    def split(self, df: pl.DataFrame) -> tuple[pl.DataFrame, pl.DataFrame]:
+        return self.train(df), self.test(df)
+
+
 def split_train_test(
         df:pl.DataFrame,
         test_from: datetime,
         every:str,
         ts_col:str='ds'
-    ):
+    ) -> list[Fold]:
     
     """ 
     This splits the dataset into multiple folds taking into 
@@ -25,20 +60,17 @@ def split_train_test(
     
     https://docs.pola.rs/api/python/stable/reference/expressions/api/polars.datetime_range.html#polars.datetime_range
     
-    It returns a list where each item is a (train, test) tuple. This functions
+    It returns a list of Fold with the row offsets of each split, the data
+    of a fold is obtained with `fold.split(df)`. This functions
+    - Requires df to be sorted by ts_col, every fold is a slice of it.
     - Assumes the train size increases on each subsquent fold.
     - Ignores any window size that test size may need. 
     """
+    if not df[ts_col].is_sorted():
+        raise ValueError(f"The data must be sorted by {ts_col} to be split into folds")
 
-    train_from = (
-        df
-        .select(pl.col(ts_col).min()).item(0,0)  
-    )
-
-    test_to = (
-        df
-        .select(pl.col(ts_col).max()).item(0,0)  
-    )
+    train_from = df[ts_col].min()
+    test_to = df[ts_col].max()
 
     fold_info = (
         pl.DataFrame(
@@ -55,28 +87,20 @@ def split_train_test(
             pl.col('literal').alias('test_from'),
             pl.col('literal').shift(-1).fill_null(pl.lit(test_to)).alias('test_to'),
         )
-        .with_row_index('fold_id')
-        .to_dicts()
+        .with_row_index('fold_id', offset=1)
     )
     
-    logger.info('Numbers of folds: %s', len(fold_info))
+    logger.info('Numbers of folds: %s', fold_info.shape[0])
 
-    folds = []
-    for fold_i in fold_info:
-        fold_data = (
-            df
-            .filter(
-                pl.col(ts_col).is_between(fold_i.get('train_from'), fold_i.get('test_to'), closed='left')
-            )
-            .with_columns(
-                fold_id = pl.lit(fold_i.get('fold_id')),
-                is_test = pl.col(ts_col).ge(fold_i.get('test_from'))
-            )
-        )
-        folds.append(
-            ( fold_data.filter(~pl.col('is_test')), fold_data.filter(pl.col('is_test')))
-        )
-    return folds
+    # first row at or after each boundary, i.e. the test split of a fold is
+    # the rows with test_from <= ts < test_to
+    test_offsets = df[ts_col].search_sorted(fold_info['test_from'], side='left')
+    test_ends = df[ts_col].search_sorted(fold_info['test_to'], side='left')
+
+    return [
+        Fold(**fold_i, test_offset=test_offset, test_end=test_end)
+        for fold_i, test_offset, test_end in zip(fold_info.to_dicts(), test_offsets, test_ends)
+    ]
 
 def rolling_window_forecast(
     model: MLForecast,
@@ -85,27 +109,33 @@ def rolling_window_forecast(
     step_size: int | None  = None,
     ts_col: str = 'ds',
     unique_id: str = 'unique_id',
-    y: str = 'y'
+    y: str = 'y',
+    level: int | None = None
 ) -> pl.DataFrame:
     """
     Performs rolling window forecast evaluation.
 
     For each cutoff point in the test set, generates h-step ahead forecasts
-    and combines them with actual values for evaluation.
+    and combines them with actual values for evaluation. Instead of calling
+    predict once per cutoff over the full history, the trailing window of every
+    (series, cutoff) pair is stacked as an independent series and all cutoffs
+    are predicted in a single call.
 
     Args:
         model: The MLForecast model to use for predictions
         h: Forecast horizon (number of steps ahead to predict)
         df: Test dataset to evaluate on
         step_size: Size of the step between forecast origins. Defaults to h if None.
+        level: If given, the bounds of the level% prediction interval are forecast too,
+            statistical models only.
 
     Returns:
         DataFrame containing actual values and predictions for each cutoff point
     """
-    max_lag = max(model.ts.lags)
+    max_lag = history_length(model)
 
     first_prediction = (
-        df.select(pl.col(ts_col)+ pl.duration(days=max_lag))
+        df.select(pl.col(ts_col).dt.offset_by(f"{max_lag}{model.freq[-1]}"))
         .item(0,0)
     )
     last_series = df.select(pl.col(ts_col).max()).item(0,0)
@@ -127,138 +157,497 @@ def rolling_window_forecast(
         .select(
             pl.col('literal').alias('cutoff')
         )
-        .to_series()
-        .to_list()
     )
+    
+    preds = forecast_from_cutoffs(model, h, df, cutoffs, ts_col=ts_col, unique_id=unique_id, level=level)
+    forecast_columns = list(model.models.keys())
+    if level is not None:
+        forecast_columns.extend(interval_columns(level))
+    
+    with span("join_actuals"):
+        return (
+            df
+            .join(preds, on=[unique_id, ts_col], how='inner')
+            .select([unique_id, ts_col, 'cutoff', y,] + forecast_columns)
+        )
 
 
-    preds = []
-    for cutoff_i in cutoffs:
-        pred_i = (
-            model
-            .predict(h=h, new_df=df.filter(pl.col(ts_col).le(cutoff_i)))
-            .with_columns(
-                cutoff=pl.lit(cutoff_i)
-            )
-        )
-        preds.append(pred_i)
-        
-    return (
-        df
-        .join(pl.concat(preds), on=[unique_id, ts_col], how='inner')
-        .select([unique_id, ts_col, 'cutoff', y,] + list(model.models.keys()))
-    )
+def forecast_from_cutoffs(
+    model: MLForecast,
+    h: int,
+    df: pl.DataFrame,
+    cutoffs: pl.DataFrame,
+    ts_col: str = 'ds',
+    unique_id: str = 'unique_id',
+    level: int | None = None
+) -> pl.DataFrame:
+    """
+    Forecasts h steps after every cutoff for every series of df, as if only the
+    data up to the cutoff was known, in a single predict call.
+    
+    Lag features only look max_lag rows back, so each cutoff only needs the last
+    max_lag rows of each series up to the cutoff. Every (series, cutoff) window
+    becomes its own series and all of them are predicted in one batch.
+    
+    Statistical models forecast a series with its own fitted model, they predict
+    the windows of one cutoff at a time instead.
+
+    Args:
+        model: A fitted MLForecast
+        h: Forecast horizon
+        df: History of the series
+        cutoffs: DataFrame with a cutoff column
+        level: If given, the bounds of the level% prediction interval are forecast too
+
+    Returns:
+        The predictions with the cutoff each one was made from
+
+    Raises:
+        ValueError: If level is given for a model without prediction intervals
+    """
+    max_lag = history_length(model)
+    
+    if level is not None and not isinstance(model, StatsModel):
+        raise ValueError("Prediction intervals are only forecast by the statistical models")
+    
+    if isinstance(model, StatsModel):
+        predictions = []
+        for cutoff in cutoffs['cutoff']:
+            with span("cutoff", cutoff=cutoff):
+                predictions.append(
+                    model
+                    .predict(h=h, new_df=df.filter(pl.col(ts_col) <= cutoff), level=level)
+                    .with_columns(pl.lit(cutoff).alias('cutoff'))
+                )
+        return pl.concat(predictions)
+    
+    with span("windows", cutoffs=cutoffs.height):
+        windows, window_ends = _backtest_windows(df, cutoffs, max_lag, ts_col, unique_id)
+    
+    with span("predict", cutoffs=cutoffs.height, windows=window_ends.height):
+        predictions = model.predict(h=h, new_df=windows)
     
-def evaluate_prediction(df: pl.DataFrame):
     return (
-        df 
+        predictions
+        .join(
+            window_ends.select(
+                pl.col('__backtest_id').cast(pl.Int64),
+                pl.col(unique_id).alias('__unique_id'),
+                'cutoff'
+            ),
+            left_on=unique_id,
+            right_on='__backtest_id',
+            how='inner'
+        )
         .with_columns(
-            error=pl.col('y_pred') - pl.col('y'),
-            horizon = pl.col('ds').sub(pl.col('cutoff'))
+            pl.col('__unique_id').alias(unique_id)
         )
-        .group_by(['unique_id', 'horizon'])
-        .agg(
-            bias=pl.col('error').mean(),
-            mae = pl.col('error').abs().mean(),
-            mae_per = pl.col('error').abs().sum().truediv(pl.col('y').sum())
+        .drop('__unique_id')
+    )
+
+
+def _backtest_windows(
+    df: pl.DataFrame,
+    cutoffs: pl.DataFrame,
+    max_lag: int,
+    ts_col: str,
+    unique_id: str
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """The last max_lag rows of every series up to every cutoff, each window
+    with its own __backtest_id as unique_id, and the (series, cutoff) of each id.
+    """
+    indexed_df = (
+        df
+        .sort([unique_id, ts_col])
+        .with_columns(
+            __row=pl.int_range(pl.len()).over(unique_id)
         )
+    )
+    
+    window_ends = (
+        indexed_df
+        .select(pl.col(unique_id).unique())
+        .join(cutoffs.select('cutoff'), how='cross')
+        .sort('cutoff')
+        .join_asof(
+            indexed_df.select([unique_id, ts_col, '__row']).sort(ts_col),
+            left_on='cutoff',
+            right_on=ts_col,
+            by=unique_id,
+            strategy='backward',
+            check_sortedness=False
+        )
+        .drop_nulls('__row')
+        .select([unique_id, 'cutoff', '__row'])
+        .with_row_index('__backtest_id')
+    )
+    
+    windows = (
+        window_ends
         .with_columns(
-            score = pl.col('mae').add(pl.col('bias').abs())
+            __row=pl.int_ranges(
+                pl.max_horizontal(pl.col('__row') - max_lag + 1, pl.lit(0)),
+                pl.col('__row') + 1
+            )
         )
-        .group_by('horizon')
-        .agg(
-            pl.col('bias').mean()
-            , pl.col('mae').mean()
-            , pl.col('score').mean()
+        .explode('__row')
+        .join(indexed_df, on=[unique_id, '__row'], how='inner')
+        .with_columns(
+            pl.col('__backtest_id').cast(pl.Int64).alias(unique_id)
         )
-        .to_dicts()
+        .select(df.columns)
     )
+    return windows, window_ends
     
-def process_result_into_keyval(eval_result:dict):
-    """ 
-    Utility function to transform the evaluation metrics
-    by adding the horizon as part of the key value
+def evaluate_prediction(
+    df: pl.DataFrame,
+    by_location: bool = False,
+    metrics: list[str] | None = None,
+    level: int | None = None
+) -> list[dict]:
     """
-    horizon = eval_result['horizon'].days
-    metrics_no_horizon = [x for x in eval_result.keys() if x != 'horizon']
-    return {f"{x}_{horizon}":eval_result.get(x) for x in metrics_no_horizon}
-      
+    Metrics of the backtest by horizon, averaged over the series. With
+    by_location the metrics of each series are returned instead, so all the
+    locations of a global model are evaluated from the same backtest.
+    
+    metrics are names of evaluation.METRICS, all of them by default, coverage
+    needs the level% prediction interval.
+    """
+    by = ['unique_id', 'horizon'] if by_location else ['horizon']
+    return summarize_statistics(error_statistics(df, level), by, metrics).to_dicts()
+
+
+# environment variables read at import time by the numerical libraries of the workers
+THREAD_ENV_VARS = [
+    "POLARS_MAX_THREADS",
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "NUMBA_NUM_THREADS",
+]
+
+
+@contextmanager
+def worker_thread_env(threads_per_worker: int):
+    """Sets the thread count of the numerical libraries for the processes spawned
+    within the context, so n workers don't each start one thread per core.
+    """
+    previous_env = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+    os.environ.update({var: str(threads_per_worker) for var in THREAD_ENV_VARS})
+    try:
+        yield
+    finally:
+        for var, value in previous_env.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+# frame shared by the folds, set once per worker process by the pool initializer
+_worker_data: pl.DataFrame | None = None
+
+
+def _init_worker(threads_per_worker: int, shared_data: pl.DataFrame | None = None, profile: bool = False) -> None:
+    global _worker_data
+    # BLAS pools may already be loaded by the time the environment is read
+    threadpool_limits(limits=threads_per_worker)
+    _worker_data = shared_data
+    if profile:
+        set_profiler(Profiler().start())
+
+
+def shared_data() -> pl.DataFrame | None:
+    """The frame shared with the worker by process_pool, None outside of its workers."""
+    return _worker_data
+
+
+@contextmanager
+def process_pool(n_jobs: int, shared_data: pl.DataFrame | None = None, profile: bool = False):
+    """Process pool whose workers are limited to their share of the cores. It uses
+    spawn since forking a process with a live Polars thread pool can deadlock.
+    shared_data is sent once to each worker instead of with every task. With
+    profile, every worker records its spans in a profiler of its own.
+    """
+    threads_per_worker = max(1, (os.cpu_count() or 1) // n_jobs)
+    with worker_thread_env(threads_per_worker), ProcessPoolExecutor(
+        max_workers=n_jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads_per_worker, shared_data, profile)
+    ) as executor:
+        yield executor
+
+
+def run_fold(
+    fold: Fold,
+    max_horizon: int,
+    df: pl.DataFrame | None = None,
+    freq: str = '1d',
+    regressor: str = 'linear',
+    model_n_jobs: int = 1,
+    level: int | None = None
+) -> pl.DataFrame:
+    """Fits a fresh model on the train split of the fold and backtests the
+    rolling window forecast on the test split. Folds are independent so this can
+    run in a worker process, where df defaults to the frame shared with the worker.
+    
+    The data carries the location feature when the model is global. The hourly
+    model is fitted with the direct strategy over max_horizon steps. regressor
+    and model_n_jobs are passed to build_model.
+    
+    Returns the error statistics of the fold by series and horizon, with the
+    fold_id, the metrics of all the folds are computed from them at once.
+    """
+    with span("fold", fold_id=fold.fold_id):
+        train, test = fold.split(_worker_data if df is None else df)
+        
+        logger.info('training fold %s', fold.fold_id)
+        logger.info('train shape %s', train.shape[0])
+        logger.info('test shape %s', test.shape[0])
+        
+        with span("fit", rows=train.height):
+            model = fit_model(train, max_horizon, freq, regressor, model_n_jobs)
+        if 'y_lags' in test.columns:
+            test = test.drop('y_lags')
+        
+        with span("backtest", rows=test.height):
+            test_result = rolling_window_forecast(
+                model=model,
+                h=max_horizon,
+                df=test,
+                level=level
+            )
+        
+        with span("evaluate"):
+            return error_statistics(test_result.with_columns(fold_id=pl.lit(fold.fold_id)), level)
+
+
+def _run_fold_profiled(*args):
+    """run_fold in a profiling worker, returns the spans recorded by the worker with the results."""
+    return run_fold(*args), get_profiler().drain()
+
+
+def fetch_series(
+    repo: NYCTaxiRepository,
+    from_date: datetime,
+    to_date: datetime,
+    pickup_locations: list[int] | None,
+    freq: str = '1d',
+    global_model: bool = False
+) -> pl.DataFrame:
+    """Loads the pickup series in the model format (unique_id, ds, y), plus the
+    location feature of the global model. The aggregation to the model frequency
+    is pushed down to the repository.
+    """
+    # the aggregation runs in the repository query, it's profiled with the fetch
+    with span("fetch_aggregate", granularity=freq):
+        data = repo.fetch_aggregated_pickup_data(
+            from_date=from_date,
+            to_date=to_date,
+            granularity=freq,
+            aggregate='sum',
+            pickup_locations=pickup_locations
+        )
+    df = (
+        data
+        .select(
+            pl.col('pickup_location_id').alias('unique_id'),
+            pl.col('pickup_datetime').alias('ds'),
+            pl.col('num_pickup').alias('y')
+        )
+    )
+    if global_model:
+        df = df.with_columns(pl.col('unique_id').alias(LOCATION_FEATURE))
+    return df
+
+
+def fit_model(
+    df: pl.DataFrame,
+    max_horizon: int,
+    freq: str = '1d',
+    regressor: str = 'linear',
+    n_jobs: int = 1
+) -> MLForecast | StatsModel:
+    """Fits the model on the whole data, same as the folds are fitted."""
+    global_model = LOCATION_FEATURE in df.columns
+    static_features = [LOCATION_FEATURE] if global_model else []
+    
+    model = build_model(global_model, freq, regressor=regressor, n_jobs=n_jobs)
+    if isinstance(model, StatsModel):
+        return model.fit(df.drop('y_lags', strict=False))
+    if 'y_lags' in df.columns:
+        return fit_from_features(model, df, lags_column='y_lags', static_features=static_features)
+    if freq == '1h':
+        return model.fit(df, static_features=static_features, max_horizon=max_horizon)
+    return model.fit(df, static_features=static_features)
+
+
 def train_model(
     repo: NYCTaxiRepository,
     train_data_from:datetime,
     train_data_to:datetime,
     test_data_from:datetime,
-    pickup_locations: list[int],
+    pickup_locations: list[int] | None,
     max_horizon:int,
-    cross_validation_split_frequency:str
+    cross_validation_split_frequency:str,
+    n_jobs: int = 1,
+    feature_store: bool = False,
+    global_model: bool = False,
+    per_location_metrics: bool = False,
+    freq: str = '1d',
+    model_path: str | Path | None = None,
+    model_version: str | None = None,
+    slim_model: bool = False,
+    regressor: str = 'linear',
+    model_n_jobs: int = 1,
+    metrics: list[str] | None = None,
+    level: int | None = None,
+    metric_store: MetricStore | None = None
     ):
     
     """Train the model and save it to disk
 
     Args:
         plot_predictions (bool, optional): If True, plot the predictions. Defaults to False.
+        n_jobs (int): Number of processes used to run the cross-validation folds. Each
+            worker builds its own model, results come back in fold order.
+        pickup_locations (list[int] | None): Locations to train on, None for all of them.
+        feature_store (bool): If True, the daily series and their lags are read from
+            the feature store and the models are fitted on the stored lags.
+        global_model (bool): If True, a single model is fitted over all the locations
+            with the location as a categorical feature.
+        per_location_metrics (bool): If True, each fold returns the metrics of every
+            location and horizon instead of the average over locations.
+        freq (str): '1d' for the daily model, '1h' for the hourly model. The
+            max_horizon is given in steps of freq.
+        model_path (str | Path | None): If given, a model fitted on all the data is
+            saved there after the cross-validation.
+        model_version (str | None): Version of the saved model and id of the run in the
+            metric store, defaults to the training timestamp.
+        slim_model (bool): If True, the model is saved in the slim format.
+        regressor (str): Regressor of the model, a statistical model of STATS_MODELS
+            selects the statsforecast backend.
+        model_n_jobs (int): Processes a statistical model is fitted with.
+        metrics (list[str] | None): Metrics of evaluation.METRICS reported for each fold,
+            all of them by default.
+        level (int | None): If given, the level% prediction intervals are backtested too
+            and their coverage is reported, statistical models only.
+        metric_store (MetricStore | None): If given, the error statistics of the folds are
+            logged there with the training parameters.
+    
+    Returns:
+        list[list[dict]]: The evaluation of each fold
+    
+    Raises:
+        ValueError: If the frequency is unknown, the feature store is used for the hourly
+            model or intervals are requested for a model without them
     """
     logger.info("Start Training")
     logger.info("Load training data from database from %s to %s", train_data_from, train_data_to)
 
     
-    # Loading
-    df = repo.fetch_pickup_data(
-        from_date=train_data_from,
-        to_date=train_data_to,
-        pickup_locations=pickup_locations
-    )
+    if freq not in MODEL_FREQUENCIES:
+        raise ValueError(f"Unsupported frequency: {freq}. Must be one of: {MODEL_FREQUENCIES}")
+    if feature_store and freq != '1d':
+        raise ValueError("The feature store holds daily features, it can't train the hourly model")
+    if level is not None and regressor not in STATS_MODELS:
+        raise ValueError("Prediction intervals are only forecast by the statistical models")
+    model_version = model_version or datetime.now().strftime("%Y%m%d%H%M%S")
     
-    # TODO | 2025-03-02 | This should be part of the model or a function "feature engineering"
-    df = (
-        df
-        .sort(by='pickup_datetime_hour')
-        .group_by_dynamic('pickup_datetime_hour', every='1d', group_by='pickup_location_id')
-        .agg(
-            pl.col('num_pickup').sum()
-        )
-        .rename(
-            {
-                "pickup_location_id":'unique_id',
-                "pickup_datetime_hour":"ds",
-                "num_pickup":"y"
-            }
+    if feature_store:
+        with span("fetch_features"):
+            features = repo.fetch_feature_data(
+                from_date=train_data_from,
+                to_date=train_data_to,
+                pickup_locations=pickup_locations
+            )
+        df = (
+            features
+            .select(
+                pl.col('pickup_location_id').alias('unique_id'),
+                pl.col('pickup_datetime').alias('ds'),
+                pl.col('num_pickup').alias('y'),
+                pl.col('num_pickup_lags').alias('y_lags')
+            )
         )
-    )
+        if global_model:
+            df = df.with_columns(pl.col('unique_id').alias(LOCATION_FEATURE))
+    else:
+        df = fetch_series(repo, train_data_from, train_data_to, pickup_locations, freq, global_model)
+    with span("sort", rows=df.height):
+        df = df.sort('ds', maintain_order=True)
     
-    folds = split_train_test(df, test_from=test_data_from, every=cross_validation_split_frequency)
+    # folds are row offsets over df, each split is sliced when the fold runs
+    with span("split"):
+        folds = split_train_test(df, test_from=test_data_from, every=cross_validation_split_frequency)
     
     logger.info("Fit the model")
-    model = build_model()
+    
+    n_jobs = min(n_jobs, len(folds))
     
     # Fit
-    for i, (train, test) in  enumerate(folds, start=1):
-                
-        logger.info('training fold %s', i)
-        logger.info('train shape %s', train.shape[0])
-        logger.info('test shape %s', test.shape[0])
-
-        
-        model.fit(train)
-        
-        test_result = rolling_window_forecast(
-            model=model,
-            h=max_horizon,
-            df=test,
+    profiler = get_profiler()
+    if n_jobs > 1:
+        logger.info("Running %s folds over %s processes", len(folds), n_jobs)
+        fold_args = (folds, repeat(max_horizon), repeat(None), repeat(freq), repeat(regressor), repeat(model_n_jobs), repeat(level))
+        with process_pool(n_jobs, shared_data=df, profile=profiler is not None) as executor:
+            if profiler is None:
+                results = list(executor.map(run_fold, *fold_args))
+            else:
+                results = []
+                for fold_results, (events, memory) in executor.map(_run_fold_profiled, *fold_args):
+                    results.append(fold_results)
+                    profiler.merge(events, memory, process_name="fold worker")
+    else:
+        results = list(map(run_fold, folds, repeat(max_horizon), repeat(df), repeat(freq), repeat(regressor), repeat(model_n_jobs), repeat(level)))
+    
+    # metrics of every fold in one pass over the statistics of all of them
+    statistics = pl.concat(results)
+    by = ['fold_id', 'unique_id', 'horizon'] if per_location_metrics else ['fold_id', 'horizon']
+    fold_metrics = [
+        fold.drop('fold_id').to_dicts()
+        for fold in summarize_statistics(statistics, by, metrics).partition_by('fold_id', maintain_order=True)
+    ]
+    for fold, metrics_of_fold in zip(folds, fold_metrics):
+        logger.info("Metrics of fold %s: %s", fold.fold_id, metrics_of_fold)
+    
+    if metric_store is not None:
+        metric_store.log_run(
+            model_version,
+            statistics,
+            params=dict(
+                train_data_from=train_data_from,
+                train_data_to=train_data_to,
+                test_data_from=test_data_from,
+                pickup_locations=pickup_locations,
+                max_horizon=max_horizon,
+                cross_validation_split_frequency=cross_validation_split_frequency,
+                feature_store=feature_store,
+                global_model=global_model,
+                freq=freq,
+                regressor=regressor,
+                level=level
+            )
         )
-
-        logger.info('Evaluating predictions')
-   
-        fold_results = evaluate_prediction(test_result)
-        # eval_transform = [ process_result_into_keyval(x) for x in eval]
-        
-        logger.info(fold_results)
-        
     
     # persist
-    # joblib.dump(model, MODEL_DIR / "baseline_model.pkl")
+    if model_path is not None:
+        logger.info("Fit the model on the whole data")
+        with span("final_fit", rows=df.height):
+            model = fit_model(df, max_horizon, freq, regressor, model_n_jobs)
+        with span("save"):
+            save_model(
+                model,
+                model_path,
+                version=model_version,
+                freq=freq,
+                global_model=global_model,
+                slim=slim_model
+            )
     
     logger.info("Training finished")
+    return fold_metrics
 
 # if __name__ == "__main__":
 #     from src.adapters.base import initialize_repository
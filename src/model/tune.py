@@ -0,0 +1,249 @@
+"""
+Hyperparameter search over lag sets and regressors of the daily model.
+
+The dense lags 1..max(lags) of every candidate are computed once for the whole
+data, each candidate fits on the lags it uses from that list, so none of them
+rebuilds its features. The data is sent once to every worker of the process
+pool and candidates are evaluated fold by fold over it. After prune_after folds
+the candidates dominated at every evaluated horizon are dropped, so the later
+folds only run for the candidates that can still win.
+"""
+
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from itertools import repeat
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import polars as pl
+
+from src.adapters.base import NYCTaxiRepository
+from src.common import get_logger
+from src.model.config import DEFAULT_RESULTS_PATH, TUNE_HORIZONS, TUNE_LAG_SETS, TUNE_REGRESSORS
+from src.model.features import compute_lag_features, fit_from_features
+from src.model.pipeline import LOCATION_FEATURE, REGRESSORS, build_model
+from src.model.train import (
+    Fold,
+    evaluate_prediction,
+    fetch_series,
+    forecast_from_cutoffs,
+    process_pool,
+    shared_data,
+    split_train_test
+)
+
+
+logger = get_logger("tune")
+
+
+class Candidate(NamedTuple):
+    lags: tuple[int, ...]
+    regressor: str
+
+
+def search_space(
+    lag_sets: list[list[int]],
+    regressors: list[str],
+    n_candidates: int | None = None,
+    seed: int = 0
+) -> list[Candidate]:
+    """
+    The grid of lag sets and regressors. With n_candidates, a random sample of
+    n_candidates of them instead, in grid order.
+    """
+    grid = list(dict.fromkeys(
+        Candidate(tuple(sorted(set(lags))), regressor)
+        for lags in lag_sets
+        for regressor in regressors
+    ))
+    if n_candidates is not None and n_candidates < len(grid):
+        sample = np.random.default_rng(seed).choice(len(grid), n_candidates, replace=False)
+        grid = [grid[i] for i in sorted(sample)]
+    return grid
+
+
+def evaluate_candidate(
+    candidate: Candidate,
+    fold: Fold,
+    horizons: list[int],
+    df: pl.DataFrame | None = None
+) -> list[dict]:
+    """
+    Fits the candidate on the train split of the fold from the shared lag list
+    and backtests it on the test split. Forecasts start at the first test day
+    and every max(horizons) days after, the same cutoffs for every candidate,
+    history before the test split feeds the lags of the first ones.
+
+    Returns the metrics of each horizon in horizons, df defaults to the frame
+    shared with the worker.
+    """
+    df = shared_data() if df is None else df
+    static_features = [LOCATION_FEATURE] if LOCATION_FEATURE in df.columns else []
+    h = max(horizons)
+
+    model = build_model(bool(static_features), '1d', list(candidate.lags), candidate.regressor)
+    fit_from_features(model, fold.train(df), lags_column='y_lags', static_features=static_features)
+
+    history = (
+        df
+        .slice(0, fold.test_end)
+        .filter(pl.col('ds') >= fold.test_from - timedelta(days=max(candidate.lags)))
+        .drop('y_lags')
+    )
+    cutoffs = pl.DataFrame({
+        'cutoff': pl.datetime_range(
+            fold.test_from - timedelta(days=1),
+            fold.test_to - timedelta(days=1),
+            f"{h}d",
+            eager=True,
+            closed='left'
+        )
+    })
+    predictions = (
+        forecast_from_cutoffs(model, h, history, cutoffs)
+        .join(fold.test(df).select('unique_id', 'ds', 'y'), on=['unique_id', 'ds'], how='inner')
+    )
+
+    return [
+        {**metrics, 'horizon': metrics['horizon'].days}
+        for metrics in evaluate_prediction(predictions)
+        if metrics['horizon'].days in horizons
+    ]
+
+
+def dominated_candidates(scores: np.ndarray, margin: float = 0.0) -> np.ndarray:
+    """
+    Flags the rows of a (candidates x horizons) score matrix, lower is better,
+    for which another row scores at most (1 - margin) times as much at every
+    horizon.
+    """
+    threshold = scores * (1 - margin)
+    # [i, j] is True when candidate j dominates candidate i
+    dominates = (
+        (scores[None, :, :] <= threshold[:, None, :]).all(axis=2)
+        & (scores[None, :, :] < scores[:, None, :]).any(axis=2)
+    )
+    return dominates.any(axis=1)
+
+
+def rank_results(results: pl.DataFrame, n_folds: int) -> pl.DataFrame:
+    """
+    Averages the fold metrics of every candidate and ranks the candidates by
+    score at each horizon. Pruned candidates, evaluated on fewer folds, rank
+    after the ones evaluated on every fold.
+    """
+    return (
+        results
+        .group_by('lags', 'regressor', 'horizon')
+        .agg(
+            pl.len().alias('folds'),
+            pl.col('score').mean(),
+            pl.col('mae').mean(),
+            pl.col('bias').mean()
+        )
+        .with_columns(pruned=pl.col('folds') < n_folds)
+        .sort('horizon', 'pruned', 'score')
+        .with_columns(rank=pl.int_range(1, pl.len() + 1).over('horizon'))
+        .select('horizon', 'rank', 'lags', 'regressor', 'score', 'mae', 'bias', 'folds', 'pruned')
+    )
+
+
+def tune_model(
+    repo: NYCTaxiRepository,
+    train_data_from: datetime,
+    train_data_to: datetime,
+    test_data_from: datetime,
+    pickup_locations: list[int] | None,
+    cross_validation_split_frequency: str,
+    lag_sets: list[list[int]] = TUNE_LAG_SETS,
+    regressors: list[str] = TUNE_REGRESSORS,
+    horizons: list[int] = TUNE_HORIZONS,
+    n_candidates: int | None = None,
+    seed: int = 0,
+    n_jobs: int = 1,
+    global_model: bool = False,
+    prune_after: int = 1,
+    prune_margin: float = 0.05,
+    output_path: str | Path | None = DEFAULT_RESULTS_PATH
+) -> pl.DataFrame:
+    """Searches the lag sets, regressors and horizons of the daily model
+
+    Args:
+        lag_sets (list[list[int]]): Lag sets of the search
+        regressors (list[str]): Regressors of the search, keys of REGRESSORS
+        horizons (list[int]): Horizons, in days, the candidates are evaluated and ranked at
+        n_candidates (int | None): If given, random search over n_candidates of the grid
+        seed (int): Seed of the random search
+        n_jobs (int): Number of processes evaluating the candidates of a fold
+        global_model (bool): If True, candidates are global models over all the locations
+        prune_after (int): Folds every candidate is evaluated on before pruning
+        prune_margin (float): Relative margin a candidate must be beaten by at every
+            horizon to be pruned
+        output_path (str | Path | None): CSV or parquet file the ranked results are
+            written to, not written if None
+
+    Returns:
+        pl.DataFrame: The candidates ranked at each horizon
+
+    Raises:
+        ValueError: If the search space or the horizons are empty, or a regressor is unknown
+    """
+    candidates = search_space(lag_sets, regressors, n_candidates, seed)
+    if not candidates or not horizons:
+        raise ValueError("The search needs at least one lag set, one regressor and one horizon")
+    unknown_regressors = set(regressors) - set(REGRESSORS)
+    if unknown_regressors:
+        raise ValueError(f"Unsupported regressors: {sorted(unknown_regressors)}. Must be in: {list(REGRESSORS)}")
+    max_lag = max(max(candidate.lags) for candidate in candidates)
+
+    logger.info("Tuning %s candidates with lags up to %s", len(candidates), max_lag)
+    df = (
+        fetch_series(repo, train_data_from, train_data_to, pickup_locations, '1d', global_model)
+        .pipe(compute_lag_features, max_lag, target='y', ts_column='ds', unique_id='unique_id')
+        .sort('ds', maintain_order=True)
+    )
+    folds = split_train_test(df, test_from=test_data_from, every=cross_validation_split_frequency)
+
+    results = []
+    alive = candidates
+    n_jobs = min(n_jobs, len(candidates))
+    with process_pool(n_jobs, shared_data=df) if n_jobs > 1 else nullcontext() as executor:
+        map_candidates = executor.map if executor else map
+        shared_df = None if executor else df
+
+        for fold in folds:
+            fold_results = map_candidates(evaluate_candidate, alive, repeat(fold), repeat(horizons), repeat(shared_df))
+            for candidate, metrics in zip(alive, fold_results):
+                results.extend(
+                    {'lags': ','.join(map(str, candidate.lags)), 'regressor': candidate.regressor, 'fold_id': fold.fold_id, **row}
+                    for row in metrics
+                )
+
+            if fold.fold_id >= prune_after and len(alive) > 1:
+                scores = (
+                    pl.DataFrame(results)
+                    .pivot(on='horizon', index=['lags', 'regressor'], values='score', aggregate_function='mean')
+                )
+                score_of = {
+                    (row[0], row[1]): row[2:]
+                    for row in scores.iter_rows()
+                }
+                matrix = np.array([score_of[(','.join(map(str, c.lags)), c.regressor)] for c in alive], dtype=float)
+                dominated = dominated_candidates(matrix, prune_margin)
+                if dominated.any():
+                    logger.info("Pruned %s candidates after fold %s", dominated.sum(), fold.fold_id)
+                alive = [candidate for candidate, is_dominated in zip(alive, dominated) if not is_dominated]
+
+    ranked = rank_results(pl.DataFrame(results), len(folds))
+
+    if output_path is not None:
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        if output_path.suffix == '.parquet':
+            ranked.write_parquet(output_path)
+        else:
+            ranked.write_csv(output_path)
+        logger.info("Tuning results written to %s", output_path)
+
+    return ranked
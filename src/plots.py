@@ -1,9 +1,24 @@
+"""
+Plots of the pickup timeseries.
+
+Long series are downsampled before they're plotted, so a figure never holds more
+than max_points points per trace whatever the length of the data. Both
+downsamplings run as polars expressions over buckets of consecutive points:
+min/max keeps the extremes of every bucket, LTTB the most visible point of
+every bucket.
+"""
+
+import math
 from datetime import datetime
 import polars as pl
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from src.adapters.base import NYCTaxiRepository
+
+
+DOWNSAMPLINGS = ["minmax", "lttb"]
+DEFAULT_MAX_POINTS = 2000
 
 
 # # TODO | 2024-12-11 | review plot
@@ -16,80 +31,346 @@ import plotly.graph_objects as go
 def to_series(df: pl.DataFrame, column:str) -> pl.Series:
     return df.select(pl.col(column)).to_series()
 
-def plot_ts(
-    ts_data: pl.DataFrame, 
-    series:list[str] = ["num_pickup"], 
-    locations: list[int] | None = None, 
-    plot_from:datetime = None, 
-    fill_between:list[str] = None,
-    target: str | None = None
-    ):
+
+def _bucketed(df: pl.DataFrame, x: str, n_buckets: int, by: list[str], edges: bool = False) -> pl.DataFrame:
     """
-    Plot time-series data
+    Sorts df by x within every group of by and numbers its rows (__row), the
+    rows of the group (__n) and the bucket of consecutive rows each row falls
+    in (__bucket). With edges, the first and the last row of a group get
+    buckets of their own, 0 and n_buckets - 1.
     """
-    
-    if isinstance(series, str):
-        series = [series]
-        
-    
-    ts_data_to_plot = (
-        ts_data.filter(pl.col('pickup_location_id').is_in(locations))
-         if locations else ts_data
+    df = (
+        df
+        .sort([*by, x])
+        .with_columns(
+            __row=pl.int_range(pl.len()).over(by) if by else pl.int_range(pl.len()),
+            __n=pl.len().over(by) if by else pl.len()
+        )
     )
-    
-    if plot_from:
-        ts_data_to_plot = (
-            ts_data_to_plot
-            .filter(
-                pl.col("pickup_datetime_hour").gt(plot_from)
-            )
+    if not edges:
+        return df.with_columns(__bucket=pl.col('__row') * n_buckets // pl.col('__n'))
+    inner = n_buckets - 2
+    return df.with_columns(
+        __bucket=(
+            pl.when(pl.col('__row') == 0).then(0)
+            .when(pl.col('__row') == pl.col('__n') - 1).then(n_buckets - 1)
+            .otherwise(1 + (pl.col('__row') - 1) * inner // (pl.col('__n') - 2).clip(lower_bound=1))
         )
-        
-    fig = go.Figure()
-    # need to pass a polars series
+    )
+
+
+def downsample_minmax(df: pl.DataFrame, x: str, y: str, max_points: int, by: list[str] | None = None) -> pl.DataFrame:
+    """
+    Keeps the first and the last row of every group of by and the rows of the
+    minimum and of the maximum of y in each of (max_points - 2) // 2 buckets of
+    consecutive rows, so peaks survive the downsampling and the plotted range
+    doesn't shrink. Groups within the budget are kept whole.
+    """
+    by = by or []
+    bucket = [*by, '__bucket']
+    return (
+        _bucketed(df, x, max((max_points - 2) // 2, 1), by)
+        .with_columns(__position=pl.int_range(pl.len()).over(bucket))
+        .filter(
+            (pl.col('__n') <= max_points)
+            | (pl.col('__row') == 0)
+            | (pl.col('__row') == pl.col('__n') - 1)
+            | (pl.col('__position') == pl.col(y).arg_min().over(bucket))
+            | (pl.col('__position') == pl.col(y).arg_max().over(bucket))
+        )
+        .drop('__row', '__n', '__bucket', '__position')
+    )
+
+
+def downsample_lttb(df: pl.DataFrame, x: str, y: str, max_points: int, by: list[str] | None = None) -> pl.DataFrame:
+    """
+    Largest triangle three buckets: keeps the first and the last row of every
+    group of by and, in each of max_points - 2 buckets of the rows between them,
+    the row forming the largest triangle with the neighbour buckets. Groups
+    within the budget are kept whole.
+
+    The triangle is drawn with the mean of the previous bucket instead of the
+    row selected there, so the buckets don't depend on one another and all of
+    them are solved in one pass instead of a loop over the buckets.
+
+    Raises:
+        ValueError: If max_points is lower than 3
+    """
+    if max_points < 3:
+        raise ValueError(f"LTTB needs at least 3 points, got {max_points}")
+    by = by or []
+    bucket = [*by, '__bucket']
+    bucketed = (
+        _bucketed(df, x, max_points, by, edges=True)
+        .with_columns(
+            __x=pl.col(x).to_physical().cast(pl.Float64),
+            __y=pl.col(y).cast(pl.Float64)
+        )
+    )
+    means = bucketed.group_by(bucket).agg(__mean_x=pl.col('__x').mean(), __mean_y=pl.col('__y').mean())
+    previous = means.with_columns(pl.col('__bucket') + 1).rename({'__mean_x': '__a_x', '__mean_y': '__a_y'})
+    following = means.with_columns(pl.col('__bucket') - 1).rename({'__mean_x': '__c_x', '__mean_y': '__c_y'})
+
+    area = (
+        (pl.col('__a_x') - pl.col('__c_x')) * (pl.col('__y') - pl.col('__a_y'))
+        - (pl.col('__a_x') - pl.col('__x')) * (pl.col('__c_y') - pl.col('__a_y'))
+    ).abs()
+    return (
+        bucketed
+        .join(previous, on=bucket, how='left')
+        .join(following, on=bucket, how='left')
+        .with_columns(__area=area, __position=pl.int_range(pl.len()).over(bucket))
+        .filter(
+            (pl.col('__n') <= max_points)
+            | (pl.col('__row') == 0)
+            | (pl.col('__row') == pl.col('__n') - 1)
+            | (pl.col('__position') == pl.col('__area').arg_max().over(bucket))
+        )
+        .sort([*by, x])
+        .select(df.columns)
+    )
+
+
+def downsample(
+    df: pl.DataFrame,
+    x: str,
+    y: str,
+    max_points: int | None = DEFAULT_MAX_POINTS,
+    method: str | None = "minmax",
+    by: list[str] | None = None
+) -> pl.DataFrame:
+    """
+    Downsamples the y series of every group of by to at most max_points
+    points, sorted by x. Nothing is dropped when method or max_points is None.
+
+    Raises:
+        ValueError: If the method is unknown
+    """
+    if method is not None and method not in DOWNSAMPLINGS:
+        raise ValueError(f"Unsupported downsampling: {method}. Must be one of: {DOWNSAMPLINGS}")
+    if method is None or max_points is None:
+        return df.sort([*(by or []), x])
+    if method == "lttb":
+        return downsample_lttb(df, x, y, max_points, by)
+    return downsample_minmax(df, x, y, max_points, by)
+
+
+def _add_ts_traces(
+    fig: go.Figure,
+    ts_data: pl.DataFrame,
+    x: str,
+    series: list[str],
+    fill_between: list[str] | None,
+    target: str | None,
+    max_points: int | None,
+    method: str | None,
+    row: int | None = None,
+    col: int | None = None,
+    showlegend: bool = True
+) -> None:
+    """Adds the traces of one location, each column downsampled on its own."""
+    def points(column: str) -> pl.DataFrame:
+        return downsample(ts_data.select(x, column).drop_nulls(), x, column, max_points, method)
+
     for serie in series:
-        fig.add_trace(go.Scatter(
-            x=to_series(ts_data_to_plot,"pickup_datetime_hour"),
-            y=to_series(ts_data_to_plot, serie),
-            mode="lines",
-            name=serie
-            )
+        data = points(serie)
+        fig.add_trace(
+            go.Scatter(x=to_series(data, x), y=to_series(data, serie), mode="lines", name=serie, legendgroup=serie, showlegend=showlegend),
+            row=row,
+            col=col
         )
-    
+
     if target:
+        data = points(target)
         fig.add_trace(
-        go.Scatter(
-            x = to_series(ts_data_to_plot,"pickup_datetime_hour"),
-            y = to_series(ts_data_to_plot, target),
-            mode="markers",
-            name=target,
+            go.Scatter(x=to_series(data, x), y=to_series(data, target), mode="markers", name=target, legendgroup=target, showlegend=showlegend),
+            row=row,
+            col=col
         )
-    )
-        
+
     if fill_between is not None:
+        # both bounds are drawn on the same x so the band can be filled
+        lower, upper = fill_between
+        data = downsample(ts_data.select(x, lower, upper).drop_nulls(), x, upper, max_points, method)
         fig.add_trace(
             go.Scatter(
-                 x = to_series(ts_data_to_plot,"pickup_datetime_hour"),
-                 y = to_series(ts_data_to_plot,fill_between[1]),
+                 x = to_series(data, x),
+                 y = to_series(data, upper),
                  showlegend=False,
                  line = dict(width=0),
                  name = "upper 95% CI"
-            )
+            ),
+            row=row,
+            col=col
         )
         fig.add_trace(
             go.Scatter(
-                 x = to_series(ts_data_to_plot,"pickup_datetime_hour"),
-                 y = to_series(ts_data_to_plot,fill_between[0]),
+                 x = to_series(data, x),
+                 y = to_series(data, lower),
                  fill="tonexty",
                  fillcolor='rgba(68, 68, 68, 0.3)',
                  showlegend=False,
                  line=dict(width=0),
                  name = "lower 95% CI"
+            ),
+            row=row,
+            col=col
+        )
+
+
+def build_ts_figure(
+    ts_data: pl.DataFrame,
+    series: list[str] = ["num_pickup"],
+    locations: list[int] | None = None,
+    plot_from: datetime = None,
+    fill_between: list[str] = None,
+    target: str | None = None,
+    max_points: int | None = DEFAULT_MAX_POINTS,
+    downsampling: str | None = "minmax",
+    facet: bool = False,
+    ncols: int = 2,
+    x: str = "pickup_datetime_hour"
+) -> go.Figure:
+    """
+    Figure of plot_ts. Every trace holds at most max_points points, the columns
+    are downsampled with downsampling, one of DOWNSAMPLINGS or None to plot
+    every point. With facet, every location is drawn in a subplot of its own,
+    ncols subplots per row, sharing the x axis.
+    """
+    if isinstance(series, str):
+        series = [series]
+
+    ts_data_to_plot = (
+        ts_data.filter(pl.col('pickup_location_id').is_in(locations))
+         if locations else ts_data
+    )
+
+    if plot_from:
+        ts_data_to_plot = (
+            ts_data_to_plot
+            .filter(
+                pl.col(x).gt(plot_from)
             )
         )
 
+    if not facet:
+        fig = go.Figure()
+        _add_ts_traces(fig, ts_data_to_plot, x, series, fill_between, target, max_points, downsampling)
+        return fig
+
+    by_location = ts_data_to_plot.partition_by('pickup_location_id', as_dict=True, include_key=False)
+    location_ids = sorted(key for key, in by_location)
+    ncols = min(ncols, max(len(location_ids), 1))
+    nrows = max(math.ceil(len(location_ids) / ncols), 1)
+    fig = make_subplots(
+        rows=nrows,
+        cols=ncols,
+        shared_xaxes=True,
+        subplot_titles=[f"Location {location}" for location in location_ids]
+    )
+    for i, location in enumerate(location_ids):
+        _add_ts_traces(
+            fig,
+            by_location[(location,)],
+            x,
+            series,
+            fill_between,
+            target,
+            max_points,
+            downsampling,
+            row=i // ncols + 1,
+            col=i % ncols + 1,
+            showlegend=i == 0
+        )
+    fig.update_layout(height=250 * nrows)
+    return fig
+
+
+def plot_ts(
+    ts_data: pl.DataFrame, 
+    series:list[str] = ["num_pickup"], 
+    locations: list[int] | None = None, 
+    plot_from:datetime = None, 
+    fill_between:list[str] = None,
+    target: str | None = None,
+    max_points: int | None = DEFAULT_MAX_POINTS,
+    downsampling: str | None = "minmax",
+    facet: bool = False
+    ):
+    """
+    Plot time-series data, at most max_points points per trace, see build_ts_figure
+    """
+    build_ts_figure(
+        ts_data,
+        series,
+        locations,
+        plot_from,
+        fill_between,
+        target,
+        max_points,
+        downsampling,
+        facet
+    ).show()
+
+
+def build_locations_figure(
+    repo: NYCTaxiRepository,
+    from_date: datetime,
+    to_date: datetime,
+    locations: list[int] | None = None,
+    granularity: str = "1h",
+    aggregate: str = "sum",
+    max_points: int | None = DEFAULT_MAX_POINTS,
+    downsampling: str | None = "minmax",
+    ncols: int = 2
+) -> go.Figure:
+    """
+    Figure of plot_locations. The series are read with one aggregated query of
+    the repository at the given granularity, instead of loading the hourly
+    table and filtering it, then downsampled to max_points points per location.
+    """
+    data = repo.fetch_aggregated_pickup_data(
+        from_date=from_date,
+        to_date=to_date,
+        granularity=granularity,
+        aggregate=aggregate,
+        pickup_locations=locations
+    )
+    return build_ts_figure(
+        data,
+        max_points=max_points,
+        downsampling=downsampling,
+        facet=True,
+        ncols=ncols,
+        x="pickup_datetime"
+    )
+
 
-    fig.show()
+def plot_locations(
+    repo: NYCTaxiRepository,
+    from_date: datetime,
+    to_date: datetime,
+    locations: list[int] | None = None,
+    granularity: str = "1h",
+    aggregate: str = "sum",
+    max_points: int | None = DEFAULT_MAX_POINTS,
+    downsampling: str | None = "minmax",
+    ncols: int = 2
+):
+    """
+    Plot the pickups of every location in a subplot of its own, see build_locations_figure
+    """
+    build_locations_figure(
+        repo,
+        from_date,
+        to_date,
+        locations,
+        granularity,
+        aggregate,
+        max_points,
+        downsampling,
+        ncols
+    ).show()
 
 # def plot_relation_between_target_and_covariates(
 #         data: pl.DataFrame,
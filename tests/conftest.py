@@ -0,0 +1,59 @@
+import numpy as np
+import polars as pl
+import pytest
+from datetime import datetime
+from typing import Callable
+from src.adapters.local_repo import LocalRepository
+from src.etl.models import NYCPickupHourlySchema
+from src.etl.transform import add_surrogate_key
+
+
+def hourly_pickups(
+    from_date: datetime,
+    to_date: datetime,
+    locations: list[int] = [10, 40],
+    profile: Callable[[pl.Series], np.ndarray] | None = None,
+    seed: int = 25
+) -> pl.DataFrame:
+    """Poisson pickups of every hour of [from_date, to_date) by location, the mean
+    is the location id, times profile(hours) when given.
+    """
+    rng = np.random.default_rng(seed)
+    hours = pl.datetime_range(from_date, to_date, "1h", eager=True, closed="left")
+    scale = 1 if profile is None else profile(hours)
+    data = pl.concat([
+        pl.DataFrame({
+            "pickup_datetime_hour": hours,
+            "pickup_location_id": [location] * len(hours),
+            "num_pickup": rng.poisson(location * scale, len(hours)),
+        })
+        for location in locations
+    ])
+    return NYCPickupHourlySchema.enforce_schema(add_surrogate_key(data))
+
+
+@pytest.fixture
+def make_pickup_repo(tmp_path):
+    """Builds a repository under tmp_path/name holding the hourly_pickups of the
+    arguments, without the rows matching exclude.
+    """
+    def make(
+        from_date: datetime,
+        to_date: datetime,
+        locations: list[int] = [10, 40],
+        profile: Callable[[pl.Series], np.ndarray] | None = None,
+        seed: int = 25,
+        exclude: pl.Expr | None = None,
+        name: str = "repo",
+        repo_class: type = LocalRepository
+    ):
+        pickups = hourly_pickups(from_date, to_date, locations, profile, seed)
+        if exclude is not None:
+            pickups = pickups.filter(~exclude)
+        path = tmp_path / name
+        path.mkdir(exist_ok=True)
+        repo = repo_class(str(path))
+        repo.create_tables()
+        repo.upsert_pickup_data(pickups)
+        return repo
+    return make
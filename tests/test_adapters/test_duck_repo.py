@@ -6,9 +6,10 @@ all repos should pass the same set of test for the public API.
 import polars as pl
 from polars.testing import assert_frame_equal
 import pytest
-from datetime import datetime
+from datetime import date, datetime
 from src.adapters.duck_repo import DuckDBRepository
-from src.etl.models import NYCPickupHourlySchema
+from src.etl.models import NYCPickupHourlySchema, NYCPickupAggregatedSchema, NYCPickupTripSchema, NYCPickupFeatureSchema, NYCPickupPredictionSchema, NYCPickupMetricSchema
+from src.etl.transform import add_surrogate_key
 
 @pytest.fixture
 def temp_repo_path(tmp_path):
@@ -122,3 +123,167 @@ def test_fetch_pickup_data_invalid_date_range(test_repo):
             to_date=datetime(2023, 1, 1)
         )
     
+
+
+def test_fetch_aggregated_pickup_data(test_repo):
+    test_data = {
+        "key": ["A", "B", "C", "D", "E"],
+        "pickup_datetime_hour": [
+            datetime(2023, 1, 1, 10, 0, 0),
+            datetime(2023, 1, 1, 11, 0, 0),
+            datetime(2023, 1, 1, 10, 0, 0),
+            datetime(2023, 1, 2, 10, 0, 0),
+            datetime(2023, 1, 2, 11, 0, 0)
+        ],
+        "num_pickup": [10, 20, 5, 30, 40],
+        "pickup_location_id": [1, 1, 2, 1, 1]
+    }
+    test_repo.upsert_pickup_data(NYCPickupHourlySchema.enforce_schema(pl.DataFrame(test_data)))
+    
+    # Test 1: daily sum by location
+    expected_df = NYCPickupAggregatedSchema.enforce_schema(pl.DataFrame({
+        "pickup_datetime": [datetime(2023, 1, 1), datetime(2023, 1, 2), datetime(2023, 1, 1)],
+        "pickup_location_id": [1, 1, 2],
+        "num_pickup": [30, 70, 5]
+    }))
+    result_df = test_repo.fetch_aggregated_pickup_data(
+        from_date=datetime(2023, 1, 1),
+        to_date=datetime(2023, 1, 3),
+        granularity="1d",
+        aggregate="sum"
+    )
+    assert_frame_equal(result_df, expected_df)
+    
+    # Test 2: daily max of the hourly pickups summed across locations
+    expected_df = NYCPickupAggregatedSchema.enforce_schema(pl.DataFrame({
+        "pickup_datetime": [datetime(2023, 1, 1), datetime(2023, 1, 2)],
+        "num_pickup": [20, 40]
+    }))
+    result_df = test_repo.fetch_aggregated_pickup_data(
+        from_date=datetime(2023, 1, 1),
+        to_date=datetime(2023, 1, 3),
+        granularity="1d",
+        aggregate="max",
+        group_by_location=False
+    )
+    assert_frame_equal(result_df, expected_df)
+    
+    # Test 3: weekly mean for a single location
+    expected_df = NYCPickupAggregatedSchema.enforce_schema(pl.DataFrame({
+        "pickup_datetime": [datetime(2022, 12, 26), datetime(2023, 1, 2)],
+        "pickup_location_id": [1, 1],
+        "num_pickup": [15.0, 35.0]
+    }), aggregate="mean")
+    result_df = test_repo.fetch_aggregated_pickup_data(
+        from_date=datetime(2023, 1, 1),
+        to_date=datetime(2023, 1, 3),
+        granularity="1w",
+        aggregate="mean",
+        pickup_locations=[1]
+    )
+    assert_frame_equal(result_df, expected_df)
+
+
+def test_fetch_aggregated_pickup_data_invalid_granularity(test_repo):
+    with pytest.raises(ValueError):
+        test_repo.fetch_aggregated_pickup_data(
+            from_date=datetime(2023, 1, 1),
+            to_date=datetime(2023, 1, 3),
+            granularity="15m"
+        )
+
+
+def test_upsert_trip_data_replaces_month(test_repo):
+    trips = pl.DataFrame({
+        "pickup_datetime": [datetime(2023, 1, 1, 10, 5), datetime(2023, 1, 1, 10, 40), datetime(2023, 2, 1, 9, 0)],
+        "pickup_location_id": [1, 2, 1],
+        "passenger_count": [1, None, 3]
+    })
+    
+    test_repo.upsert_trip_data(trips.filter(pl.col("pickup_datetime").dt.month() == 1), 2023, 1)
+    test_repo.upsert_trip_data(trips.filter(pl.col("pickup_datetime").dt.month() == 2), 2023, 2)
+    # re-loading a month must not duplicate its trips
+    test_repo.upsert_trip_data(trips.filter(pl.col("pickup_datetime").dt.month() == 1), 2023, 1)
+    
+    assert test_repo.list_trip_months() == [date(2023, 1, 1), date(2023, 2, 1)]
+    
+    result_df = test_repo.fetch_trip_data(2023, 1)
+    expected_df = NYCPickupTripSchema.enforce_schema(trips.head(2))
+    assert_frame_equal(result_df, expected_df)
+
+
+def test_upsert_feature_data_replaces_days(test_repo):
+    assert test_repo.fetch_last_feature_date() is None
+    
+    features = pl.DataFrame({
+        "pickup_datetime": [datetime(2023, 1, 1), datetime(2023, 1, 2), datetime(2023, 1, 1)],
+        "pickup_location_id": [1, 1, 2],
+        "num_pickup": [10, 12, 3],
+        "num_pickup_lags": [[None, None], [10, None], [None, None]]
+    })
+    test_repo.upsert_feature_data(features)
+    # the second day of location 1 is recomputed
+    test_repo.upsert_feature_data(features.head(2).tail(1).with_columns(num_pickup=pl.lit(15)))
+    
+    assert test_repo.fetch_last_feature_date() == datetime(2023, 1, 2)
+    
+    result_df = test_repo.fetch_feature_data(datetime(2023, 1, 1), datetime(2023, 1, 3), pickup_locations=[1])
+    expected_df = NYCPickupFeatureSchema.enforce_schema(
+        features.head(2).with_columns(num_pickup=pl.Series([10, 15]))
+    )
+    assert_frame_equal(result_df, expected_df)
+
+
+def test_upsert_prediction_data_replaces_forecasts(test_repo):
+    predictions = pl.DataFrame({
+        "pickup_location_id": [1, 1, 1],
+        "pickup_datetime": [datetime(2023, 1, 2), datetime(2023, 1, 3), datetime(2023, 1, 2)],
+        "issued_at": [datetime(2023, 1, 2)] * 3,
+        "model_version": ["v1", "v1", "v2"],
+        "horizon": [1, 2, 1],
+        "y_pred": [10.0, 11.0, 12.0]
+    })
+    test_repo.upsert_prediction_data(predictions)
+    test_repo.upsert_prediction_data(predictions.head(1).with_columns(y_pred=pl.lit(15.0)))
+    
+    result_df = test_repo.fetch_prediction_data(datetime(2023, 1, 1), datetime(2023, 1, 4), model_version="v1")
+    expected_df = NYCPickupPredictionSchema.enforce_schema(
+        predictions.head(2).with_columns(y_pred=pl.Series([15.0, 11.0]))
+    )
+    assert_frame_equal(result_df, expected_df)
+    assert test_repo.fetch_prediction_data(datetime(2023, 1, 1), datetime(2023, 1, 4)).height == 3
+
+
+def test_update_metric_data_scores_days(test_repo):
+    hourly_data = pl.DataFrame({
+        "pickup_datetime_hour": [datetime(2023, 1, 2, 8), datetime(2023, 1, 2, 9), datetime(2023, 1, 3, 8), datetime(2023, 1, 4, 8)],
+        "pickup_location_id": [1, 1, 2, 1],
+        "num_pickup": [4, 6, 5, 7]
+    })
+    test_repo.upsert_pickup_data(NYCPickupHourlySchema.enforce_schema(add_surrogate_key(hourly_data)))
+    test_repo.upsert_prediction_data(pl.DataFrame({
+        "pickup_location_id": [1, 1, 1, 2],
+        "pickup_datetime": [datetime(2023, 1, 2), datetime(2023, 1, 2), datetime(2023, 1, 3), datetime(2023, 1, 4)],
+        "issued_at": [datetime(2023, 1, 1), datetime(2023, 1, 2), datetime(2023, 1, 1), datetime(2023, 1, 1)],
+        "model_version": ["v1"] * 4,
+        "horizon": [2, 1, 3, 4],
+        "y_pred": [12.0, 9.0, 1.0, 3.0]
+    }))
+    
+    # the forecast of 2023-01-04 is out of the scored days
+    assert test_repo.update_metric_data(datetime(2023, 1, 2), datetime(2023, 1, 4)) == 3
+    
+    result_df = test_repo.fetch_metric_data(datetime(2023, 1, 1), datetime(2023, 1, 5)).sort("horizon")
+    expected_df = NYCPickupMetricSchema.enforce_schema(pl.DataFrame({
+        "pickup_location_id": [1, 1, 1],
+        "pickup_datetime": [datetime(2023, 1, 2), datetime(2023, 1, 2), datetime(2023, 1, 3)],
+        "model_version": ["v1"] * 3,
+        "horizon": [1, 2, 3],
+        "n": [1, 1, 1],
+        # location 1 has no pickups on 2023-01-03, its forecast isn't scored
+        "n_observed": [1, 1, 0],
+        "sum_error": [-1.0, 2.0, 0.0],
+        "sum_abs_error": [1.0, 2.0, 0.0]
+    }))
+    assert_frame_equal(result_df, expected_df)
+    assert test_repo.fetch_last_metric_date() == datetime(2023, 1, 3)
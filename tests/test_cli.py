@@ -0,0 +1,90 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from src.interfaces.cli import app
+
+
+PARENT_DIR = Path(__file__).parent.parent
+# cumulative import time of the CLI module, a few times what it takes on a laptop
+STARTUP_BUDGET_S = 0.5
+HEAVY_MODULES = ["polars", "numpy", "duckdb", "sklearn", "mlforecast", "statsforecast", "dotenv"]
+
+
+def import_times(module: str) -> dict[str, float]:
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PARENT_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "self [us]" not in line:
+            _, cumulative_us, name = line.removeprefix("import time:").split("|")
+            times[name.strip()] = int(cumulative_us) / 1e6
+    return times
+
+
+def test_cli_import_is_lazy():
+    times = import_times("src.interfaces.cli")
+    assert not [module for module in HEAVY_MODULES if module in times]
+    assert times["src.interfaces.cli"] < STARTUP_BUDGET_S
+
+
+@pytest.mark.parametrize("command", [[], ["etl", "--help"], ["model", "--help"], ["model", "train-model", "--help"]])
+def test_cli_help(command):
+    result = CliRunner().invoke(app, command or ["--help"])
+    assert result.exit_code == 0
+    assert "Usage" in result.output
+
+
+@pytest.mark.parametrize("freq, max_horizon", [("1d", 7), ("1h", 24)])
+def test_train_model_horizon_defaults_to_the_frequency(freq, max_horizon, monkeypatch):
+    calls = []
+    monkeypatch.setattr("src.adapters.base.initialize_repository", lambda repo: None)
+    monkeypatch.setattr("src.model.train.train_model", lambda **kwargs: calls.append(kwargs))
+    
+    result = CliRunner().invoke(app, ["model", "train-model", "--freq", freq])
+    assert result.exit_code == 0, result.output
+    assert calls[0]["max_horizon"] == max_horizon
+    # a backtest doesn't overwrite the saved model or log its metrics unless asked to
+    assert calls[0]["model_path"] is None
+    assert calls[0]["metric_store"] is None
+
+
+def test_train_model_saves_when_asked(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr("src.adapters.base.initialize_repository", lambda repo: None)
+    monkeypatch.setattr("src.model.train.train_model", lambda **kwargs: calls.append(kwargs))
+    
+    result = CliRunner().invoke(app, ["model", "train-model", "--save", "--model-path", str(tmp_path / "model.pkl")])
+    assert result.exit_code == 0, result.output
+    assert calls[0]["model_path"] == tmp_path / "model.pkl"
+
+
+def test_serve_creates_the_repository_tables(monkeypatch):
+    created = []
+    
+    class Repository:
+        def create_tables(self):
+            created.append(True)
+    
+    class ForecastService:
+        def __init__(self, repo, **kwargs):
+            assert created
+        
+        def serve(self, *args):
+            pass
+    
+    monkeypatch.setattr("src.adapters.base.initialize_repository", lambda repo: Repository())
+    monkeypatch.setattr("src.interfaces.server.ForecastService", ForecastService)
+    monkeypatch.setattr("asyncio.run", lambda coroutine: None)
+    
+    result = CliRunner().invoke(app, ["model", "serve", "--repo", "local"])
+    assert result.exit_code == 0, result.output
+    assert created == [True]
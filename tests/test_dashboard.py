@@ -0,0 +1,151 @@
+import asyncio
+import math
+from datetime import datetime, timedelta
+from statistics import NormalDist
+
+import numpy as np
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+from src.etl.models import NYCPickupPredictionSchema
+from src.interfaces.dashboard import ARROW_CONTENT_TYPE, DashboardService
+from src.model.dashboard import DashboardStore, refresh_dashboard
+from src.model.monitoring import update_monitoring_metrics
+from tests.conftest import hourly_pickups
+
+
+def add_predictions(repo, from_date, to_date, h=3):
+    """Forecasts issued every day of [from_date, to_date), the actual plus the horizon."""
+    actuals = repo.fetch_aggregated_pickup_data(from_date, to_date + timedelta(days=h))
+    issues = pl.datetime_range(from_date, to_date, "1d", eager=True, closed="left")
+    predictions = (
+        pl.DataFrame({"issued_at": issues})
+        .join(pl.DataFrame({"horizon": list(range(1, h + 1)), "pickup_location_id": [10] * h}).vstack(
+            pl.DataFrame({"horizon": list(range(1, h + 1)), "pickup_location_id": [40] * h})
+        ), how="cross")
+        .with_columns(
+            pickup_datetime=pl.col("issued_at") + pl.duration(days=pl.col("horizon") - 1),
+            model_version=pl.lit("v1")
+        )
+        .join(actuals, on=["pickup_location_id", "pickup_datetime"], how="left")
+        .with_columns(y_pred=pl.col("num_pickup").fill_null(100) + pl.col("horizon"))
+    )
+    repo.upsert_prediction_data(NYCPickupPredictionSchema.enforce_schema(predictions))
+
+
+@pytest.fixture
+def repo(make_pickup_repo):
+    repo = make_pickup_repo(datetime(2023, 1, 1), datetime(2023, 3, 1))
+    add_predictions(repo, datetime(2023, 2, 1), datetime(2023, 3, 1))
+    update_monitoring_metrics(repo, datetime(2023, 3, 1), from_date=datetime(2023, 2, 1))
+    return repo
+
+
+def test_rows_keep_the_latest_forecast_with_its_interval(repo, tmp_path):
+    store = DashboardStore(tmp_path / "dashboard")
+    assert refresh_dashboard(repo, store.path, datetime(2023, 3, 1)) == 0
+
+    assert store.refresh(repo, datetime(2023, 3, 1), from_date=datetime(2023, 2, 1)) == 2
+    assert store.watermark == datetime(2023, 3, 1)
+    assert store.fetch_locations() == [10, 40]
+
+    rows = store.fetch_location(10)
+    assert rows['pickup_datetime'].min() == datetime(2023, 2, 1)
+    assert rows['pickup_datetime'].max() == datetime(2023, 3, 2)
+    # the day itself issued the last forecast of an observed day, one pickup too many
+    observed = rows.filter(pl.col('actual').is_not_null())
+    assert observed.height == 28
+    assert (observed['horizon'] == 1).all() and (observed['error'] == 1).all()
+    half_width = NormalDist().inv_cdf(0.975) * math.sqrt(math.pi / 2)
+    assert np.allclose(observed['forecast_hi'] - observed['forecast'], half_width)
+
+    # the days after to_date only have the forecasts issued on the last day
+    upcoming = rows.filter(pl.col('actual').is_null())
+    assert upcoming['horizon'].to_list() == [2, 3]
+    assert upcoming['error'].is_null().all()
+
+    days = store.fetch_days(datetime(2023, 2, 27))
+    assert days['locations'].to_list() == [2, 2, 2, 2]
+    assert days['abs_error'].to_list() == [2.0, 2.0, None, None]
+
+
+def test_incremental_refresh_matches_a_full_rebuild(repo, tmp_path):
+    store = DashboardStore(tmp_path / "incremental")
+    store.refresh(repo, datetime(2023, 3, 1), from_date=datetime(2023, 2, 1))
+
+    repo.upsert_pickup_data(hourly_pickups(datetime(2023, 3, 1), datetime(2023, 3, 15), seed=26))
+    add_predictions(repo, datetime(2023, 3, 1), datetime(2023, 3, 15))
+    update_monitoring_metrics(repo, datetime(2023, 3, 15))
+    store.refresh(repo, datetime(2023, 3, 15))
+    assert store.watermark == datetime(2023, 3, 15)
+
+    full = DashboardStore(tmp_path / "full")
+    full.refresh(repo, datetime(2023, 3, 15), from_date=datetime(2023, 2, 1))
+    for location in [10, 40]:
+        assert_frame_equal(store.fetch_location(location), full.fetch_location(location))
+    assert_frame_equal(store.fetch_days(), full.fetch_days())
+
+    # nothing new, the files aren't rewritten
+    written_at = store.location_path(40).stat().st_mtime_ns
+    assert store.refresh(repo, datetime(2023, 3, 15)) == 0
+    assert store.location_path(40).stat().st_mtime_ns == written_at
+
+
+def test_service_answers_json_and_arrow_with_etags(repo, tmp_path):
+    store = DashboardStore(tmp_path / "dashboard")
+    service = DashboardService(store)
+    assert service.handle("GET", "/days", {}).status.startswith("404")
+
+    store.refresh(repo, datetime(2023, 3, 1), from_date=datetime(2023, 2, 1))
+    response = service.handle("GET", "/locations/10?from=2023-02-20", {})
+    assert response.status == "200 OK"
+    assert pl.read_json(response.body).height == 11
+
+    # the page is revalidated without a body, and served from the cache otherwise
+    assert service.handle("GET", "/locations/10?from=2023-02-20", {"if-none-match": response.etag}).status == "304 Not Modified"
+    assert service.handle("GET", "/locations/10?from=2023-02-20", {}).body == response.body
+    assert (service.hits, service.misses) == (1, 1)
+
+    arrow = service.handle("GET", "/locations/10", {"accept": ARROW_CONTENT_TYPE})
+    assert arrow.content_type == ARROW_CONTENT_TYPE and arrow.etag != response.etag
+    assert_frame_equal(pl.read_ipc_stream(arrow.body), store.fetch_location(10))
+
+    # the file changed, so does the ETag
+    repo.upsert_pickup_data(hourly_pickups(datetime(2023, 3, 1), datetime(2023, 3, 2), seed=26))
+    store.refresh(repo, datetime(2023, 3, 2))
+    assert service.handle("GET", "/locations/10?from=2023-02-20", {"if-none-match": response.etag}).status == "200 OK"
+
+    assert service.handle("GET", "/locations/ten", {}).status.startswith("400")
+    assert service.handle("GET", "/days?from=yesterday", {}).status.startswith("400")
+    assert service.handle("POST", "/days", {}).status.startswith("405")
+
+
+def test_service_over_http(repo, tmp_path):
+    store = DashboardStore(tmp_path / "dashboard")
+    store.refresh(repo, datetime(2023, 3, 1), from_date=datetime(2023, 2, 1))
+    service = DashboardService(store)
+
+    async def scenario():
+        started = asyncio.Event()
+        server = asyncio.create_task(service.serve(port=0, started=started))
+        await started.wait()
+        reader, writer = await asyncio.open_connection("127.0.0.1", service.port)
+        responses = []
+        for headers in ["", "If-None-Match: {etag}\r\n"]:
+            etag = responses[0][1].get("etag", "") if responses else ""
+            writer.write(f"GET /days HTTP/1.1\r\nHost: localhost\r\n{headers.format(etag=etag)}\r\n".encode())
+            status = (await reader.readline()).decode().split(" ", 1)[1].strip()
+            response_headers = {}
+            while (line := await reader.readline()) != b"\r\n":
+                name, _, value = line.decode().partition(":")
+                response_headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(response_headers["content-length"]))
+            responses.append((status, response_headers, body))
+        writer.close()
+        server.cancel()
+        return responses
+
+    (status, headers, body), (revalidated, _, empty) = asyncio.run(scenario())
+    assert status == "200 OK" and headers["cache-control"] == "no-cache"
+    assert pl.read_json(body).height == 30
+    assert revalidated == "304 Not Modified" and empty == b""
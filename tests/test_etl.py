@@ -1,6 +1,13 @@
 import pytest 
-from datetime import date
+import numpy as np
+import polars as pl
+from polars.testing import assert_frame_equal
+from datetime import date, datetime
+from src.adapters.duck_repo import DuckDBRepository
+from src.adapters.local_repo import LocalRepository
 from src.etl.helpers import generate_list_of_months
+from src.etl.pipeline import batch_etl, reaggregate_trip_data
+from src.etl.transform import transform_raw_data
 
 def test_calculate_months_diff():
     from_date = date(2023,9,5)
@@ -21,3 +28,69 @@ def test_calculate_months_diff():
     assert result == expected
     
     
+
+
+def test_reaggregate_trip_data_at_new_granularity(tmp_path):
+    repo = LocalRepository(tmp_path)
+    repo.create_tables()
+    trips = pl.DataFrame({
+        "pickup_datetime": [datetime(2023, 1, 1, 0, 5), datetime(2023, 1, 1, 0, 10), datetime(2023, 1, 1, 0, 50)],
+        "pickup_location_id": [1, 1, 1],
+        "passenger_count": [1, 2, 1]
+    })
+    repo.upsert_trip_data(trips, 2023, 1)
+    
+    reaggregate_trip_data(repo, date(2023, 1, 1), date(2023, 2, 1), granularity="15m", max_workers=2)
+    
+    result = repo.fetch_pickup_data(datetime(2023, 1, 1), datetime(2023, 1, 1, 1), granularity="15m")
+    
+    # the timeseries is densified over every 15 minutes of the month
+    assert result["num_pickup"].to_list() == [2, 0, 0, 1]
+    assert repo.fetch_pickup_data(datetime(2023, 1, 1), datetime(2023, 2, 1), granularity="15m").height == 31 * 24 * 4
+
+
+@pytest.fixture
+def raw_file(tmp_path):
+    """Synthetic raw file mimicking the TLC schema, including trips out of the file month"""
+    rng = np.random.default_rng(7)
+    n_trips = 5_000
+    pickup_datetime = (
+        pl.datetime_range(datetime(2022, 12, 31, 20), datetime(2023, 2, 1, 3), "1m", eager=True)
+        .sample(n_trips, with_replacement=True, seed=7)
+    )
+    raw_data = pl.DataFrame({
+        "VendorID": rng.integers(1, 3, n_trips),
+        "tpep_pickup_datetime": pickup_datetime.cast(pl.Datetime("ns")),
+        "passenger_count": rng.integers(0, 6, n_trips).astype(float),
+        "PULocationID": rng.choice([4, 43, 132, 265], n_trips),
+        "DOLocationID": rng.integers(1, 266, n_trips),
+    })
+    path = tmp_path / "yellow_tripdata_2023-01.parquet"
+    raw_data.write_parquet(path)
+    return path
+
+
+@pytest.mark.parametrize("store_trips", [False, True])
+def test_duckdb_engine_matches_polars_engine(tmp_path, raw_file, store_trips):
+    repo = DuckDBRepository(str(tmp_path))
+    repo.create_tables()
+    
+    repo.ingest_raw_file(str(raw_file), 2023, 1, store_trips=store_trips)
+    
+    result_df = repo.fetch_pickup_data(datetime(2023, 1, 1), datetime(2023, 2, 1)).sort("key")
+    expected_df = transform_raw_data(pl.read_parquet(raw_file), 2023, 1).sort("key")
+    
+    assert_frame_equal(result_df, expected_df)
+    if store_trips:
+        assert repo.fetch_trip_data(2023, 1).height == expected_df["num_pickup"].sum()
+
+
+def test_batch_etl_rejects_an_unsupported_engine_before_loading(tmp_path, monkeypatch):
+    repo = LocalRepository(tmp_path)
+    repo.create_tables()
+    monkeypatch.setattr("src.etl.pipeline.fetch_raw_data", None)
+    
+    with pytest.raises(ValueError, match="Unsupported ETL engine"):
+        batch_etl(repo, date(2023, 1, 1), date(2023, 3, 1), engine="spark")
+    with pytest.raises(NotImplementedError, match="LocalRepository can't ingest raw files"):
+        batch_etl(repo, date(2023, 1, 1), date(2023, 3, 1), engine="duckdb")
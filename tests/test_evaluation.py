@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from src.model.evaluation import MetricStore, error_statistics, summarize_statistics
+from src.model.pipeline import build_model
+from src.model.train import rolling_window_forecast
+
+
+@pytest.fixture
+def backtest():
+    rng = np.random.default_rng(25)
+    n = 2 * 3 * 10
+    y = rng.poisson(20, n).astype(float)
+    y_pred = y + rng.normal(1, 3, n)
+    return pl.DataFrame({
+        "fold_id": np.repeat([1, 2], n // 2),
+        "unique_id": np.tile(np.repeat([1, 2, 3], 10), 2),
+        "cutoff": [datetime(2023, 1, 1)] * n,
+        "ds": [datetime(2023, 1, 1) + timedelta(days=int(step)) for step in np.tile(np.arange(1, 11) % 2 + 1, 6)],
+        "y": y,
+        "y_pred": y_pred,
+        "y_pred-lo-80": y_pred - 4,
+        "y_pred-hi-80": y_pred + 4,
+    })
+
+
+def test_metrics_match_the_forecasts_of_each_series(backtest):
+    metrics = summarize_statistics(error_statistics(backtest, level=80), by=['fold_id', 'unique_id', 'horizon'])
+    
+    expected = (
+        backtest
+        .with_columns(error=pl.col('y_pred') - pl.col('y'), horizon=pl.col('ds') - pl.col('cutoff'))
+        .group_by('fold_id', 'unique_id', 'horizon')
+        .agg(
+            bias=pl.col('error').mean(),
+            mae=pl.col('error').abs().mean(),
+            rmse=pl.col('error').pow(2).mean().sqrt(),
+            smape=(2 * pl.col('error').abs() / (pl.col('y').abs() + pl.col('y_pred').abs())).mean(),
+            coverage=pl.col('y').is_between(pl.col('y_pred-lo-80'), pl.col('y_pred-hi-80')).mean(),
+        )
+        .sort('fold_id', 'unique_id', 'horizon')
+    )
+    assert_frame_equal(metrics.select(expected.columns), expected, check_dtypes=False)
+
+
+def test_metrics_of_all_folds_average_the_metrics_of_each_fold(backtest):
+    statistics = error_statistics(backtest)
+    
+    by_fold = [
+        summarize_statistics(error_statistics(fold.drop('fold_id')))
+        for fold in backtest.partition_by('fold_id', maintain_order=True)
+    ]
+    assert_frame_equal(
+        summarize_statistics(statistics, by=['fold_id', 'horizon']).drop('fold_id'),
+        pl.concat(by_fold)
+    )
+    assert 'coverage' not in summarize_statistics(statistics).columns
+    with pytest.raises(ValueError):
+        summarize_statistics(statistics, metrics=['mape'])
+
+
+def test_metric_store_compares_logged_runs(backtest, tmp_path):
+    store = MetricStore(tmp_path)
+    store.log_run("v1", error_statistics(backtest), params={"regressor": "linear", "level": None})
+    store.log_run("v2", error_statistics(backtest, level=80), params={"regressor": "auto_ets", "level": 80})
+    store.log_run("v1", error_statistics(backtest.with_columns(pl.col('y_pred') + 1)), params={"regressor": "linear"})
+    
+    runs = store.fetch_runs()
+    assert runs["run_id"].to_list() == ["v2", "v1"]
+    assert runs["regressor"].to_list() == ["auto_ets", "linear"]
+    
+    comparison = store.compare_runs(by=['horizon'], metrics=['bias', 'coverage'])
+    assert comparison.height == 4
+    assert comparison.filter(pl.col('run_id') == 'v1')['coverage'].is_null().all()
+    assert (comparison.filter(pl.col('run_id') == 'v2')['coverage'] > 0).all()
+    # v1 was replaced by the run with the shifted forecasts
+    v1_bias = comparison.filter(pl.col('run_id') == 'v1')['bias']
+    v2_bias = comparison.filter(pl.col('run_id') == 'v2')['bias']
+    np.testing.assert_allclose(v1_bias.to_numpy(), v2_bias.to_numpy() + 1)
+    
+    with pytest.raises(ValueError):
+        store.fetch_statistics(["v3"])
+
+
+def test_intervals_are_only_backtested_for_statistical_models():
+    df = (
+        pl.DataFrame({"ds": pl.datetime_range(datetime(2023, 1, 1), datetime(2023, 6, 30), "1d", eager=True)})
+        .with_columns(unique_id=pl.lit(1), y=pl.int_range(pl.len()) % 7 * 10.0)
+    )
+    train, test = df.filter(pl.col('ds') < datetime(2023, 5, 1)), df.filter(pl.col('ds') >= datetime(2023, 5, 1))
+    
+    result = rolling_window_forecast(build_model(regressor='seasonal_naive').fit(train), h=7, df=test, level=80)
+    assert {'y_pred-lo-80', 'y_pred-hi-80'} <= set(result.columns)
+    
+    with pytest.raises(ValueError):
+        rolling_window_forecast(build_model().fit(train), h=7, df=test, level=80)
@@ -0,0 +1,86 @@
+import numpy as np
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+from datetime import datetime
+from src.model.features import (
+    compute_lag_features,
+    update_feature_store,
+    expand_lag_features,
+    next_step_lags,
+    fit_from_features
+)
+from src.model.pipeline import build_model, get_time_lags
+
+
+@pytest.fixture
+def pickup_repo(make_pickup_repo):
+    return make_pickup_repo(datetime(2022, 1, 1), datetime(2022, 7, 1))
+
+
+def test_incremental_update_matches_full_build(pickup_repo, make_pickup_repo):
+    with pytest.raises(ValueError):
+        update_feature_store(pickup_repo, to_date=datetime(2022, 4, 1))
+    
+    update_feature_store(pickup_repo, to_date=datetime(2022, 4, 1), from_date=datetime(2022, 1, 1))
+    # only the new days are computed, a partial day is left out
+    assert update_feature_store(pickup_repo, to_date=datetime(2022, 6, 30, 12)) == 2 * 90
+    assert pickup_repo.fetch_last_feature_date() == datetime(2022, 6, 29)
+    
+    full_repo = make_pickup_repo(datetime(2022, 1, 1), datetime(2022, 7, 1), name="full")
+    update_feature_store(full_repo, to_date=datetime(2022, 6, 30), from_date=datetime(2022, 1, 1))
+    
+    assert_frame_equal(
+        pickup_repo.fetch_feature_data(datetime(2022, 1, 1), datetime(2022, 7, 1)),
+        full_repo.fetch_feature_data(datetime(2022, 1, 1), datetime(2022, 7, 1))
+    )
+
+
+def test_expand_lag_features_matches_get_time_lags():
+    df = pl.DataFrame({
+        "pickup_datetime": pl.datetime_range(datetime(2023, 1, 1), datetime(2023, 3, 1), "1d", eager=True),
+    }).with_columns(
+        pickup_location_id=pl.lit(1),
+        num_pickup=pl.int_range(pl.len()) * 7 % 11
+    )
+    
+    result = (
+        compute_lag_features(df, max_lag=28)
+        .rename({"pickup_datetime": "ds", "pickup_location_id": "unique_id", "num_pickup": "y"})
+        .pipe(expand_lag_features, [1, 7, 14], rolling_windows=[7])
+    )
+    expected = (
+        df
+        .rename({"pickup_datetime": "ds", "pickup_location_id": "unique_id", "num_pickup": "y"})
+        .pipe(get_time_lags, [1, 7, 14], drop_nulls=False)
+        .with_columns(y__7__rolling_mean=pl.mean_horizontal([pl.col("y").shift(i) for i in range(1, 8)]))
+        .drop_nulls()
+    )
+    
+    assert_frame_equal(result.select(expected.columns), expected, check_dtypes=False)
+    
+    with pytest.raises(ValueError):
+        compute_lag_features(df, max_lag=7).pipe(expand_lag_features, [14])
+
+
+def test_next_step_lags():
+    df = pl.DataFrame({
+        "num_pickup": [5],
+        "num_pickup_lags": [[4, 3, 2]]
+    })
+    assert next_step_lags(df)["num_pickup_lags"].to_list() == [[5, 4, 3]]
+
+
+def test_fit_from_features_matches_fit():
+    rng = np.random.default_rng(25)
+    ds = pl.datetime_range(datetime(2022, 1, 1), datetime(2022, 12, 31), "1d", eager=True)
+    df = pl.concat([
+        pl.DataFrame({"unique_id": [location] * len(ds), "ds": ds, "y": rng.poisson(location, len(ds))})
+        for location in [10, 40]
+    ])
+    features = compute_lag_features(df, max_lag=28, target='y', ts_column='ds', unique_id='unique_id')
+    
+    expected = build_model().fit(df).predict(7)
+    result = fit_from_features(build_model(), features).predict(7)
+    
+    assert_frame_equal(result, expected, check_dtypes=False, rel_tol=1e-4)
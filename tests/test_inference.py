@@ -0,0 +1,197 @@
+import os
+import numpy as np
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+from datetime import datetime, timedelta
+from src.model.artifacts import save_model, load_model, clear_model_cache, export_slim_model, rebuild_model
+from src.model.features import update_feature_store
+from src.model.inference import make_prediction, batch_predict, fetch_history, forecast_reference_dates
+from src.model.pipeline import build_model, LOCATION_FEATURE
+from src.model.train import train_model
+
+
+@pytest.fixture
+def hourly_repo(make_pickup_repo):
+    return make_pickup_repo(datetime(2022, 1, 1), datetime(2023, 7, 1))
+
+
+@pytest.fixture(autouse=True)
+def empty_model_cache():
+    clear_model_cache()
+    yield
+    clear_model_cache()
+
+
+def test_load_model_is_cached_until_the_artifact_changes(tmp_path):
+    model_path = tmp_path / "model.pkl"
+    save_model(build_model(), model_path, version="v1")
+    
+    artifact = load_model(model_path)
+    assert load_model(model_path) is artifact
+    assert load_model(model_path, version="v1") is artifact
+    
+    save_model(build_model(), model_path, version="v2")
+    # make sure the mtime moves even on coarse grained file systems
+    mtime_ns = model_path.stat().st_mtime_ns
+    os.utime(model_path, ns=(mtime_ns, mtime_ns + 10**9))
+    
+    assert load_model(model_path).version == "v2"
+    with pytest.raises(ValueError):
+        load_model(model_path, version="v1")
+
+
+def test_make_prediction_matches_model_predict(hourly_repo, tmp_path):
+    model_path = tmp_path / "model.pkl"
+    train_model(
+        repo=hourly_repo,
+        train_data_from=datetime(2022, 1, 1),
+        train_data_to=datetime(2023, 7, 1),
+        test_data_from=datetime(2023, 1, 1),
+        pickup_locations=[10, 40],
+        max_horizon=7,
+        cross_validation_split_frequency="3mo",
+        model_path=model_path,
+        model_version="test"
+    )
+    
+    predictions = make_prediction(
+        hourly_repo,
+        reference_date=datetime(2023, 6, 30),
+        pickup_locations=[10, 40],
+        h=7,
+        model_path=model_path,
+        model_version="test"
+    )
+    
+    artifact = load_model(model_path)
+    # coefficients are memory mapped from the artifact
+    assert isinstance(artifact.model.models_['y_pred'].coef_, np.memmap)
+    
+    history = (
+        hourly_repo.fetch_aggregated_pickup_data(datetime(2022, 1, 1), datetime(2023, 7, 1), pickup_locations=[10, 40])
+        .select(
+            pl.col('pickup_location_id').alias('unique_id'),
+            pl.col('pickup_datetime').alias('ds'),
+            pl.col('num_pickup').alias('y')
+        )
+    )
+    expected = artifact.model.predict(h=7, new_df=history)
+    
+    assert predictions['ds'].min() == datetime(2023, 7, 1)
+    assert_frame_equal(predictions, expected)
+
+
+@pytest.mark.parametrize("freq, h", [("1d", 7), ("1h", 24)])
+def test_slim_model_predicts_like_the_fitted_model(freq, h, tmp_path):
+    rng = np.random.default_rng(25)
+    ds = pl.datetime_range(datetime(2023, 1, 1), datetime(2023, 6, 30), freq, eager=True)
+    # series of different lengths
+    df = pl.concat([
+        pl.DataFrame({"unique_id": location, "ds": ds[location:], "y": rng.poisson(location, len(ds) - location)})
+        for location in [10, 40, 100]
+    ]).with_columns(pl.col("unique_id").alias(LOCATION_FEATURE))
+    fit_kwargs = {"max_horizon": h} if freq == "1h" else {}
+    model = build_model(global_model=True, freq=freq).fit(df, static_features=[LOCATION_FEATURE], **fit_kwargs)
+    
+    rebuilt = rebuild_model(export_slim_model(model))
+    assert_frame_equal(rebuilt.predict(h), model.predict(h))
+    
+    full_path, slim_path = tmp_path / "full.pkl", tmp_path / "slim.pkl"
+    save_model(model, full_path, freq=freq, global_model=True)
+    save_model(model, slim_path, freq=freq, global_model=True, slim=True)
+    
+    assert slim_path.stat().st_size < full_path.stat().st_size
+    assert_frame_equal(load_model(slim_path).model.predict(h), model.predict(h))
+
+
+def test_batch_predict_matches_make_prediction(hourly_repo, tmp_path):
+    model_path = tmp_path / "model.pkl"
+    history = (
+        hourly_repo.fetch_aggregated_pickup_data(datetime(2022, 1, 1), datetime(2023, 1, 1), pickup_locations=[10, 40])
+        .select(
+            pl.col('pickup_location_id').alias('unique_id'),
+            pl.col('pickup_datetime').alias('ds'),
+            pl.col('num_pickup').alias('y')
+        )
+    )
+    save_model(build_model().fit(history), model_path, version="v1")
+    reference_dates = [datetime(2023, 3, 1), datetime(2023, 3, 2), datetime(2023, 6, 30)]
+    
+    predictions = batch_predict(hourly_repo, reference_dates, pickup_locations=[10, 40], h=7, model_path=model_path)
+    # re-running the batch replaces its forecasts
+    batch_predict(hourly_repo, reference_dates, pickup_locations=[10, 40], h=7, model_path=model_path)
+    
+    stored = hourly_repo.fetch_prediction_data(datetime(2023, 1, 1), datetime(2024, 1, 1), model_version="v1")
+    assert stored.height == len(reference_dates) * 2 * 7
+    assert_frame_equal(stored, predictions.sort(['pickup_location_id', 'issued_at', 'pickup_datetime']))
+    
+    for reference_date in reference_dates:
+        expected = make_prediction(hourly_repo, reference_date, pickup_locations=[10, 40], h=7, model_path=model_path)
+        result = (
+            stored
+            .filter(pl.col('issued_at') == reference_date + timedelta(days=1))
+            .sort(['pickup_location_id', 'pickup_datetime'])
+        )
+        assert result['horizon'].to_list() == list(range(1, 8)) * 2
+        np.testing.assert_allclose(result['y_pred'].to_numpy(), expected['y_pred'].to_numpy(), rtol=1e-5)
+
+
+def test_forecast_reference_dates_by_chunks_of_locations(hourly_repo, tmp_path):
+    history = (
+        hourly_repo.fetch_aggregated_pickup_data(datetime(2022, 1, 1), datetime(2023, 7, 1), pickup_locations=[10, 40])
+        .select(
+            pl.col('pickup_location_id').alias('unique_id'),
+            pl.col('pickup_datetime').alias('ds'),
+            pl.col('num_pickup').alias('y')
+        )
+    )
+    artifact = save_model(build_model().fit(history.filter(pl.col('ds') < datetime(2023, 1, 1))), tmp_path / "model.pkl", version="v1")
+    reference_dates = [datetime(2023, 3, 1), datetime(2023, 3, 2)]
+    
+    expected = batch_predict(hourly_repo, reference_dates, pickup_locations=[10, 40], h=7, model_path=tmp_path / "model.pkl")
+    # each chunk only sees its own locations, history after the last reference date is left out
+    result = pl.concat([
+        forecast_reference_dates(artifact, history.filter(pl.col('unique_id') == location), reference_dates, h=7)
+        for location in [10, 40]
+    ])
+    assert_frame_equal(
+        result.sort(['pickup_location_id', 'issued_at', 'pickup_datetime']),
+        expected.sort(['pickup_location_id', 'issued_at', 'pickup_datetime']),
+        check_dtypes=False
+    )
+
+
+def test_inference_reads_the_feature_store_when_it_covers_the_history(hourly_repo, tmp_path, monkeypatch):
+    model_path = tmp_path / "model.pkl"
+    history = fetch_history(hourly_repo, datetime(2022, 1, 1), datetime(2023, 1, 1), [10, 40])
+    save_model(build_model().fit(history), model_path, version="v1")
+    reference_dates = [datetime(2023, 3, 1), datetime(2023, 6, 30)]
+    expected = batch_predict(hourly_repo, reference_dates, pickup_locations=[10, 40], h=7, model_path=model_path)
+    
+    # a stale store isn't read
+    update_feature_store(hourly_repo, datetime(2023, 6, 1), from_date=datetime(2023, 1, 1))
+    stale = fetch_history(hourly_repo, datetime(2023, 6, 1), datetime(2023, 7, 1), [10, 40])
+    assert stale['ds'].max() == datetime(2023, 6, 30)
+    
+    update_feature_store(hourly_repo, datetime(2023, 7, 1))
+    fetch_aggregated_pickup_data = hourly_repo.fetch_aggregated_pickup_data
+    monkeypatch.setattr(hourly_repo, 'fetch_aggregated_pickup_data', None)
+    assert_frame_equal(fetch_history(hourly_repo, datetime(2023, 6, 1), datetime(2023, 7, 1), [10, 40]), stale, check_dtypes=False)
+    assert_frame_equal(
+        batch_predict(hourly_repo, reference_dates, pickup_locations=[10, 40], h=7, model_path=model_path),
+        expected
+    )
+    
+    # the store doesn't reach back to the start of the history
+    monkeypatch.setattr(hourly_repo, 'fetch_aggregated_pickup_data', fetch_aggregated_pickup_data)
+    assert fetch_history(hourly_repo, datetime(2022, 12, 1), datetime(2023, 7, 1), [10, 40])['ds'].min() == datetime(2022, 12, 1)
+
+
+def test_hourly_forecasts_default_to_a_day_ahead(hourly_repo, tmp_path):
+    history = fetch_history(hourly_repo, datetime(2023, 5, 1), datetime(2023, 6, 1), [10, 40], freq="1h")
+    save_model(build_model(freq="1h").fit(history, max_horizon=24), tmp_path / "model.pkl", freq="1h", version="v1")
+    
+    predictions = batch_predict(hourly_repo, [datetime(2023, 6, 30)], pickup_locations=[10, 40], model_path=tmp_path / "model.pkl")
+    assert predictions['horizon'].to_list() == list(range(1, 25)) * 2
+    assert make_prediction(hourly_repo, datetime(2023, 6, 30), [10, 40], model_path=tmp_path / "model.pkl").height == 2 * 24
@@ -1,6 +1,9 @@
+import numpy as np
 import polars as pl
+from polars.testing import assert_frame_equal
 import pytest
-from src.model.pipeline import get_time_lags
+from datetime import datetime, timedelta
+from src.model.pipeline import get_time_lags, MeanLagPredictor
 
 def test_get_time_lags_get_correct_lag_value():
     # Create sample data
@@ -63,3 +66,112 @@ def test_get_time_lags_dimensions(data_size, unique_ids, n_lags):
     assert all(col in result_df.columns for col in lag_columns)
 
 
+
+
+def _recursive_forecast(model: MeanLagPredictor, X: pl.DataFrame, h: int) -> pl.DataFrame:
+    """Reference implementation, calls predict over the full history on every step.
+    Each predict call drops the first max(lags) rows, hence the long history in the test.
+    """
+    for _ in range(h):
+        X = (
+            X
+            .pipe(model.predict)
+            .with_columns(pl.coalesce(['y', 'y_hat']).alias('y'))
+            .select(['ds', 'unique_id', 'y'])
+        )
+    return X
+
+
+@pytest.mark.parametrize("lags, h", [([1, 7, 14, 28], 7), ([1, 2], 5), ([3], 10)])
+def test_forecast_matches_recursive_predict(lags, h):
+    rng = np.random.default_rng(25)
+    n_days = 300
+    df = pl.DataFrame({
+        'ds': pl.datetime_range(datetime(2023, 1, 1), datetime(2023, 1, 1) + timedelta(days=n_days - 1), '1d', eager=True).to_list() * 3,
+        'unique_id': [id_ for id_ in [1, 2, 3] for _ in range(n_days)],
+        'y': rng.poisson(100, n_days * 3)
+    })
+    model = MeanLagPredictor(lags=lags, freq='1d')
+    
+    result = model.forecast(df, h)
+    expected = _recursive_forecast(model, df, h)
+    
+    last_ds = df['ds'].max()
+    assert result.height == df.height + 3 * h
+    assert result.filter(~pl.col('IsForecasted'))['y'].to_list() == df.sort(['unique_id', 'ds'])['y'].to_list()
+    assert_frame_equal(
+        result.filter(pl.col('IsForecasted')).drop('IsForecasted'),
+        expected.filter(pl.col('ds') > last_ds).sort(['unique_id', 'ds']),
+        check_exact=True
+    )
+
+
+@pytest.fixture
+def fitted_model_and_data():
+    rng = np.random.default_rng(25)
+    n_days = 200
+    df = pl.DataFrame({
+        'ds': pl.datetime_range(datetime(2023, 1, 1), datetime(2023, 1, 1) + timedelta(days=n_days - 1), '1d', eager=True).to_list() * 2,
+        'unique_id': [id_ for id_ in [1, 2] for _ in range(n_days)],
+        'y': np.concatenate([rng.poisson(100, n_days), rng.poisson(1000, n_days)])
+    })
+    model = MeanLagPredictor(lags=[1, 7], freq='1d').fit(df)
+    return model, df
+
+
+def test_fit_keeps_residuals_per_series(fitted_model_and_data):
+    model, df = fitted_model_and_data
+    
+    expected = (
+        model.predict(df)
+        .filter(pl.col('y').is_not_null() & (pl.col('unique_id') == 2))
+        .select(pl.col('y') - pl.col('y_hat'))
+        .to_series()
+        .to_numpy()
+    )
+    
+    assert model.residuals.shape == (2, 200 - 8)
+    assert model.residual_ids.to_list() == [1, 2]
+    np.testing.assert_allclose(model.residuals[1], expected, rtol=1e-6)
+
+
+@pytest.mark.parametrize("method", ["quantile", "conformal"])
+def test_forecast_intervals(fitted_model_and_data, method):
+    model, df = fitted_model_and_data
+    
+    result = model.forecast(df, h=4, levels=[80, 95], method=method)
+    forecast = result.filter(pl.col('IsForecasted'))
+    
+    assert {'y_hat_lo_80', 'y_hat_hi_80', 'y_hat_lo_95', 'y_hat_hi_95'} <= set(result.columns)
+    assert result.filter(~pl.col('IsForecasted'))['y_hat_lo_95'].is_null().all()
+    assert (forecast['y_hat_lo_95'] <= forecast['y_hat_lo_80']).all()
+    assert (forecast['y_hat_lo_80'] <= forecast['y']).all()
+    assert (forecast['y'] <= forecast['y_hat_hi_80']).all()
+    assert (forecast['y_hat_hi_80'] <= forecast['y_hat_hi_95']).all()
+    
+    # intervals widen with the horizon and are wider for the noisier series
+    width = forecast.select('unique_id', (pl.col('y_hat_hi_95') - pl.col('y_hat_lo_95')).alias('width'))
+    for unique_id in [1, 2]:
+        series_width = width.filter(pl.col('unique_id') == unique_id)['width'].to_numpy()
+        np.testing.assert_allclose(series_width, series_width[0] * np.sqrt(np.arange(1, 5)), rtol=1e-6)
+    assert width.filter(pl.col('unique_id') == 2)['width'].min() > width.filter(pl.col('unique_id') == 1)['width'].max()
+
+
+def test_predict_quantile_intervals(fitted_model_and_data):
+    model, df = fitted_model_and_data
+    
+    result = model.predict(df, levels=[90]).filter(pl.col('unique_id') == 1)
+    residuals = model.residuals[0]
+    
+    np.testing.assert_allclose(
+        (result['y_hat_lo_90'] - result['y_hat']).to_numpy(),
+        np.quantile(residuals, 0.05),
+        rtol=1e-5
+    )
+
+
+def test_intervals_require_fit():
+    model = MeanLagPredictor(lags=[1], freq='1d')
+    df = pl.DataFrame({'ds': [datetime(2023, 1, 1), datetime(2023, 1, 2)], 'unique_id': [1, 1], 'y': [1, 2]})
+    with pytest.raises(ValueError):
+        model.forecast(df, h=1, levels=[90])
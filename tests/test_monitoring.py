@@ -0,0 +1,100 @@
+import numpy as np
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+from datetime import datetime, timedelta
+from src.adapters.duck_repo import DuckDBRepository
+from src.adapters.local_repo import LocalRepository
+from src.etl.models import NYCPickupHourlySchema
+from src.etl.transform import add_surrogate_key
+from src.model.monitoring import update_monitoring_metrics, fetch_rolling_metrics
+
+
+@pytest.fixture(params=[DuckDBRepository, LocalRepository])
+def repo(request, make_pickup_repo):
+    rng = np.random.default_rng(25)
+    days = pl.datetime_range(datetime(2023, 1, 2), datetime(2023, 2, 1), "1d", eager=True, closed="left")
+    predictions = pl.concat([
+        pl.DataFrame({
+            "pickup_location_id": location,
+            "pickup_datetime": days,
+            "issued_at": days - timedelta(days=horizon - 1),
+            "model_version": "v1",
+            "horizon": horizon,
+            "y_pred": rng.normal(location * 24, 10, len(days)),
+        })
+        for location in [10, 40]
+        for horizon in [1, 2]
+    ])
+    
+    repo = make_pickup_repo(datetime(2023, 1, 1), datetime(2023, 2, 1), repo_class=request.param)
+    repo.upsert_prediction_data(predictions)
+    return repo
+
+
+def test_incremental_monitoring_matches_a_full_run(repo):
+    with pytest.raises(ValueError):
+        update_monitoring_metrics(repo, datetime(2023, 1, 10))
+    
+    assert update_monitoring_metrics(repo, datetime(2023, 1, 10), from_date=datetime(2023, 1, 1)) == 8 * 2 * 2
+    # only the days closed since the last run are scored
+    assert update_monitoring_metrics(repo, datetime(2023, 1, 20, 15)) == 10 * 2 * 2
+    assert update_monitoring_metrics(repo, datetime(2023, 1, 20)) == 0
+    incremental = repo.fetch_metric_data(datetime(2023, 1, 1), datetime(2023, 2, 1))
+    
+    repo.update_metric_data(datetime(2023, 1, 1), datetime(2023, 1, 20))
+    assert_frame_equal(repo.fetch_metric_data(datetime(2023, 1, 1), datetime(2023, 2, 1)), incremental)
+    
+    # the rolling metrics only read the window
+    rolling = fetch_rolling_metrics(repo, datetime(2023, 1, 20), window_days=7, pickup_locations=[40])
+    predictions = repo.fetch_prediction_data(datetime(2023, 1, 13), datetime(2023, 1, 20), pickup_locations=[40])
+    actuals = repo.fetch_aggregated_pickup_data(datetime(2023, 1, 13), datetime(2023, 1, 20), pickup_locations=[40])
+    expected = (
+        predictions
+        .join(actuals, on=["pickup_location_id", "pickup_datetime"])
+        .group_by("horizon")
+        .agg(
+            (pl.col("y_pred") - pl.col("num_pickup")).abs().mean().alias("mae"),
+            (pl.col("y_pred") - pl.col("num_pickup")).mean().alias("bias")
+        )
+        .sort("horizon")
+    )
+    assert rolling["n"].to_list() == [7, 7]
+    assert rolling["n_observed"].to_list() == [7, 7]
+    np.testing.assert_allclose(rolling.sort("horizon")["mae"], expected["mae"])
+    np.testing.assert_allclose(rolling.sort("horizon")["bias"], expected["bias"])
+
+
+@pytest.mark.parametrize("repo_class", [DuckDBRepository, LocalRepository])
+def test_days_are_scored_once_their_actuals_are_loaded(repo_class, tmp_path):
+    repo = repo_class(str(tmp_path))
+    repo.create_tables()
+    hours = pl.datetime_range(datetime(2023, 1, 1), datetime(2023, 1, 4), "1h", eager=True, closed="left")
+    hourly_data = pl.DataFrame({"pickup_datetime_hour": hours, "pickup_location_id": 10, "num_pickup": 1})
+    days = pl.datetime_range(datetime(2023, 1, 2), datetime(2023, 1, 6), "1d", eager=True, closed="left")
+    repo.upsert_prediction_data(pl.DataFrame({
+        "pickup_location_id": 10,
+        "pickup_datetime": days,
+        "issued_at": datetime(2023, 1, 1),
+        "model_version": "v1",
+        "horizon": [1, 2, 3, 4],
+        "y_pred": 30.0,
+    }))
+    repo.upsert_pickup_data(NYCPickupHourlySchema.enforce_schema(add_surrogate_key(
+        hourly_data.filter(pl.col("pickup_datetime_hour") < datetime(2023, 1, 3))
+    )))
+    
+    # the pickups of 2023-01-03 aren't loaded yet, scoring stops before them
+    assert update_monitoring_metrics(repo, datetime(2023, 1, 6), from_date=datetime(2023, 1, 2)) == 1
+    assert repo.fetch_last_metric_date() == datetime(2023, 1, 2)
+    
+    repo.upsert_pickup_data(NYCPickupHourlySchema.enforce_schema(add_surrogate_key(
+        hourly_data.filter(pl.col("pickup_datetime_hour") >= datetime(2023, 1, 3))
+    )))
+    assert update_monitoring_metrics(repo, datetime(2023, 1, 6)) == 1
+    
+    metrics = repo.fetch_metric_data(datetime(2023, 1, 1), datetime(2023, 1, 6))
+    assert metrics["pickup_datetime"].to_list() == [datetime(2023, 1, 2), datetime(2023, 1, 3)]
+    assert metrics["n_observed"].to_list() == [1, 1]
+    assert metrics["sum_error"].to_list() == [6.0, 6.0]
+    assert fetch_rolling_metrics(repo, datetime(2023, 1, 6))["mae"].to_list() == [6.0, 6.0]
@@ -0,0 +1,79 @@
+import numpy as np
+import polars as pl
+import pytest
+from datetime import datetime
+from src.adapters.local_repo import LocalRepository
+from src.etl.models import NYCPickupHourlySchema
+from src.etl.transform import add_surrogate_key
+from src.plots import build_locations_figure, build_ts_figure, downsample
+
+
+@pytest.fixture
+def hourly_data():
+    rng = np.random.default_rng(25)
+    hours = pl.datetime_range(datetime(2022, 1, 1), datetime(2023, 1, 1), "1h", eager=True, closed="left")
+    return pl.concat([
+        pl.DataFrame({
+            "pickup_datetime_hour": hours,
+            "pickup_location_id": [location] * len(hours),
+            "num_pickup": rng.poisson(location, len(hours)),
+        })
+        for location in [10, 40]
+    ])
+
+
+@pytest.mark.parametrize("method", ["minmax", "lttb"])
+def test_downsample_keeps_the_budget_and_the_peaks(hourly_data, method):
+    # a single spike in a series of location 10
+    data = hourly_data.with_columns(
+        pl.when((pl.col('pickup_location_id') == 10) & (pl.col('pickup_datetime_hour') == datetime(2022, 6, 1, 12)))
+        .then(1000)
+        .otherwise(pl.col('num_pickup'))
+        .alias('num_pickup')
+    )
+    result = downsample(data, 'pickup_datetime_hour', 'num_pickup', 500, method, by=['pickup_location_id'])
+
+    assert result.group_by('pickup_location_id').len()['len'].max() <= 500
+    assert result.filter(pl.col('num_pickup') == 1000).height == 1
+    for _, location in result.group_by('pickup_location_id'):
+        assert location['pickup_datetime_hour'].is_sorted()
+        assert location['pickup_datetime_hour'].min() == datetime(2022, 1, 1)
+    if method == "minmax":
+        expected = data.group_by('pickup_location_id').agg(pl.col('num_pickup').min().alias('min'), pl.col('num_pickup').max().alias('max'))
+        kept = result.group_by('pickup_location_id').agg(pl.col('num_pickup').min().alias('min'), pl.col('num_pickup').max().alias('max'))
+        assert kept.sort('pickup_location_id').equals(expected.sort('pickup_location_id'))
+    else:
+        assert result.group_by('pickup_location_id').len()['len'].to_list() == [500, 500]
+        assert result['pickup_datetime_hour'].max() == datetime(2022, 12, 31, 23)
+
+
+def test_downsample_keeps_short_series_whole(hourly_data):
+    short = hourly_data.filter(pl.col('pickup_datetime_hour') < datetime(2022, 1, 2))
+    for method in ["minmax", "lttb", None]:
+        assert downsample(short, 'pickup_datetime_hour', 'num_pickup', 500, method, by=['pickup_location_id']).height == short.height
+    with pytest.raises(ValueError, match="Unsupported downsampling"):
+        downsample(short, 'pickup_datetime_hour', 'num_pickup', 500, "mean")
+
+
+def test_faceted_figure_has_a_subplot_per_location(hourly_data):
+    fig = build_ts_figure(hourly_data, max_points=1000, facet=True)
+    assert len(fig.data) == 2
+    assert all(900 < len(trace.x) <= 1000 for trace in fig.data)
+    assert {trace.xaxis for trace in fig.data} == {"x", "x2"}
+
+    assert [len(trace.x) for trace in build_ts_figure(hourly_data, downsampling=None).data] == [hourly_data.height]
+
+
+def test_locations_figure_reads_one_aggregated_query(hourly_data, tmp_path, monkeypatch):
+    repo = LocalRepository(tmp_path)
+    repo.create_tables()
+    repo.upsert_pickup_data(NYCPickupHourlySchema.enforce_schema(add_surrogate_key(hourly_data)))
+
+    calls = []
+    fetch_aggregated_pickup_data = repo.fetch_aggregated_pickup_data
+    monkeypatch.setattr(repo, 'fetch_aggregated_pickup_data', lambda **kwargs: calls.append(kwargs) or fetch_aggregated_pickup_data(**kwargs))
+    monkeypatch.setattr(repo, 'fetch_pickup_data', None)
+
+    fig = build_locations_figure(repo, datetime(2022, 1, 1), datetime(2023, 1, 1), [10, 40], granularity="1d", max_points=100)
+    assert len(calls) == 1
+    assert all(90 < len(trace.x) <= 100 for trace in fig.data)
@@ -0,0 +1,103 @@
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+from datetime import datetime
+from src.adapters.local_repo import LocalRepository
+from src.model.features import compute_lag_features
+from src.model.replay import ReplaySimulator
+
+
+@pytest.fixture
+def source_repo(make_pickup_repo):
+    return make_pickup_repo(datetime(2023, 1, 1), datetime(2023, 5, 1), name="source")
+
+
+@pytest.fixture
+def target_repo(tmp_path):
+    repo = LocalRepository(tmp_path / "target")
+    repo.create_tables()
+    return repo
+
+
+def test_replay_issues_daily_forecasts_and_retrains_on_schedule(source_repo, target_repo):
+    simulator = ReplaySimulator(source_repo, datetime(2023, 3, 1), target=target_repo, retrain_every=7, train_days=56, h=7, flush_every=10)
+    days = simulator.run(datetime(2023, 4, 1))
+
+    assert days.height == 31
+    assert days['retrained'].sum() == 5
+    assert days.filter(pl.col('retrained'))['model_version'].to_list() == [
+        f"replay-202303{day:02d}" for day in [1, 8, 15, 22, 29]
+    ]
+
+    predictions = target_repo.fetch_prediction_data(datetime(2023, 3, 1), datetime(2023, 5, 1))
+    assert predictions.height == 31 * 2 * 7
+    # every forecast is issued at the end of its day and only forecasts the days after it
+    assert predictions.group_by('issued_at').len()['len'].to_list() == [14] * 31
+    assert (predictions['pickup_datetime'] >= predictions['issued_at']).all()
+
+    # the pickups of the replayed days were ingested and their forecasts scored
+    assert target_repo.fetch_pickup_data(datetime(2023, 3, 1), datetime(2023, 3, 31, 23))['num_pickup'].sum() == (
+        source_repo.fetch_pickup_data(datetime(2023, 3, 1), datetime(2023, 3, 31, 23))['num_pickup'].sum()
+    )
+    metrics = target_repo.fetch_metric_data(datetime(2023, 3, 1), datetime(2023, 5, 1))
+    assert metrics['pickup_datetime'].max() == datetime(2023, 3, 31)
+    assert metrics['n'].sum() == predictions.filter(pl.col('pickup_datetime') < datetime(2023, 4, 1)).height
+
+
+def test_replay_features_match_the_full_computation(source_repo, target_repo):
+    ReplaySimulator(source_repo, datetime(2023, 3, 1), target=target_repo, train_days=56, flush_every=7).run(datetime(2023, 4, 1))
+
+    expected = (
+        source_repo.fetch_aggregated_pickup_data(datetime(2023, 1, 1), datetime(2023, 4, 1))
+        .filter(pl.col('pickup_datetime') < datetime(2023, 4, 1))
+        .pipe(compute_lag_features)
+        .filter(pl.col('pickup_datetime') >= datetime(2023, 3, 1))
+    )
+    stored = target_repo.fetch_feature_data(datetime(2023, 3, 1), datetime(2023, 4, 1))
+    assert_frame_equal(stored, expected, check_dtypes=False, check_column_order=False)
+
+
+def test_replay_fills_the_days_without_pickups_with_zeros(make_pickup_repo, target_repo):
+    day = pl.col('pickup_datetime_hour').dt.truncate('1d')
+    # location 40 has no pickup on March 10, no location has any on March 20
+    source_repo = make_pickup_repo(
+        datetime(2023, 1, 1),
+        datetime(2023, 5, 1),
+        exclude=((day == datetime(2023, 3, 10)) & (pl.col('pickup_location_id') == 40)) | (day == datetime(2023, 3, 20)),
+        name="source"
+    )
+    days = ReplaySimulator(source_repo, datetime(2023, 3, 1), target=target_repo, train_days=56, flush_every=7).run(datetime(2023, 4, 1))
+    assert (days['locations'] == 2).all()
+
+    pickups = source_repo.fetch_aggregated_pickup_data(datetime(2023, 1, 1), datetime(2023, 4, 1))
+    expected = (
+        pl.DataFrame({"pickup_datetime": pl.datetime_range(datetime(2023, 1, 1), datetime(2023, 4, 1), "1d", eager=True, closed="left")})
+        .join(pickups.select('pickup_location_id').unique(), how="cross")
+        .join(pickups, on=['pickup_datetime', 'pickup_location_id'], how="left")
+        .with_columns(pl.col('num_pickup').fill_null(0))
+        .sort('pickup_location_id', 'pickup_datetime')
+        .pipe(compute_lag_features)
+        .filter(pl.col('pickup_datetime') >= datetime(2023, 3, 1))
+    )
+    stored = target_repo.fetch_feature_data(datetime(2023, 3, 1), datetime(2023, 4, 1))
+    assert stored.filter(pl.col('num_pickup') == 0).select('pickup_datetime', 'pickup_location_id').sort('pickup_datetime', 'pickup_location_id').rows() == [
+        (datetime(2023, 3, 10), 40), (datetime(2023, 3, 20), 10), (datetime(2023, 3, 20), 40)
+    ]
+    assert_frame_equal(stored, expected, check_dtypes=False, check_column_order=False)
+
+
+def test_replay_resumes_where_it_stopped(source_repo, tmp_path):
+    results = []
+    for name, stops in [("once", [datetime(2023, 4, 1)]), ("twice", [datetime(2023, 3, 13), datetime(2023, 4, 1)])]:
+        target = LocalRepository(tmp_path / name)
+        target.create_tables()
+        simulator = ReplaySimulator(source_repo, datetime(2023, 3, 1), target=target, train_days=56, score=False)
+        for stop in stops:
+            simulator.run(stop)
+        results.append(target.fetch_prediction_data(datetime(2023, 3, 1), datetime(2023, 5, 1)))
+    assert_frame_equal(results[0], results[1])
+
+
+def test_replay_rejects_a_non_positive_schedule(source_repo):
+    with pytest.raises(ValueError, match="retrain_every"):
+        ReplaySimulator(source_repo, datetime(2023, 3, 1), retrain_every=0)
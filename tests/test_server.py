@@ -0,0 +1,80 @@
+import asyncio
+import json
+import numpy as np
+import pytest
+from datetime import datetime
+from src.interfaces.server import ForecastService
+from src.model.artifacts import save_model, clear_model_cache
+from src.model.inference import make_prediction
+from src.model.pipeline import build_model
+from src.model.train import fetch_series
+
+
+@pytest.fixture
+def repo(make_pickup_repo):
+    return make_pickup_repo(datetime(2023, 1, 1), datetime(2023, 7, 1), locations=[10, 40, 100])
+
+
+@pytest.fixture
+def model_path(repo, tmp_path):
+    clear_model_cache()
+    model_path = tmp_path / "model.pkl"
+    history = fetch_series(repo, datetime(2023, 1, 1), datetime(2023, 6, 1), [10, 40, 100])
+    save_model(build_model().fit(history), model_path, version="v1")
+    yield model_path
+    clear_model_cache()
+
+
+async def get(port: int, target: str) -> tuple[int, dict | list]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def test_concurrent_requests_are_batched(repo, model_path):
+    service = ForecastService(repo, model_path, as_of=datetime(2023, 6, 15, 12), max_wait_ms=50)
+
+    async def run():
+        started = asyncio.Event()
+        server = asyncio.create_task(service.serve(port=0, started=started))
+        await started.wait()
+        responses = await asyncio.gather(
+            get(service.port, "/forecast?locations=10&h=3"),
+            get(service.port, "/forecast?locations=40,100&h=7"),
+            get(service.port, "/forecast?h=0"),
+        )
+        _, stats = await get(service.port, "/stats")
+        server.cancel()
+        return responses, stats
+
+    (one, two, invalid), stats = asyncio.run(run())
+
+    assert invalid[0] == 400
+    assert one[0] == two[0] == 200
+    assert [row["unique_id"] for row in one[1]] == [10] * 3
+    assert len(two[1]) == 14
+
+    # same forecasts as the repository based inference from the end of the previous day
+    expected = make_prediction(repo, datetime(2023, 6, 14), pickup_locations=[40, 100], h=7, model_path=model_path)
+    assert two[1][0]["ds"].startswith("2023-06-15")
+    np.testing.assert_allclose([row["y_pred"] for row in two[1]], expected["y_pred"].to_numpy())
+
+    assert stats["requests"] == 2
+    assert stats["batches"] == 1
+    assert stats["p99_ms"] >= stats["p50_ms"] > 0
+
+
+def test_refresh_history_appends_new_steps(repo, model_path):
+    service = ForecastService(repo, model_path, as_of=datetime(2023, 6, 10))
+    assert service.refresh_history() == 3 * 28
+    
+    service.as_of = datetime(2023, 6, 12, 8)
+    assert service.refresh_history() == 3 * 2
+    assert service.refresh_history() == 0
+    
+    assert service.history.height == 3 * 28
+    assert service.history['ds'].max() == datetime(2023, 6, 11)
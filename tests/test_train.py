@@ -0,0 +1,344 @@
+import json
+import os
+import numpy as np
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+from datetime import datetime
+from src.model.features import update_feature_store
+from src.model.pipeline import build_model
+from src.model.profiling import profiling
+from src.model.train import train_model, split_train_test, rolling_window_forecast, worker_thread_env, THREAD_ENV_VARS
+
+
+@pytest.fixture
+def hourly_repo(make_pickup_repo):
+    return make_pickup_repo(datetime(2022, 1, 1), datetime(2023, 7, 1))
+
+
+def test_worker_thread_env_restores_environment(monkeypatch):
+    monkeypatch.setenv("OMP_NUM_THREADS", "8")
+    monkeypatch.delenv("POLARS_MAX_THREADS", raising=False)
+    
+    with worker_thread_env(2):
+        assert all(os.environ[var] == "2" for var in THREAD_ENV_VARS)
+    
+    assert os.environ["OMP_NUM_THREADS"] == "8"
+    assert "POLARS_MAX_THREADS" not in os.environ
+
+
+def test_parallel_folds_match_serial_folds(hourly_repo):
+    train_args = dict(
+        repo=hourly_repo,
+        train_data_from=datetime(2022, 1, 1),
+        train_data_to=datetime(2023, 7, 1),
+        test_data_from=datetime(2023, 1, 1),
+        pickup_locations=[10, 40],
+        max_horizon=7,
+        cross_validation_split_frequency="2mo"
+    )
+    
+    serial_results = train_model(**train_args, n_jobs=1)
+    parallel_results = train_model(**train_args, n_jobs=2)
+    
+    assert len(parallel_results) == len(serial_results) == 3
+    for serial_fold, parallel_fold in zip(serial_results, parallel_results):
+        serial_fold = pl.DataFrame(serial_fold).sort("horizon")
+        parallel_fold = pl.DataFrame(parallel_fold).sort("horizon")
+        np.testing.assert_allclose(serial_fold["mae"].to_numpy(), parallel_fold["mae"].to_numpy())
+
+
+def _rolling_window_forecast_by_cutoff(model, h, df, cutoffs):
+    """Reference implementation, one predict over the full history per cutoff"""
+    preds = [
+        model
+        .predict(h=h, new_df=df.filter(pl.col('ds').le(cutoff)))
+        .with_columns(cutoff=pl.lit(cutoff))
+        for cutoff in cutoffs
+    ]
+    return (
+        df
+        .join(pl.concat(preds), on=['unique_id', 'ds'], how='inner')
+        .select(['unique_id', 'ds', 'cutoff', 'y', 'y_pred'])
+    )
+
+
+@pytest.fixture
+def daily_data():
+    rng = np.random.default_rng(25)
+    ds = pl.datetime_range(datetime(2022, 1, 1), datetime(2023, 12, 31), "1d", eager=True)
+    return pl.concat([
+        pl.DataFrame({
+            "unique_id": [location] * len(ds),
+            "ds": ds,
+            "y": rng.poisson(location, len(ds)),
+        })
+        for location in [10, 40, 100]
+    ])
+
+
+@pytest.mark.parametrize("h, step_size", [(7, None), (3, 1)])
+def test_batched_backtest_matches_per_cutoff_predict(daily_data, h, step_size):
+    train = daily_data.filter(pl.col('ds') < datetime(2023, 7, 1))
+    # a gap in one of the series, lags are row based
+    test = (
+        daily_data
+        .filter(pl.col('ds') >= datetime(2023, 7, 1))
+        .filter(~((pl.col('unique_id') == 40) & pl.col('ds').is_between(datetime(2023, 9, 1), datetime(2023, 9, 3))))
+    )
+    model = build_model().fit(train)
+    
+    result = rolling_window_forecast(model, h=h, df=test, step_size=step_size)
+    
+    cutoffs = result['cutoff'].unique().sort().to_list()
+    expected = _rolling_window_forecast_by_cutoff(model, h, test, cutoffs)
+    
+    assert len(cutoffs) > 10
+    assert_frame_equal(
+        result.sort(['unique_id', 'cutoff', 'ds']),
+        expected.sort(['unique_id', 'cutoff', 'ds']),
+        check_dtypes=False
+    )
+
+
+def test_split_train_test_folds_are_slices_of_the_sorted_data(daily_data):
+    df = daily_data.sort('ds', maintain_order=True)
+    
+    folds = split_train_test(df, test_from=datetime(2023, 1, 1), every='3mo')
+    
+    assert [fold.fold_id for fold in folds] == [1, 2, 3, 4]
+    for fold in folds:
+        train, test = fold.split(df)
+        assert_frame_equal(train, df.filter(pl.col('ds') < fold.test_from))
+        assert_frame_equal(
+            test,
+            df.filter(pl.col('ds').is_between(fold.test_from, fold.test_to, closed='left'))
+        )
+
+
+def test_split_train_test_requires_sorted_data(daily_data):
+    with pytest.raises(ValueError):
+        split_train_test(daily_data, test_from=datetime(2023, 1, 1), every='3mo')
+
+
+def test_feature_store_training_matches_default(hourly_repo):
+    train_args = dict(
+        repo=hourly_repo,
+        train_data_from=datetime(2022, 1, 1),
+        train_data_to=datetime(2023, 7, 1),
+        test_data_from=datetime(2023, 1, 1),
+        pickup_locations=[10, 40],
+        max_horizon=7,
+        cross_validation_split_frequency="2mo"
+    )
+    update_feature_store(hourly_repo, to_date=datetime(2023, 7, 1), from_date=datetime(2022, 1, 1))
+    
+    default_results = train_model(**train_args)
+    feature_store_results = train_model(**train_args, feature_store=True)
+    
+    for default_fold, feature_store_fold in zip(default_results, feature_store_results):
+        default_fold = pl.DataFrame(default_fold).sort("horizon")
+        feature_store_fold = pl.DataFrame(feature_store_fold).sort("horizon")
+        np.testing.assert_allclose(default_fold["mae"].to_numpy(), feature_store_fold["mae"].to_numpy(), rtol=1e-4)
+
+
+def test_global_model_reports_every_location(hourly_repo):
+    train_args = dict(
+        repo=hourly_repo,
+        train_data_from=datetime(2022, 1, 1),
+        train_data_to=datetime(2023, 7, 1),
+        test_data_from=datetime(2023, 1, 1),
+        pickup_locations=None,
+        max_horizon=7,
+        cross_validation_split_frequency="2mo",
+        global_model=True,
+        per_location_metrics=True
+    )
+    update_feature_store(hourly_repo, to_date=datetime(2023, 7, 1), from_date=datetime(2022, 1, 1))
+    
+    results = train_model(**train_args)
+    feature_store_results = train_model(**train_args, feature_store=True)
+    
+    assert len(results) == 3
+    for fold, feature_store_fold in zip(results, feature_store_results):
+        fold = pl.DataFrame(fold)
+        assert fold.select('unique_id', 'horizon').unique().height == 2 * 7
+        # the location intercept absorbs the level of each zone
+        assert fold.filter(pl.col('unique_id') == 10)['mae_per'].mean() < 0.1
+        np.testing.assert_allclose(fold["mae"].to_numpy(), pl.DataFrame(feature_store_fold)["mae"].to_numpy(), rtol=1e-4)
+
+
+def test_hourly_model_forecasts_every_hour_of_the_horizon(hourly_repo):
+    results = train_model(
+        repo=hourly_repo,
+        train_data_from=datetime(2022, 1, 1),
+        train_data_to=datetime(2023, 7, 1),
+        test_data_from=datetime(2023, 5, 1),
+        pickup_locations=[10, 40],
+        max_horizon=24,
+        cross_validation_split_frequency="1mo",
+        global_model=True,
+        freq='1h'
+    )
+    
+    assert len(results) == 2
+    for fold in results:
+        fold = pl.DataFrame(fold)
+        assert sorted(fold['horizon'].dt.total_hours().to_list()) == list(range(1, 25))
+
+
+def test_hourly_model_backtest_matches_per_cutoff_predict(hourly_repo):
+    df = (
+        hourly_repo.fetch_pickup_data(datetime(2023, 1, 1), datetime(2023, 7, 1), pickup_locations=[10, 40])
+        .select(
+            pl.col('pickup_location_id').cast(pl.Int64).alias('unique_id'),
+            pl.col('pickup_datetime_hour').alias('ds'),
+            pl.col('num_pickup').cast(pl.Int64).alias('y')
+        )
+        .filter(pl.col('ds') < datetime(2023, 7, 1))
+        .sort(['unique_id', 'ds'])
+    )
+    train = df.filter(pl.col('ds') < datetime(2023, 6, 1))
+    test = df.filter(pl.col('ds') >= datetime(2023, 6, 1))
+    model = build_model(freq='1h').fit(train, max_horizon=24)
+    
+    result = rolling_window_forecast(model, h=24, df=test)
+    
+    cutoffs = result['cutoff'].unique().sort().to_list()
+    expected = _rolling_window_forecast_by_cutoff(model, 24, test, cutoffs)
+    
+    # the first cutoff is max_lag hours after the start of the test data
+    assert cutoffs[0] == datetime(2023, 6, 8)
+    assert_frame_equal(
+        result.sort(['unique_id', 'cutoff', 'ds']),
+        expected.sort(['unique_id', 'cutoff', 'ds']),
+        check_dtypes=False,
+        rel_tol=1e-4
+    )
+
+
+def test_build_model_rejects_unknown_frequency():
+    with pytest.raises(ValueError):
+        build_model(freq='1w')
+
+
+def test_seasonal_naive_backtest_repeats_the_last_week(daily_data):
+    train = daily_data.filter(pl.col('ds') < datetime(2023, 7, 1))
+    test = daily_data.filter(pl.col('ds') >= datetime(2023, 7, 1))
+    model = build_model(regressor='seasonal_naive').fit(train)
+    
+    result = rolling_window_forecast(model, h=7, df=test)
+    
+    expected = (
+        test
+        .with_columns(pl.col('ds').dt.offset_by('7d'), y_pred=pl.col('y').cast(pl.Float64))
+        .drop('y')
+    )
+    assert result.height > 0
+    assert_frame_equal(
+        result.drop('y').sort(['unique_id', 'ds']),
+        result.select('unique_id', 'ds', 'cutoff').join(expected, on=['unique_id', 'ds']).sort(['unique_id', 'ds']),
+        check_column_order=False
+    )
+
+
+def test_statistical_model_keeps_the_weekly_pattern_of_new_history():
+    ds = pl.datetime_range(datetime(2023, 1, 1), datetime(2023, 6, 30), "1d", eager=True)
+    weekend = ds.dt.weekday() >= 6
+    df = pl.DataFrame({
+        "unique_id": 1,
+        "ds": ds,
+        "y": np.random.default_rng(25).poisson(np.where(weekend, 160, 100)),
+    })
+    model = build_model(regressor='auto_ets').fit(df.filter(pl.col('ds') < datetime(2023, 5, 1)))
+    
+    # histories ending on every weekday, forecast without refitting
+    for last_day in pl.datetime_range(datetime(2023, 6, 1), datetime(2023, 6, 7), "1d", eager=True):
+        result = model.predict(7, new_df=df.filter(pl.col('ds') <= last_day))
+        assert result.filter(pl.col('ds').dt.weekday() >= 6)['y_pred'].min() > 140
+        assert result.filter(pl.col('ds').dt.weekday() < 6)['y_pred'].max() < 120
+
+
+def test_statistical_model_falls_back_to_seasonal_naive_for_unseen_or_short_series(caplog):
+    ds = pl.datetime_range(datetime(2023, 1, 1), datetime(2023, 3, 31), "1d", eager=True)
+    df = pl.DataFrame({
+        "unique_id": 1,
+        "ds": ds,
+        "y": np.random.default_rng(25).poisson(100, len(ds)),
+    })
+    model = build_model(regressor='auto_ets').fit(df)
+
+    new_df = pl.concat([
+        df.tail(10),
+        df.with_columns(pl.lit(2).alias('unique_id')),
+    ])
+    with caplog.at_level("WARNING", logger="pipeline"):
+        result = model.predict(7, new_df=new_df).sort('unique_id', 'ds')
+    assert "2 of 2 series forecast with the seasonal naive fallback" in caplog.text
+    for uid in [1, 2]:
+        assert result.filter(pl.col('unique_id') == uid)['y_pred'].to_list() == df.tail(7)['y'].cast(pl.Float64).to_list()
+
+    # errors of a fitted model aren't hidden by the fallback
+    def failing_forward(**kwargs):
+        raise RuntimeError("forward failed")
+    model.fitted_models_[1].forward = failing_forward
+    with pytest.raises(RuntimeError):
+        model.predict(7, new_df=df)
+
+
+def test_statistical_models_train_per_location(hourly_repo):
+    results = train_model(
+        repo=hourly_repo,
+        train_data_from=datetime(2022, 1, 1),
+        train_data_to=datetime(2023, 7, 1),
+        test_data_from=datetime(2023, 3, 1),
+        pickup_locations=[10, 40],
+        max_horizon=7,
+        cross_validation_split_frequency="2mo",
+        regressor='auto_ets'
+    )
+    
+    assert len(results) == 2
+    for fold in results:
+        fold = pl.DataFrame(fold)
+        assert fold.height == 7
+        # daily pickups are 24 * location on average
+        assert fold['mae'].max() < 0.2 * 24 * 25
+    
+    with pytest.raises(ValueError):
+        build_model(global_model=True, regressor='auto_arima')
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_profiled_training_records_every_step(hourly_repo, tmp_path, n_jobs):
+    with profiling() as profiler:
+        train_model(
+            repo=hourly_repo,
+            train_data_from=datetime(2022, 1, 1),
+            train_data_to=datetime(2023, 7, 1),
+            test_data_from=datetime(2023, 3, 1),
+            pickup_locations=[10, 40],
+            max_horizon=7,
+            cross_validation_split_frequency="2mo",
+            n_jobs=n_jobs,
+            model_path=tmp_path / "model.pkl"
+        )
+    
+    summary = profiler.summary()
+    calls = dict(summary.select("name", "calls").iter_rows())
+    assert calls == {
+        "fetch_aggregate": 1, "sort": 1, "split": 1,
+        "fold": 2, "fit": 2, "backtest": 2, "windows": 2, "predict": 2, "join_actuals": 2, "evaluate": 2,
+        "final_fit": 1, "save": 1
+    }
+    # a span's own time excludes its children
+    fold = summary.filter(pl.col("name") == "fold").row(0, named=True)
+    assert fold["self_s"] < fold["total_s"]
+    assert (summary["self_s"] >= 0).all()
+    
+    trace = json.loads(profiler.write_chrome_trace(tmp_path / "trace.json").read_text())
+    spans = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+    assert len(spans) == summary["calls"].sum()
+    # folds of the process pool are recorded by the workers
+    fold_in_main_process = [event["pid"] == os.getpid() for event in spans if event["name"] == "fold"]
+    assert all(fold_in_main_process) if n_jobs == 1 else not any(fold_in_main_process)
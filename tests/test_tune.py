@@ -0,0 +1,61 @@
+import numpy as np
+import polars as pl
+import pytest
+from datetime import datetime
+from src.model.tune import tune_model, search_space, dominated_candidates
+
+
+@pytest.fixture
+def weekly_repo(make_pickup_repo):
+    # strong weekly pattern, the lag 7 candidates should win
+    return make_pickup_repo(
+        datetime(2022, 1, 1),
+        datetime(2023, 1, 1),
+        profile=lambda hours: np.array([1, 2, 3, 4, 5, 8, 6])[hours.dt.weekday().to_numpy() - 1]
+    )
+
+
+def test_dominated_candidates():
+    scores = np.array([
+        [1.0, 2.0],
+        [2.0, 3.0],  # dominated by the first
+        [0.5, 4.0],  # trade-off, kept
+        [1.0, 2.0],  # tie with the first, kept
+    ])
+    assert dominated_candidates(scores).tolist() == [False, True, False, False]
+    # within the margin
+    assert not dominated_candidates(np.array([[1.0], [1.04]]), margin=0.05).any()
+
+
+def test_search_space_random_sample():
+    grid = search_space([[1, 7], [7, 1], [1, 7, 14]], ["linear", "ridge"])
+    assert len(grid) == 4
+    assert set(search_space([[1, 7], [1, 7, 14]], ["linear", "ridge"], n_candidates=3, seed=1)) < set(grid)
+
+
+def test_tune_model_prunes_and_ranks(weekly_repo, tmp_path):
+    tune_args = dict(
+        repo=weekly_repo,
+        train_data_from=datetime(2022, 1, 1),
+        train_data_to=datetime(2023, 1, 1),
+        test_data_from=datetime(2022, 7, 1),
+        pickup_locations=[10, 40],
+        cross_validation_split_frequency="2mo",
+        lag_sets=[[1], [1, 7], [1, 7, 14]],
+        regressors=["linear", "ridge"],
+        horizons=[1, 7],
+    )
+    ranked = tune_model(**tune_args, output_path=tmp_path / "results.csv")
+    
+    assert pl.read_csv(tmp_path / "results.csv").height == ranked.height == 6 * 2
+    # the lag 1 only candidates can't capture the weekly pattern and stop after the first fold
+    pruned = ranked.filter(pl.col("pruned"))
+    assert ranked.filter(pl.col("lags") == "1")["pruned"].all()
+    assert pruned["folds"].max() == 1
+    
+    best = ranked.filter(pl.col("rank") == 1)
+    assert best["horizon"].to_list() == [1, 7]
+    assert all("7" in lags for lags in best["lags"])
+    
+    parallel = tune_model(**tune_args, n_jobs=2, output_path=None)
+    np.testing.assert_allclose(parallel["score"], ranked["score"])